@@ -7,6 +7,50 @@ load_dotenv()
 GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY', '')
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
 
+# Route cache (persistent, shared across Streamlit reruns and restarts)
+ROUTE_CACHE_ENABLED = os.getenv('ROUTE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ROUTE_CACHE_PATH = os.getenv('ROUTE_CACHE_PATH', os.path.join('.cache', 'routes.sqlite3'))
+ROUTE_CACHE_TTL_HOURS = float(os.getenv('ROUTE_CACHE_TTL_HOURS', '168'))  # Directions (with polyline)
+DISTANCE_CACHE_TTL_HOURS = float(os.getenv('DISTANCE_CACHE_TTL_HOURS', '168'))  # Distance matrix elements
+ROUTE_CACHE_MAX_ENTRIES = int(os.getenv('ROUTE_CACHE_MAX_ENTRIES', '200000'))
+
+# Geocode cache (persistent address -> lat/lng store with an in-memory LRU in front)
+GEOCODE_CACHE_PATH = os.getenv('GEOCODE_CACHE_PATH', os.path.join('.cache', 'geocodes.sqlite3'))
+GEOCODE_CACHE_TTL_HOURS = float(os.getenv('GEOCODE_CACHE_TTL_HOURS', '2160'))  # 90 days
+GEOCODE_LRU_SIZE = int(os.getenv('GEOCODE_LRU_SIZE', '10000'))
+GEOCODE_NOT_FOUND_TTL_HOURS = float(os.getenv('GEOCODE_NOT_FOUND_TTL_HOURS', '24'))  # ZERO_RESULTS, memory only
+
+# Offline postcode centroids (build with: python -m services.postcode_geocoder build ONSPD.csv)
+POSTCODE_DB_PATH = os.getenv('POSTCODE_DB_PATH', os.path.join('data', 'postcodes.bin'))
+
+# Google Maps request concurrency
+MAPS_MAX_WORKERS = int(os.getenv('MAPS_MAX_WORKERS', '8'))
+MAPS_QPS = float(os.getenv('MAPS_QPS', '40'))
+MAPS_MAX_RETRIES = int(os.getenv('MAPS_MAX_RETRIES', '5'))
+MAPS_BACKOFF_SECONDS = float(os.getenv('MAPS_BACKOFF_SECONDS', '0.5'))
+MAPS_ASYNC_CONCURRENCY = int(os.getenv('MAPS_ASYNC_CONCURRENCY', '100'))
+MAPS_TIMEOUT_SECONDS = float(os.getenv('MAPS_TIMEOUT_SECONDS', '30'))
+
+# Uploads are read in chunks of this many rows
+UPLOAD_CHUNK_ROWS = int(os.getenv('UPLOAD_CHUNK_ROWS', '5000'))
+
+# Planning
+PLANNING_DEBUG = os.getenv('PLANNING_DEBUG', 'false').lower() in ('1', 'true', 'yes')  # Per-booking/provider prints
+
+# Opt-in profiling: each planning or journey run writes a trace file here
+# (chrome: open in chrome://tracing or ui.perfetto.dev; speedscope: speedscope.app)
+PROFILE_TRACE_DIR = os.getenv('PROFILE_TRACE_DIR', '')  # Empty disables profiling
+PROFILE_TRACE_FORMAT = os.getenv('PROFILE_TRACE_FORMAT', 'chrome')  # chrome or speedscope
+
+# Offline candidate pre-filter (only the top-K estimated providers are routed)
+PREFILTER_ENABLED = os.getenv('PREFILTER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+PREFILTER_TOP_K = int(os.getenv('PREFILTER_TOP_K', '10'))
+WIDEN_MAX_ROUNDS = int(os.getenv('WIDEN_MAX_ROUNDS', '3'))  # Extra candidate rounds for unroutable bookings
+
+# Spatial candidate generation: the k nearest providers within a radius
+SPATIAL_CANDIDATES = int(os.getenv('SPATIAL_CANDIDATES', '20'))
+SPATIAL_RADIUS_MILES = float(os.getenv('SPATIAL_RADIUS_MILES', '60'))
+
 # Validate
 if not GOOGLE_MAPS_API_KEY:
     print("⚠️  WARNING: Google Maps API key not found")
@@ -16,4 +60,4 @@ if not GOOGLE_MAPS_API_KEY:
 if not GEMINI_API_KEY:
     print("ℹ️  INFO: Gemini API key not found")
     print("AI features will be disabled")
-    print("Add GEMINI_API_KEY to .env for smart calculations")
\ No newline at end of file
+    print("Add GEMINI_API_KEY to .env for smart calculations")
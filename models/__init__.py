@@ -1,3 +1,4 @@
 from .booking import Booking, Provider, TravelCost, OtherBooking
+from .provider_table import ProviderTable
 
-__all__ = ['Booking', 'Provider', 'TravelCost', 'OtherBooking']
\ No newline at end of file
+__all__ = ['Booking', 'Provider', 'TravelCost', 'OtherBooking', 'ProviderTable']
\ No newline at end of file
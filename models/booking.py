@@ -1,7 +1,12 @@
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict
+from typing import TYPE_CHECKING, List, Optional, Dict, Sequence
 
-@dataclass
+if TYPE_CHECKING:
+    from models.provider_table import ProviderTable
+
+# Models use __slots__: every attribute set at runtime must be declared here
+
+@dataclass(slots=True)
 class OtherBooking:
     """Other bookings for a provider"""
     booking_id: str
@@ -9,7 +14,7 @@ class OtherBooking:
     start_time: str
     duration_hours: float
     
-@dataclass
+@dataclass(slots=True)
 class Provider:
     """Provider/freelancer information"""
     id: str
@@ -27,12 +32,15 @@ class Provider:
     travel_mode: Optional[str] = None
     travel_type: Optional[str] = None
     hourly_rate: Optional[float] = None
+    service_cost: Optional[float] = None
+    travel_time_rate: Optional[float] = None
     mileage_rate: Optional[float] = None
     travel_time_cost: Optional[float] = None
     mileage_cost: Optional[float] = None
     max_distance: Optional[float] = None
+    max_daily_bookings: Optional[int] = None
 
-@dataclass
+@dataclass(slots=True)
 class Booking:
     """Booking/job information"""
     booking_id: str
@@ -55,8 +63,13 @@ class Booking:
     status: Optional[str] = None
     customer_name: Optional[str] = None
     supported_costs: Optional[Dict[str, bool]] = None
+    
+    # Rows of providers in a shared ProviderTable, when loaded from a planning
+    # file; bookings of one service type share the same array and list
+    provider_table: Optional['ProviderTable'] = field(default=None, compare=False, repr=False)
+    provider_rows: Optional[Sequence[int]] = field(default=None, compare=False, repr=False)
 
-@dataclass
+@dataclass(slots=True)
 class TravelCost:
     """Travel cost result"""
     provider_id: str
@@ -0,0 +1,56 @@
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence
+from models.booking import Provider
+
+
+def _float_column(providers: List[Provider], name: str) -> np.ndarray:
+    """Optional numeric attribute as floats, NaN where unset"""
+    return np.array([np.nan if getattr(p, name) is None else float(getattr(p, name)) for p in providers],
+                    dtype=float)
+
+
+class ProviderTable:
+    """Struct-of-arrays view of the providers of one planning upload
+
+    Each provider has a row; numeric attributes are columns (NaN where the
+    provider leaves them unset) so candidate sets can be sliced by row
+    arrays instead of walking Provider objects. The Provider objects are kept
+    in row order for code that needs them. Rows are looked up by provider
+    ID, so IDs must be unique (uploads skip repeated IDs).
+    """
+
+    def __init__(self, providers: Iterable[Provider]):
+        self.providers: List[Provider] = list(providers)
+        self.row_of: Dict[str, int] = {p.id: row for row, p in enumerate(self.providers)}
+        if len(self.row_of) != len(self.providers):
+            raise ValueError("Provider IDs must be unique within a provider table")
+
+        self.ids = np.array([p.id for p in self.providers], dtype=object)
+        self.addresses = np.array([p.address for p in self.providers], dtype=object)
+        self.travel_modes = np.array([p.travel_mode for p in self.providers], dtype=object)
+        self.service_cost = _float_column(self.providers, 'service_cost')
+        self.travel_time_rate = _float_column(self.providers, 'travel_time_rate')
+        self.mileage_rate = _float_column(self.providers, 'mileage_rate')
+        self.max_distance = _float_column(self.providers, 'max_distance')
+        self.max_daily_bookings = _float_column(self.providers, 'max_daily_bookings')
+
+        # Filled by locate() once addresses are geocoded
+        self.coords = np.full((len(self.providers), 2), np.nan)
+
+    def __len__(self):
+        return len(self.providers)
+
+    def rows(self, providers: Iterable[Provider]) -> np.ndarray:
+        """Row numbers of providers (all must be in the table)"""
+        return np.fromiter((self.row_of[p.id] for p in providers), dtype=np.int32)
+
+    def take(self, rows: Sequence[int]) -> List[Provider]:
+        """Provider objects for row numbers"""
+        return [self.providers[row] for row in rows]
+
+    def locate(self, coords: np.ndarray, rows: Optional[Sequence[int]] = None):
+        """Store (lat, lng) for all rows, or for the given rows"""
+        if rows is None:
+            self.coords[:] = coords
+        else:
+            self.coords[np.asarray(rows)] = coords
@@ -3,35 +3,56 @@ import pandas as pd
 import folium
 from streamlit_folium import folium_static
 import polyline as pl
-from typing import List, Dict
+from contextlib import nullcontext
+from typing import List, Dict, Optional
 from datetime import datetime
 from folium import plugins
 
 from services.excel_handler import ExcelHandler
+from services.input_formats import UPLOAD_TYPES
 from services.cost_calculator import CostCalculator
 from services.maps_service import MapsService
+from services.ingestion import IngestionReport
+from services.result_store import ResultStore
+from services.instrumentation import RunMetrics
 from models.booking import Booking
 
+# Session state written by a planning run and its report/export downloads
+RUN_STATE_KEYS = (
+    'planning_results', 'planning_digest', 'assignment_summary', 'run_metrics', 'run_trace_path',
+    'planning_report', 'planning_export'
+)
+
+@st.cache_resource
+def get_maps_service() -> MapsService:
+    """Maps service shared by all sessions (its caches and worker pool outlive reruns)"""
+    return MapsService()
+
 def render_planning_tab():
     """Simple planning tab for travel cost calculation"""
     
-    # Initialize services
-    excel_handler = ExcelHandler()
-    cost_calculator = CostCalculator()
-    maps_service = MapsService()
+    # Initialize services once: the calculator holds per-run state, so each
+    # session keeps its own, built on the shared maps service
+    maps_service = get_maps_service()
+    if 'cost_calculator' not in st.session_state:
+        st.session_state.cost_calculator = CostCalculator(maps_service)
+    if 'excel_handler' not in st.session_state:
+        st.session_state.excel_handler = ExcelHandler()
+    cost_calculator = st.session_state.cost_calculator
+    excel_handler = st.session_state.excel_handler
     
     st.title("🚗 Travel Cost Planning")
     
     # Step 1: Upload Files
-    st.markdown("### 📁 Step 1: Upload Excel Files")
+    st.markdown("### 📁 Step 1: Upload Planning Files")
     
     col1, col2 = st.columns(2)
     
     with col1:
         bookings_file = st.file_uploader(
             "Upload Bookings File",
-            type=['xlsx'],
-            help="Excel file with customer bookings",
+            type=UPLOAD_TYPES,
+            help="Excel, CSV, Parquet or NDJSON file with customer bookings",
             key="bookings_upload"
         )
         
@@ -52,8 +73,8 @@ def render_planning_tab():
     with col2:
         providers_file = st.file_uploader(
             "Upload Providers File",
-            type=['xlsx'],
-            help="Excel file with provider details",
+            type=UPLOAD_TYPES,
+            help="Excel, CSV, Parquet or NDJSON file with provider details",
             key="providers_upload"
         )
         
@@ -83,26 +104,27 @@ def render_planning_tab():
 def process_files(bookings_file, providers_file, excel_handler, cost_calculator, maps_service):
     """Process uploaded files and calculate routes"""
     
-    with st.spinner("Reading files..."):
+    with st.spinner("Reading files and calculating routes and costs..."):
         try:
-            # Parse files
-            bookings = excel_handler.parse_planning_files(
-                bookings_file.read(),
-                providers_file.read()
-            )
+            # Bookings are streamed in chunks; each chunk is routed while the
+            # next one is read
+            report = IngestionReport()
+            chunks = excel_handler.stream_planning_files(bookings_file, providers_file, report)
+            results = cost_calculator.calculate_streamed_bookings(chunks)
+            show_ingestion_report(report)
             
-            if not bookings:
+            if not results:
                 st.error("No valid bookings found")
                 return
             
-            st.success(f"✅ Found {len(bookings)} bookings")
-            
-            # Analyze bookings
-            with st.spinner("Calculating routes and costs..."):
-                results = cost_calculator.calculate_all_bookings(bookings)
+            st.success(f"✅ Found {len(results)} bookings")
             
             # Store results in session state
             st.session_state.planning_results = results
+            st.session_state.planning_digest = excel_handler.results_digest(results)
+            st.session_state.assignment_summary = cost_calculator.last_assignment_summary
+            st.session_state.run_metrics = cost_calculator.last_run_metrics
+            st.session_state.run_trace_path = cost_calculator.last_trace_path
             st.session_state.excel_handler = excel_handler
             st.session_state.maps_service = maps_service
             
@@ -112,6 +134,13 @@ def process_files(bookings_file, providers_file, excel_handler, cost_calculator,
         except Exception as e:
             st.error(f"Error: {str(e)}")
 
+def show_ingestion_report(report: IngestionReport):
+    """Show problems found while reading the upload"""
+    if report.errors:
+        st.warning(f"⚠️ {report.summary()}")
+        with st.expander("View upload problems"):
+            st.dataframe(report.to_dataframe(), use_container_width=True, hide_index=True)
+
 def display_results(results: List[Dict], excel_handler, maps_service):
     """Display analysis results with improved visualization"""
     
@@ -137,6 +166,15 @@ def display_results(results: List[Dict], excel_handler, maps_service):
     with col4:
         st.metric("Matched Bookings", f"{matched_bookings}/{len(results)}")
     
+    # Optimal assignment vs greedy comparison
+    summary = st.session_state.get('assignment_summary')
+    if summary and summary.get('method') == 'optimal':
+        st.caption(
+            f"Optimal assignment: £{summary['total_cost']:.2f} for {summary['assigned']} bookings vs greedy "
+            f"£{summary['greedy_total_cost']:.2f} for {summary['greedy_assigned']} "
+            f"(saving £{summary['cost_gap']:.2f}, solved in {summary['solve_seconds']:.2f}s)"
+        )
+    
     # View options with tabs
     st.markdown("#### View Options")
     tab1, tab2, tab3 = st.tabs(["📋 Summary Table", "💰 Detailed Costs", "🛣️ Individual Routes"])
@@ -158,22 +196,124 @@ def display_results(results: List[Dict], excel_handler, maps_service):
     with col1:
         st.info("Download a comprehensive Excel report with all booking details, provider assignments, and cost breakdowns.")
     
-    with col2:
-        excel_data = excel_handler.create_results_excel(results)
-        st.download_button(
-            "📥 Download Excel Report",
-            data=excel_data,
-            file_name=f"travel_planning_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            type="primary",
-            use_container_width=True
+        include_all_providers = st.checkbox(
+            "Include an 'All Providers Compared' sheet",
+            value=False,
+            key="report_all_providers"
         )
     
+    with col2:
+        # The report is built on request and kept for this result set, so
+        # reruns of the page do not rebuild it. The digest is taken once,
+        # when the results are stored.
+        digest = st.session_state.get('planning_digest') or excel_handler.results_digest(results)
+        report_key = (digest, include_all_providers)
+        cached_report = st.session_state.get('planning_report')
+        if not cached_report or cached_report[0] != report_key:
+            if st.button("📄 Prepare Excel Report", use_container_width=True):
+                with st.spinner("Writing report..."), export_stage():
+                    cached_report = (report_key, excel_handler.create_results_excel(
+                        results, include_all_providers=include_all_providers
+                    ))
+                st.session_state.planning_report = cached_report
+        
+        if cached_report and cached_report[0] == report_key:
+            st.download_button(
+                "📥 Download Excel Report",
+                data=cached_report[1],
+                file_name=f"travel_planning_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                type="primary",
+                use_container_width=True
+            )
+    
+    # Columnar export for analysis tools (DuckDB, pandas, BI)
+    with st.expander("📦 Export for analysis (Parquet / Arrow)"):
+        st.caption("One table of assignments and one of every provider evaluated per booking, with itemized costs as columns.")
+        export_format = st.radio("Format", ["Parquet", "Arrow IPC"], horizontal=True, key="store_export_format")
+        fmt, extension = ('parquet', 'parquet') if export_format == "Parquet" else ('ipc', 'arrow')
+        
+        # Built on request once per result set and format, like the Excel report
+        export_key = (digest, fmt)
+        cached_export = st.session_state.get('planning_export')
+        if not cached_export or cached_export[0] != export_key:
+            if st.button(f"📦 Prepare {export_format} Export", key="prepare_store_export"):
+                with st.spinner("Writing tables..."), export_stage():
+                    store = ResultStore.from_results(results, plan_id=digest[:16])
+                    cached_export = (export_key, store.plan_id, {
+                        name: (table.num_rows, store.to_bytes(name, fmt)) for name, table in store.tables().items()
+                    })
+                st.session_state.planning_export = cached_export
+        
+        if cached_export and cached_export[0] == export_key:
+            _, plan_id, files = cached_export
+            col1, col2 = st.columns(2)
+            for col, table_name in ((col1, 'assignments'), (col2, 'candidates')):
+                with col:
+                    rows, data = files[table_name]
+                    st.download_button(
+                        f"📥 {table_name.title()} ({rows} rows)",
+                        data=data,
+                        file_name=f"{table_name}_{plan_id}.{extension}",
+                        mime="application/octet-stream",
+                        use_container_width=True,
+                        key=f"download_{table_name}_{fmt}"
+                    )
+    
+    display_run_profile(st.session_state.get('run_metrics'))
+    
     # Clear results button
     if st.button("🔄 Clear Results and Start New", type="secondary"):
-        del st.session_state.planning_results
+        for key in RUN_STATE_KEYS:
+            st.session_state.pop(key, None)
         st.rerun()
 
+def export_stage():
+    """Time an export against the displayed run (a no-op without one)"""
+    metrics = st.session_state.get('run_metrics')
+    return metrics.stage('export') if metrics else nullcontext()
+
+def display_run_profile(metrics: Optional[RunMetrics]):
+    """Where the planning run spent its time, API calls and cache hit ratios"""
+    if not metrics:
+        return
+    
+    summary = metrics.summary()
+    wall = summary['wall_seconds']
+    with st.expander(f"⏱️ Run profile ({wall:.2f}s)"):
+        stages = pd.DataFrame([
+            {
+                'Stage': name,
+                'Seconds': stage['seconds'],
+                # Exports run after the planning run, outside its wall time
+                'Share': f"{stage['seconds'] / wall:.0%}" if wall and name != 'export' else '',
+                'Entries': stage['entries']
+            }
+            for name, stage in summary['stages'].items()
+        ])
+        st.dataframe(stages, use_container_width=True, hide_index=True)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("**API calls**")
+            if summary['api_calls']:
+                for name, calls in summary['api_calls'].items():
+                    st.text(f"{name}: {calls}")
+            else:
+                st.caption("None (all routes cached or mock routing)")
+        with col2:
+            st.markdown("**Cache hit ratio**")
+            for name, ratio in summary['cache_hit_ratio'].items():
+                st.text(f"{name}: {ratio:.0%}")
+        warnings = {name[len('warnings.'):]: n for name, n in summary['counters'].items()
+                    if name.startswith('warnings.')}
+        if warnings:
+            st.caption("Warnings: " + ", ".join(f"{name.replace('_', ' ')} {n}" for name, n in warnings.items()))
+        st.caption("Stage times are exclusive: time spent in a nested stage is not counted again in its parent.")
+        trace_path = st.session_state.get('run_trace_path')
+        if trace_path:
+            st.caption(f"Timeline trace of this run: `{trace_path}`")
+
 def display_summary_table(results: List[Dict]):
     """Display summary table"""
     table_data = []
@@ -198,7 +338,8 @@ def display_summary_table(results: List[Dict]):
                 'Travel Time': f"{int(best['duration'])} min",
                 'Travel Cost': f"£{best['travel_cost']:.2f}",
                 'Service Cost': f"£{best['service_cost']:.2f}",
-                'Total Cost': f"£{best['total_cost']:.2f}"
+                'Total Cost': f"£{best['total_cost']:.2f}",
+                'Unassigned Reason': ''
             })
         else:
             table_data.append({
@@ -213,12 +354,18 @@ def display_summary_table(results: List[Dict]):
                 'Travel Time': '-',
                 'Travel Cost': '-',
                 'Service Cost': '-',
-                'Total Cost': '-'
+                'Total Cost': '-',
+                'Unassigned Reason': result.get('unassigned_reason') or '-'
             })
     
     df = pd.DataFrame(table_data)
     st.dataframe(df, use_container_width=True, hide_index=True)
     
+    # Why bookings were left without a provider
+    reasons = pd.Series([r.get('unassigned_reason') for r in results if not r['best_provider']], dtype=object)
+    for reason, count in reasons.fillna('Unknown').value_counts().items():
+        st.warning(f"⚠️ {count} booking(s) unassigned: {reason}")
+    
     # Summary statistics
     matched_bookings = sum(1 for r in results if r['best_provider'])
     if matched_bookings > 0:
@@ -375,7 +522,7 @@ def display_detailed_costs(results: List[Dict]):
                 # Show all providers evaluated (not in expander)
                 if 'all_providers' in best and len(best['all_providers']) > 1:
                     st.write("**🔍 All Providers Evaluated for this Booking:**")
-                    providers_df = pd.DataFrame(best['all_providers'])
+                    providers_df = best['all_providers'].to_dataframe()
                     providers_df = providers_df.sort_values('total_cost')
                     providers_df['total_cost'] = providers_df['total_cost'].apply(lambda x: f"£{x:.2f}")
                     providers_df['distance'] = providers_df['distance'].apply(lambda x: f"{x:.1f} mi")
@@ -1,15 +1,19 @@
 import streamlit as st
+import pandas as pd
 import folium
 from streamlit_folium import folium_static
+import hashlib
 import json
 import polyline as pl
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import io
 
+from services import tracing
 from services.maps_service import MapsService
 from services.uk_transport import UKTransportService
 from services.excel_handler import ExcelHandler
+from services.ingestion import IngestionReport
 from models.booking import OtherBooking
 
 def render_providers_tab():
@@ -290,7 +294,20 @@ def render_excel_upload(provider_id: str, provider_start: str, travel_mode: str,
             
             # Parse Excel file
             excel_handler = ExcelHandler()
-            data = excel_handler.parse_provider_journey_excel(uploaded_file.read())
+            report = IngestionReport()
+            content = uploaded_file.read()
+            journeys = excel_handler.parse_provider_journeys(content, report)
+            if report.errors:
+                st.warning(f"⚠️ {report.summary()}")
+                with st.expander("View upload problems"):
+                    st.dataframe(report.to_dataframe(), use_container_width=True, hide_index=True)
+            
+            # A workbook with several provider rows is calculated as a whole
+            if len(journeys) > 1:
+                render_all_journeys(journeys, maps_service, uk_transport, include_return,
+                                    hashlib.sha1(content).hexdigest())
+                return
+            data = journeys[0] if journeys else {}
             
             # Extract provider details from Excel
             provider_id = data.get('provider_id', provider_id)
@@ -416,11 +433,138 @@ def display_booking_summary(bookings: List[Dict]):
             if i < len(bookings) - 1:
                 st.divider()
 
+def render_all_journeys(journeys: List[Dict], maps_service, uk_transport, include_return: bool,
+                        upload_digest: str):
+    """Calculate and compare every provider journey of an uploaded workbook"""
+    # Results belong to the workbook they were calculated from
+    if st.session_state.get('all_journeys_upload') != upload_digest:
+        for key in ('all_journey_results', 'all_journeys', 'all_journeys_selected'):
+            st.session_state.pop(key, None)
+        st.session_state.all_journeys_upload = upload_digest
+    
+    total_bookings = sum(len(j['bookings']) for j in journeys)
+    st.success(f"✅ Loaded {len(journeys)} provider journeys with {total_bookings} bookings")
+    
+    with st.expander("Provider Journeys", expanded=False):
+        st.dataframe(pd.DataFrame([{
+            'Provider ID': j['provider_id'],
+            'Start Location': j['start_location'],
+            'Travel Mode': j['travel_mode'],
+            'Bookings': len(j['bookings'])
+        } for j in journeys]), use_container_width=True, hide_index=True)
+    
+    if st.button("🧮 Calculate All Journeys", type="primary", use_container_width=True):
+        with st.spinner(f"Calculating {len(journeys)} journeys..."):
+            st.session_state.all_journey_results = calculate_all_journeys(
+                journeys, maps_service, uk_transport, include_return
+            )
+            st.session_state.all_journeys = journeys
+    
+    if 'all_journey_results' not in st.session_state:
+        return
+    
+    journeys = st.session_state.all_journeys
+    all_results = st.session_state.all_journey_results
+    
+    st.divider()
+    summary = pd.DataFrame([{
+        'Provider ID': journey['provider_id'],
+        'Travel Mode': journey['travel_mode'],
+        'Bookings': len(journey['bookings']),
+        'Distance (miles)': results['total_distance'],
+        'Duration (minutes)': results['total_duration'],
+        'Cost (£)': results['total_cost']
+    } for journey, results in zip(journeys, all_results)])
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total Distance", f"{summary['Distance (miles)'].sum():.1f} miles")
+    with col2:
+        st.metric("Total Time", f"{summary['Duration (minutes)'].sum() / 60:.1f}h")
+    with col3:
+        st.metric("Total Cost", f"£{summary['Cost (£)'].sum():.2f}")
+    
+    st.dataframe(summary, use_container_width=True, hide_index=True)
+    st.download_button(
+        label="📥 Download Summary CSV",
+        data=summary.to_csv(index=False),
+        file_name=f"journeys_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+        mime="text/csv"
+    )
+    
+    # Drill into one provider
+    selected = st.selectbox(
+        "View provider journey",
+        range(len(journeys)),
+        format_func=lambda i: journeys[i]['provider_id'],
+        key="all_journeys_selected"
+    )
+    st.session_state.provider_id = journeys[selected]['provider_id']
+    display_journey_results(all_results[selected], journeys[selected]['travel_mode'])
+    show_journey_map(journeys[selected]['start_location'], journeys[selected]['bookings'],
+                     all_results[selected], maps_service)
+
+def journey_leg_pairs(start_location: str, bookings: List[Dict], include_return: bool) -> List[tuple]:
+    """(origin, destination) of every leg of a journey in time order"""
+    sorted_bookings = sorted(bookings, key=lambda x: x.get('start_time', '00:00'))
+    stops = [start_location] + [b['address'] for b in sorted_bookings]
+    leg_pairs = list(zip(stops, stops[1:]))
+    if include_return and sorted_bookings:
+        leg_pairs.append((stops[-1], start_location))
+    return leg_pairs
+
+def calculate_all_journeys(journeys: List[Dict], maps_service, uk_transport,
+                           include_return: bool) -> List[Dict]:
+    """Journey costs for every provider row, in input order
+    
+    Legs of all journeys are fetched in one concurrent batch, so a leg shared
+    by several providers (same depot, same customer) is routed once. The
+    journeys are then costed in parallel from that shared leg cache.
+    """
+    leg_cache: Dict[tuple, Dict] = {}
+    with tracing.trace_run('journeys', journeys=len(journeys)):
+        leg_pairs = list(dict.fromkeys(
+            pair for j in journeys for pair in journey_leg_pairs(j['start_location'], j['bookings'], include_return)
+        ))
+        if leg_pairs:
+            with tracing.span('routing', 'route', legs=len(leg_pairs)):
+                leg_cache.update(zip(leg_pairs, maps_service.get_routes_with_directions(leg_pairs)))
+        
+        return maps_service.map_concurrent(
+            lambda j: calculate_provider_journey_with_rates(
+                j['start_location'],
+                j['bookings'],
+                j['travel_mode'],
+                maps_service,
+                uk_transport,
+                include_return,
+                j['travel_time_cost_per_hour'],
+                j['mileage_cost_per_mile'],
+                j['parking_paid'],
+                leg_cache
+            ),
+            journeys
+        )
+
 def calculate_provider_journey_with_rates(start_location: str, bookings: List[Dict], 
                                          travel_mode: str, maps_service, uk_transport,
                                          include_return: bool, travel_time_rate: float,
-                                         mileage_rate: float, parking_paid: bool) -> Dict:
-    """Calculate costs for provider's journey using specific rates"""
+                                         mileage_rate: float, parking_paid: bool,
+                                         leg_cache: Optional[Dict] = None) -> Dict:
+    """Calculate costs for provider's journey using specific rates
+    
+    leg_cache maps (origin, destination) to routes already fetched; legs
+    missing from it are fetched and added. With PROFILE_TRACE_DIR set (and
+    no trace already running) the journey is written there as a trace.
+    """
+    with tracing.trace_run('journey', start_location=start_location, bookings=len(bookings)):
+        return _journey_costs(start_location, bookings, travel_mode, maps_service, uk_transport,
+                              include_return, travel_time_rate, mileage_rate, parking_paid, leg_cache)
+
+def _journey_costs(start_location: str, bookings: List[Dict], travel_mode: str, maps_service,
+                   uk_transport, include_return: bool, travel_time_rate: float, mileage_rate: float,
+                   parking_paid: bool, leg_cache: Optional[Dict]) -> Dict:
+    """Legs and costs of one journey (see calculate_provider_journey_with_rates)"""
     
     results = {
         'legs': [],
@@ -433,131 +577,144 @@ def calculate_provider_journey_with_rates(start_location: str, bookings: List[Di
     # Sort bookings by time
     sorted_bookings = sorted(bookings, key=lambda x: x.get('start_time', '00:00'))
     
+    # Fetch all legs (and the return leg) concurrently up front
+    prefetched = {} if leg_cache is None else leg_cache
+    missing = [pair for pair in journey_leg_pairs(start_location, bookings, include_return) if pair not in prefetched]
+    if missing:
+        with tracing.span('routing', 'route', legs=len(missing)):
+            prefetched.update(zip(missing, maps_service.get_routes_with_directions(missing)))
+    
+    def get_leg(origin, destination):
+        # A failed leg changes the next origin, so fall back to a direct lookup
+        if (origin, destination) in prefetched:
+            return prefetched[(origin, destination)]
+        with tracing.span('route', 'route'):
+            return maps_service.get_route_with_directions(origin, destination)
+    
     # Calculate each leg
     current_location = start_location
     
     for i, booking in enumerate(sorted_bookings):
-        # Calculate travel from current location to booking
-        route_info = maps_service.get_route_with_directions(
-            current_location,
-            booking['address']
-        )
-        
-        if route_info['success']:
-            distance = route_info['distance_miles']
-            duration = route_info['duration_minutes']
+        with tracing.span('leg', 'booking', booking_id=booking.get('booking_id', f'B{i+1}')):
+            # Calculate travel from current location to booking
+            route_info = get_leg(current_location, booking['address'])
             
-            # Calculate costs based on travel mode and provided rates
-            cost_breakdown = {}
-            leg_cost = 0
-            
-            if travel_mode == "Car":
-                # Mileage cost using provided rate
-                if mileage_rate > 0:
-                    mileage_cost = round(distance * mileage_rate, 2)
-                    cost_breakdown['mileage'] = mileage_cost
-                    leg_cost += mileage_cost
+            if route_info['success']:
+                distance = route_info['distance_miles']
+                duration = route_info['duration_minutes']
                 
-                # Get parking cost if not paid
-                if not parking_paid:
-                    parking_costs = uk_transport.get_parking_costs(
-                        booking['address'], 
-                        booking.get('duration_hours', 1.0)
-                    )
-                    if parking_costs['success']:
-                        parking_cost = parking_costs['total_cost']
-                        cost_breakdown['parking'] = parking_cost
-                        leg_cost += parking_cost
+                # Calculate costs based on travel mode and provided rates
+                cost_breakdown = {}
+                leg_cost = 0
                 
-                # Check for congestion charges
-                congestion = uk_transport.get_congestion_charge(booking['address'])
-                if congestion['charge'] > 0:
-                    cost_breakdown['congestion_charge'] = congestion['charge']
-                    leg_cost += congestion['charge']
+                if travel_mode == "Car":
+                    # Mileage cost using provided rate
+                    if mileage_rate > 0:
+                        mileage_cost = round(distance * mileage_rate, 2)
+                        cost_breakdown['mileage'] = mileage_cost
+                        leg_cost += mileage_cost
+                    
+                    # Get parking cost if not paid
+                    if not parking_paid:
+                        with tracing.span('tariffs', 'tariff'):
+                            parking_costs = uk_transport.get_parking_costs(
+                                booking['address'], 
+                                booking.get('duration_hours', 1.0)
+                            )
+                        if parking_costs['success']:
+                            parking_cost = parking_costs['total_cost']
+                            cost_breakdown['parking'] = parking_cost
+                            leg_cost += parking_cost
+                    
+                    # Check for congestion charges
+                    with tracing.span('tariffs', 'tariff'):
+                        congestion = uk_transport.get_congestion_charge(booking['address'])
+                    if congestion['charge'] > 0:
+                        cost_breakdown['congestion_charge'] = congestion['charge']
+                        leg_cost += congestion['charge']
+                    
+                else:  # Public Transport
+                    # Estimate public transport cost
+                    with tracing.span('tariffs', 'tariff'):
+                        public_costs = uk_transport.estimate_public_transport_cost(
+                            current_location,
+                            booking['address'],
+                            distance
+                        )
+                    
+                    if 'train' in public_costs:
+                        transport_cost = public_costs['train']['cost']
+                    else:
+                        transport_cost = distance * 0.20  # Default estimate
+                    
+                    cost_breakdown['public_transport'] = transport_cost
+                    leg_cost += transport_cost
                 
-            else:  # Public Transport
-                # Estimate public transport cost
-                public_costs = uk_transport.estimate_public_transport_cost(
-                    current_location,
-                    booking['address'],
-                    distance
-                )
+                # Add travel time cost using provided rate
+                travel_time_cost = round((duration / 60) * travel_time_rate, 2)
+                cost_breakdown['travel_time'] = travel_time_cost
+                leg_cost += travel_time_cost
                 
-                if 'train' in public_costs:
-                    transport_cost = public_costs['train']['cost']
-                else:
-                    transport_cost = distance * 0.20  # Default estimate
+                results['legs'].append({
+                    'from': current_location,
+                    'to': booking['address'],
+                    'booking_id': booking.get('booking_id', f'B{i+1}'),
+                    'distance': round(distance, 1),
+                    'duration': round(duration, 0),
+                    'cost': round(leg_cost, 2),
+                    'breakdown': cost_breakdown,
+                    'polyline': route_info.get('polyline')
+                })
                 
-                cost_breakdown['public_transport'] = transport_cost
-                leg_cost += transport_cost
-            
-            # Add travel time cost using provided rate
-            travel_time_cost = round((duration / 60) * travel_time_rate, 2)
-            cost_breakdown['travel_time'] = travel_time_cost
-            leg_cost += travel_time_cost
-            
-            results['legs'].append({
-                'from': current_location,
-                'to': booking['address'],
-                'booking_id': booking.get('booking_id', f'B{i+1}'),
-                'distance': round(distance, 1),
-                'duration': round(duration, 0),
-                'cost': round(leg_cost, 2),
-                'breakdown': cost_breakdown,
-                'polyline': route_info.get('polyline')
-            })
-            
-            results['total_distance'] += distance
-            results['total_duration'] += duration
-            results['total_cost'] += leg_cost
-            
-            current_location = booking['address']
-    
+                results['total_distance'] += distance
+                results['total_duration'] += duration
+                results['total_cost'] += leg_cost
+                
+                current_location = booking['address']
+        
     # Add return journey if requested
     if include_return and sorted_bookings:
-        return_route = maps_service.get_route_with_directions(
-            current_location,
-            start_location
-        )
-        
-        if return_route['success']:
-            distance = return_route['distance_miles']
-            duration = return_route['duration_minutes']
+        with tracing.span('leg', 'booking', booking_id='RETURN'):
+            return_route = get_leg(current_location, start_location)
             
-            cost_breakdown = {}
-            leg_cost = 0
-            
-            if travel_mode == "Car":
-                # Mileage cost
-                if mileage_rate > 0:
-                    mileage_cost = round(distance * mileage_rate, 2)
-                    cost_breakdown['mileage'] = mileage_cost
-                    leg_cost += mileage_cost
-            else:
-                transport_cost = distance * 0.20
-                cost_breakdown['public_transport'] = transport_cost
-                leg_cost += transport_cost
-            
-            # Travel time cost
-            travel_time_cost = round((duration / 60) * travel_time_rate, 2)
-            cost_breakdown['travel_time'] = travel_time_cost
-            leg_cost += travel_time_cost
-            
-            results['legs'].append({
-                'from': current_location,
-                'to': start_location,
-                'booking_id': 'RETURN',
-                'distance': round(distance, 1),
-                'duration': round(duration, 0),
-                'cost': round(leg_cost, 2),
-                'breakdown': cost_breakdown,
-                'polyline': return_route.get('polyline')
-            })
-            
-            results['total_distance'] += distance
-            results['total_duration'] += duration
-            results['total_cost'] += leg_cost
-    
+            if return_route['success']:
+                distance = return_route['distance_miles']
+                duration = return_route['duration_minutes']
+                
+                cost_breakdown = {}
+                leg_cost = 0
+                
+                if travel_mode == "Car":
+                    # Mileage cost
+                    if mileage_rate > 0:
+                        mileage_cost = round(distance * mileage_rate, 2)
+                        cost_breakdown['mileage'] = mileage_cost
+                        leg_cost += mileage_cost
+                else:
+                    transport_cost = distance * 0.20
+                    cost_breakdown['public_transport'] = transport_cost
+                    leg_cost += transport_cost
+                
+                # Travel time cost
+                travel_time_cost = round((duration / 60) * travel_time_rate, 2)
+                cost_breakdown['travel_time'] = travel_time_cost
+                leg_cost += travel_time_cost
+                
+                results['legs'].append({
+                    'from': current_location,
+                    'to': start_location,
+                    'booking_id': 'RETURN',
+                    'distance': round(distance, 1),
+                    'duration': round(duration, 0),
+                    'cost': round(leg_cost, 2),
+                    'breakdown': cost_breakdown,
+                    'polyline': return_route.get('polyline')
+                })
+                
+                results['total_distance'] += distance
+                results['total_duration'] += duration
+                results['total_cost'] += leg_cost
+        
     # Round totals
     results['total_distance'] = round(results['total_distance'], 1)
     results['total_duration'] = round(results['total_duration'], 0)
@@ -704,7 +861,9 @@ def show_journey_map(start_location: str, bookings: List[Dict], results: Dict, m
     
     st.subheader("🗺️ Journey Visualization")
     
-    coords = maps_service.geocode_address(start_location)
+    # One batched lookup; repeat addresses and reruns are served from the geocode cache
+    locations = maps_service.geocode_addresses([start_location] + [b['address'] for b in bookings])
+    coords = locations[0]
     
     if coords:
         m = folium.Map(location=[coords['lat'], coords['lng']], zoom_start=10)
@@ -717,8 +876,7 @@ def show_journey_map(start_location: str, bookings: List[Dict], results: Dict, m
         ).add_to(m)
         
         # Add booking locations
-        for i, booking in enumerate(bookings):
-            booking_coords = maps_service.geocode_address(booking['address'])
+        for i, (booking, booking_coords) in enumerate(zip(bookings, locations[1:])):
             if booking_coords:
                 folium.Marker(
                     [booking_coords['lat'], booking_coords['lng']],
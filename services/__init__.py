@@ -1,6 +1,7 @@
 from .file_handler import parse_booking_file, get_example_json, get_provider_journey_example
 from .cost_calculator import CostCalculator
 from .maps_service import MapsService
+from .route_cache import RouteCache
 from .ai_service import AIService
 from .uk_transport import UKTransportService
 
@@ -10,6 +11,7 @@ __all__ = [
     'get_provider_journey_example',
     'CostCalculator', 
     'MapsService',
+    'RouteCache',
     'AIService',
     'UKTransportService'
 ]
\ No newline at end of file
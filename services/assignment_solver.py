@@ -0,0 +1,251 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+from typing import Dict, List, Optional
+
+# Cost of leaving a booking unassigned (far above any real cost)
+UNASSIGNED_COST = 1e9
+
+
+class AssignmentSolver:
+    """Optimal booking -> provider assignment for the bookings of one day
+
+    Costs are a bookings x providers matrix. Each provider is expanded into
+    slots, no more than its capacity and no more than the number of its
+    candidate bookings that fit side by side in time. The day is solved as a
+    sparse min-cost bipartite matching over the candidate edges only.
+    High-priority bookings are solved first and keep their providers; pairs
+    that overlap a booking already placed on a provider are never offered.
+    Overlaps within a solve are repaired by blocking the later pair and
+    solving again, until none remain or a round removes no overlap; anything
+    still left over is placed greedily. If the plain greedy plan turns out
+    better, it is returned instead.
+    """
+
+    def __init__(self, max_rounds: int = 20):
+        self.max_rounds = max_rounds
+
+    def solve(self, cost: np.ndarray, allowed: np.ndarray, capacity: np.ndarray,
+              intervals: np.ndarray, high_priority: Optional[np.ndarray] = None) -> np.ndarray:
+        """Assign bookings to providers at minimum total cost
+
+        cost and allowed are bookings x providers; capacity is per provider;
+        intervals holds (start, end) minutes per booking, NaN when unknown.
+        Returns the provider column for each booking, or -1 if unassigned.
+        """
+        n_bookings, n_providers = cost.shape
+        assignment = np.full(n_bookings, -1)
+        remaining = capacity.astype(int).copy()
+        blocked = ~allowed | ~np.isfinite(cost)
+
+        if high_priority is None:
+            high_priority = np.zeros(n_bookings, dtype=bool)
+
+        for group in (high_priority, ~high_priority):
+            rows = np.flatnonzero(group)
+            if not len(rows):
+                continue
+
+            fixed = assignment.copy()
+            self._block_fixed_overlaps(blocked, rows, fixed, intervals)
+
+            best_conflicts = len(rows) + 1
+            for _ in range(self.max_rounds):
+                assignment[rows] = self._solve_rows(cost[rows], blocked[rows], remaining, intervals[rows])
+
+                conflicts = self._find_conflicts(assignment, intervals, fixed)
+                if not conflicts or len(conflicts) >= best_conflicts:
+                    break  # Done, or the last round removed no overlap
+                best_conflicts = len(conflicts)
+
+                # Keep the earlier booking, block the later one from this provider
+                for booking in conflicts:
+                    blocked[booking, assignment[booking]] = True
+
+            for booking in self._find_conflicts(assignment, intervals, fixed):
+                assignment[booking] = -1
+
+            # Place whatever the repair rounds left out wherever it still fits
+            unassigned = [b for b in rows if assignment[b] < 0]
+            if unassigned:
+                assignment = self.greedy(cost, ~blocked, capacity, intervals, unassigned, assignment)
+
+            assigned = assignment[rows]
+            remaining -= np.bincount(assigned[assigned >= 0], minlength=n_providers)
+
+        # Overlap repair is a heuristic; never return a plan worse than greedy
+        order = list(np.flatnonzero(high_priority)) + list(np.flatnonzero(~high_priority))
+        greedy = self.greedy(cost, allowed, capacity, intervals, order)
+        if self._better(cost, greedy, assignment, high_priority):
+            return greedy
+
+        return assignment
+
+    def solve_rows(self, cost: np.ndarray, allowed: np.ndarray, capacity: np.ndarray,
+                   intervals: np.ndarray, rows: List[int], assignment: np.ndarray) -> np.ndarray:
+        """Assign rows on top of an existing assignment, which is kept as is
+
+        The rows only get the slots the assignment leaves free and are never
+        offered a provider that is already busy at their time. Rows that
+        still overlap each other after the solve are placed greedily.
+        """
+        rows = np.asarray(rows, dtype=int)
+        fixed = assignment.copy()
+        assigned = fixed[fixed >= 0]
+        remaining = capacity.astype(int) - np.bincount(assigned, minlength=cost.shape[1])
+        blocked = ~allowed | ~np.isfinite(cost)
+        self._block_fixed_overlaps(blocked, rows, fixed, intervals)
+
+        assignment = fixed.copy()
+        assignment[rows] = self._solve_rows(cost[rows], blocked[rows], remaining, intervals[rows])
+        for booking in self._find_conflicts(assignment, intervals, fixed):
+            assignment[booking] = -1
+
+        unassigned = [b for b in rows if assignment[b] < 0]
+        if unassigned:
+            assignment = self.greedy(cost, ~blocked, capacity, intervals, unassigned, assignment)
+        return assignment
+
+    def greedy(self, cost: np.ndarray, allowed: np.ndarray, capacity: np.ndarray,
+               intervals: np.ndarray, order: List[int],
+               assignment: Optional[np.ndarray] = None) -> np.ndarray:
+        """Greedy assignment under the same constraints
+
+        Bookings are taken in the given order and each picks the cheapest
+        provider that is allowed, has capacity left and is free at that time.
+        An existing assignment can be passed in to be completed.
+        """
+        n_bookings, n_providers = cost.shape
+        assignment = np.full(n_bookings, -1) if assignment is None else assignment.copy()
+        assigned = assignment[assignment >= 0]
+        remaining = capacity.astype(int) - np.bincount(assigned, minlength=n_providers)
+        busy: Dict[int, List[tuple]] = {}
+        for booking in np.flatnonzero(assignment >= 0):
+            if not np.isnan(intervals[booking, 0]):
+                busy.setdefault(assignment[booking], []).append(tuple(intervals[booking]))
+
+        for booking in order:
+            start, end = intervals[booking]
+            for provider in np.argsort(cost[booking]):
+                if not np.isfinite(cost[booking, provider]):
+                    break  # Non-candidates sort last
+                if not allowed[booking, provider] or remaining[provider] <= 0:
+                    continue
+                if not np.isnan(start) and any(start < o_end and end > o_start
+                                               for o_start, o_end in busy.get(provider, [])):
+                    continue
+
+                assignment[booking] = provider
+                remaining[provider] -= 1
+                if not np.isnan(start):
+                    busy.setdefault(provider, []).append((start, end))
+                break
+
+        return assignment
+
+    @classmethod
+    def _better(cls, cost: np.ndarray, candidate: np.ndarray, current: np.ndarray,
+                high_priority: np.ndarray) -> bool:
+        """True if candidate places more high-priority bookings, then more
+        bookings overall, then costs less"""
+        def score(assignment):
+            assigned = assignment >= 0
+            return (-int((assigned & high_priority).sum()), -int(assigned.sum()),
+                    cls.total_cost(cost, assignment))
+        return score(candidate) < score(current)
+
+    @staticmethod
+    def total_cost(cost: np.ndarray, assignment: np.ndarray) -> float:
+        """Sum of the chosen costs over assigned bookings"""
+        rows = np.flatnonzero(assignment >= 0)
+        return float(cost[rows, assignment[rows]].sum())
+
+    @classmethod
+    def _solve_rows(cls, cost: np.ndarray, blocked: np.ndarray, capacity: np.ndarray,
+                    intervals: np.ndarray) -> np.ndarray:
+        """Solve one group of bookings against the remaining provider slots"""
+        n_rows, n_providers = cost.shape
+        result = np.full(n_rows, -1)
+        edges = ~blocked & np.isfinite(cost) & (capacity > 0)[np.newaxis, :]
+        edge_rows, edge_providers = np.nonzero(edges)
+        if not len(edge_rows):
+            return result
+
+        # Slots per provider: never more than can be used without an overlap
+        slots = np.zeros(n_providers, dtype=int)
+        order = np.argsort(edge_providers, kind='stable')
+        bounds = np.searchsorted(edge_providers[order], np.arange(n_providers + 1))
+        for provider in np.flatnonzero(np.diff(bounds)):
+            provider_rows = edge_rows[order[bounds[provider]:bounds[provider + 1]]]
+            slots[provider] = min(int(capacity[provider]), cls._max_side_by_side(intervals[provider_rows]))
+        first_slot = np.concatenate([[0], np.cumsum(slots)])
+
+        # Each candidate edge connects the booking to every slot of its provider
+        per_edge = slots[edge_providers]
+        graph_rows = np.repeat(edge_rows, per_edge)
+        edge_start = np.repeat(first_slot[edge_providers] - np.cumsum(per_edge) + per_edge, per_edge)
+        graph_cols = edge_start + np.arange(len(graph_rows))
+        weights = np.repeat(cost[edge_rows, edge_providers], per_edge)
+
+        # One dummy slot per booking lets it stay unassigned. Every row is
+        # matched exactly once, so shifting all weights by 1 keeps the optimum
+        # while keeping zero costs as stored edges.
+        n_slots = first_slot[-1]
+        graph = csr_matrix(
+            (np.concatenate([weights, np.full(n_rows, UNASSIGNED_COST)]) + 1.0,
+             (np.concatenate([graph_rows, np.arange(n_rows)]),
+              np.concatenate([graph_cols, n_slots + np.arange(n_rows)]))),
+            shape=(n_rows, n_slots + n_rows)
+        )
+        matched_rows, matched_cols = min_weight_full_bipartite_matching(graph)
+
+        slot_provider = np.repeat(np.arange(n_providers), slots)
+        chosen = matched_cols < n_slots
+        result[matched_rows[chosen]] = slot_provider[matched_cols[chosen]]
+        return result
+
+    @staticmethod
+    def _max_side_by_side(intervals: np.ndarray) -> int:
+        """Most bookings one provider could take without any two overlapping"""
+        known = intervals[~np.isnan(intervals[:, 0])]
+        count = len(intervals) - len(known)
+        last_end = -np.inf
+        for start, end in known[np.argsort(known[:, 1])]:
+            if start >= last_end:
+                count += 1
+                last_end = end
+        return count
+
+    @staticmethod
+    def _block_fixed_overlaps(blocked: np.ndarray, rows: np.ndarray, fixed: np.ndarray,
+                              intervals: np.ndarray):
+        """Block rows from providers already busy (in fixed) at the same time"""
+        for booking in np.flatnonzero(fixed >= 0):
+            start, end = intervals[booking]
+            if np.isnan(start):
+                continue
+            starts, ends = intervals[rows, 0], intervals[rows, 1]
+            overlapping = rows[(starts < end) & (ends > start)]
+            blocked[overlapping, fixed[booking]] = True
+
+    @staticmethod
+    def _find_conflicts(assignment: np.ndarray, intervals: np.ndarray, fixed: np.ndarray) -> List[int]:
+        """Bookings that overlap an earlier booking of the same provider
+
+        Bookings already present in fixed are never reported.
+        """
+        conflicts = []
+        for provider in np.unique(assignment[assignment >= 0]):
+            bookings = [b for b in np.flatnonzero(assignment == provider) if not np.isnan(intervals[b, 0])]
+            # Fixed bookings first so they always win against new ones
+            bookings.sort(key=lambda b: (fixed[b] != provider, intervals[b, 0]))
+
+            kept = []
+            for booking in bookings:
+                start, end = intervals[booking]
+                if any(start < k_end and end > k_start for k_start, k_end in kept):
+                    conflicts.append(booking)
+                else:
+                    kept.append((start, end))
+
+        return conflicts
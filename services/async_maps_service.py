@@ -0,0 +1,325 @@
+import asyncio
+import random
+import time
+import aiohttp
+from googlemaps.exceptions import ApiError
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from config import (
+    GOOGLE_MAPS_API_KEY,
+    ROUTE_CACHE_ENABLED,
+    MAPS_QPS,
+    MAPS_MAX_RETRIES,
+    MAPS_BACKOFF_SECONDS,
+    MAPS_ASYNC_CONCURRENCY,
+    MAPS_TIMEOUT_SECONDS
+)
+from services.route_cache import RouteCache, normalize_address
+from services.geocode_cache import GeocodeCache
+from services.postcode_geocoder import PostcodeGeocoder
+from services.maps_service import (
+    parse_directions,
+    parse_matrix_element,
+    parse_geocode,
+    mock_route,
+    mock_distance,
+    cached_distance
+)
+
+API_BASE_URL = 'https://maps.googleapis.com/maps/api'
+
+# Statuses that carry a usable (possibly empty) result
+RESULT_STATUSES = {'OK', 'ZERO_RESULTS', 'NOT_FOUND'}
+
+# Server errors retried with backoff, as the googlemaps client does
+RETRIABLE_HTTP_STATUSES = {500, 503, 504}
+
+class AsyncRateLimiter:
+    """Token bucket limiting requests per second for coroutines
+
+    The bucket is read and updated without awaiting, which makes each
+    update atomic on the event loop; waiters sleep independently and try
+    again, like the threaded RateLimiter.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        if self.rate <= 0:
+            return
+
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class _LoopState:
+    """What an AsyncMapsService holds on one event loop"""
+    __slots__ = ('session', 'semaphore', 'rate_limiter', 'inflight', 'guard')
+
+    def __init__(self, max_concurrency: int, qps: float):
+        connector = aiohttp.TCPConnector(limit=max_concurrency, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=MAPS_TIMEOUT_SECONDS)
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.rate_limiter = AsyncRateLimiter(qps)
+        # Requests in flight by key, shared by concurrent callers
+        self.inflight: Dict[tuple, asyncio.Future] = {}
+        self.guard: Optional[asyncio.Task] = None
+
+class AsyncMapsService:
+    """asyncio counterpart of MapsService
+
+    Requests go straight to the Google Maps web services over one pooled
+    keep-alive aiohttp session. A semaphore bounds how many requests are in
+    flight, so callers can gather hundreds of lookups without a thread each.
+    Results have the same shape as MapsService and share its route cache.
+
+    As in MapsService, addresses with a postcode in the offline file are
+    geocoded without a request, and concurrent lookups of the same route,
+    distance or address share one request.
+
+    Use as an async context manager, or call close() when finished. Each
+    event loop the client is used on (e.g. successive asyncio.run calls)
+    gets its own session, semaphore and rate limiter; a session is closed on
+    its own loop, at the latest when asyncio.run shuts that loop down. Not
+    exported from the services package: import it from
+    services.async_maps_service.
+    """
+
+    def __init__(self, cache: Optional[RouteCache] = None,
+                 max_concurrency: int = MAPS_ASYNC_CONCURRENCY, qps: float = MAPS_QPS,
+                 geocode_cache: Optional[GeocodeCache] = None,
+                 postcode_geocoder: Optional[PostcodeGeocoder] = None):
+        self.api_key = GOOGLE_MAPS_API_KEY
+
+        # Persistent route cache (only used for real API results)
+        if cache is None and ROUTE_CACHE_ENABLED:
+            cache = RouteCache()
+        self.cache = cache
+        if geocode_cache is None and ROUTE_CACHE_ENABLED:
+            geocode_cache = GeocodeCache()
+        self.geocode_cache = geocode_cache
+        self.postcode_geocoder = postcode_geocoder or PostcodeGeocoder()
+
+        self.max_concurrency = max_concurrency
+        self.qps = qps
+        self._loops: Dict[asyncio.AbstractEventLoop, _LoopState] = {}
+
+    async def __aenter__(self) -> 'AsyncMapsService':
+        self._open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Close the HTTP sessions, each on the loop it belongs to"""
+        current = asyncio.get_running_loop()
+        states, self._loops = self._loops, {}
+        for loop, state in states.items():
+            if loop is current:
+                state.guard.cancel()
+                await state.session.close()
+            elif loop.is_running():
+                loop.call_soon_threadsafe(state.guard.cancel)
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(state.session.close(), loop))
+            elif not loop.is_closed():
+                # The guard closes the session when that loop runs again
+                state.guard.cancel()
+            # A closed loop closed its session while shutting down
+
+    def _open(self) -> _LoopState:
+        """Session, semaphore and limiter of the running loop, opened on first use"""
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None or state.session.closed:
+            if state is not None:
+                state.guard.cancel()
+            for finished in [other for other in self._loops if other.is_closed()]:
+                del self._loops[finished]
+            state = self._loops[loop] = _LoopState(self.max_concurrency, self.qps)
+            state.guard = loop.create_task(self._close_on_shutdown(state.session))
+        return state
+
+    @staticmethod
+    async def _close_on_shutdown(session: aiohttp.ClientSession):
+        """Close a session when its loop cancels this task (asyncio.run does on exit)"""
+        try:
+            await asyncio.get_running_loop().create_future()
+        finally:
+            await session.close()
+
+    async def _coalesced(self, key: tuple, fetch: Callable[[], Awaitable]):
+        """Await fetch() once for all concurrent callers of key
+
+        Callers that join a request in flight get a copy of its result (or
+        its exception), like SingleFlight in the threaded client.
+        """
+        inflight = self._open().inflight
+        future = inflight.get(key)
+        if future is None:
+            future = inflight[key] = asyncio.ensure_future(fetch())
+            future.add_done_callback(lambda _: inflight.pop(key, None))
+            return await asyncio.shield(future)
+
+        result = await asyncio.shield(future)
+        return dict(result) if isinstance(result, dict) else result
+
+    async def _request(self, endpoint: str, params: Dict) -> Dict:
+        """GET a Maps web service endpoint and return the decoded body
+
+        HTTP 500/503/504 and OVER_QUERY_LIMIT responses are retried with
+        jittered exponential backoff; other error statuses raise ApiError like
+        the sync client.
+        """
+        state = self._open()
+        url = f"{API_BASE_URL}/{endpoint}/json"
+        params = dict(params, key=self.api_key)
+
+        for attempt in range(MAPS_MAX_RETRIES + 1):
+            async with state.semaphore:
+                await state.rate_limiter.acquire()
+                async with state.session.get(url, params=params) as response:
+                    retry = response.status in RETRIABLE_HTTP_STATUSES and attempt < MAPS_MAX_RETRIES
+                    if not retry:
+                        response.raise_for_status()
+                        body = await response.json()
+
+            if not retry:
+                status = body.get('status')
+                if status in RESULT_STATUSES:
+                    return body
+                if status != 'OVER_QUERY_LIMIT' or attempt == MAPS_MAX_RETRIES:
+                    raise ApiError(status, body.get('error_message'))
+
+            # Back off outside the semaphore so other requests keep flowing
+            delay = MAPS_BACKOFF_SECONDS * (2 ** attempt)
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+    async def get_route_with_directions(self, origin: str, destination: str) -> Dict:
+        """Get complete route information including polyline for map display"""
+        if not self.api_key:
+            # Mock data for testing without API key
+            return mock_route()
+
+        return await self._coalesced(
+            ('directions', normalize_address(origin), normalize_address(destination)),
+            lambda: self._cached_route_with_directions(origin, destination)
+        )
+
+    async def _cached_route_with_directions(self, origin: str, destination: str) -> Dict:
+        if self.cache:
+            cached = await asyncio.to_thread(self.cache.get, 'directions', origin, destination)
+            if cached:
+                return cached
+
+        try:
+            body = await self._request('directions', {
+                'origin': origin,
+                'destination': destination,
+                'mode': 'driving',
+                'units': 'imperial'
+            })
+            route = parse_directions(body.get('routes', []))
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+        if self.cache and route['success']:
+            await asyncio.to_thread(self.cache.set, 'directions', origin, destination, route)
+
+        return route
+
+    async def get_distance_duration(self, origin: str, destination: str) -> Dict:
+        """Get distance and duration between two points"""
+        if not self.api_key:
+            # Mock data for testing without API key
+            return mock_distance()
+
+        return await self._coalesced(
+            ('distance', normalize_address(origin), normalize_address(destination)),
+            lambda: self._cached_distance_duration(origin, destination)
+        )
+
+    async def _cached_distance_duration(self, origin: str, destination: str) -> Dict:
+        if self.cache:
+            cached = await asyncio.to_thread(cached_distance, self.cache, origin, destination)
+            if cached:
+                return cached
+
+        try:
+            body = await self._request('distancematrix', {
+                'origins': origin,
+                'destinations': destination,
+                'mode': 'driving',
+                'units': 'imperial'
+            })
+            result = parse_matrix_element(body['rows'][0]['elements'][0])
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+        if self.cache and result['success']:
+            await asyncio.to_thread(self.cache.set, 'distance', origin, destination, result)
+
+        return result
+
+    async def geocode_address(self, address: str) -> Optional[Dict[str, float]]:
+        """Convert address to coordinates
+
+        The offline postcode file is tried first, then the geocode cache;
+        only the remaining misses are requested.
+        """
+        if self.postcode_geocoder.available:
+            location = self.postcode_geocoder.geocode_many([address])[0]
+            if location:
+                return location
+        if not self.api_key:
+            # Mock coordinates for testing
+            return {'lat': 52.4862, 'lng': -1.8904}  # Birmingham
+
+        return await self._coalesced(('geocode', normalize_address(address)), lambda: self._cached_geocode(address))
+
+    async def _cached_geocode(self, address: str) -> Optional[Dict[str, float]]:
+        if self.geocode_cache:
+            cached = await asyncio.to_thread(self.geocode_cache.get, address)
+            if cached:
+                lat, lng = cached
+                return None if lat is None else {'lat': lat, 'lng': lng}
+
+        try:
+            body = await self._request('geocode', {'address': address})
+            location = parse_geocode(body.get('results', []))
+        except Exception:
+            return None
+
+        if self.geocode_cache:
+            await asyncio.to_thread(
+                self.geocode_cache.set, address, (location['lat'], location['lng']) if location else None
+            )
+        return location
+
+    async def get_routes_with_directions(self, pairs: List[Tuple[str, str]]) -> List[Dict]:
+        """Get full routes for several origin/destination pairs, in input order"""
+        return await asyncio.gather(*(self.get_route_with_directions(o, d) for o, d in pairs))
+
+    async def get_distances(self, pairs: List[Tuple[str, str]]) -> List[Dict]:
+        """Get distance and duration for several pairs, in input order"""
+        return await asyncio.gather(*(self.get_distance_duration(o, d) for o, d in pairs))
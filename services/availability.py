@@ -0,0 +1,135 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+from config import PLANNING_DEBUG
+from models.booking import Booking, Provider
+from services import instrumentation
+
+DEFAULT_BOOKING_DURATION_HOURS = 2.0
+
+
+def parse_minutes(time_str) -> Optional[int]:
+    """Convert 'HH:MM' (or 'HH:MM:SS') to minutes after midnight"""
+    try:
+        parts = str(time_str).strip().split(':')
+        hours, minutes = int(parts[0]), int(parts[1])
+    except (IndexError, ValueError):
+        return None
+
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+
+def booking_interval(booking: Booking) -> Optional[Tuple[int, int]]:
+    """Start and end of a booking in minutes after midnight"""
+    start = parse_minutes(booking.service_time)
+    if start is None:
+        return None
+
+    duration = getattr(booking, 'duration', None)
+    if duration is None:
+        duration = DEFAULT_BOOKING_DURATION_HOURS
+    return start, start + int(round(float(duration) * 60))
+
+
+class IntervalSet:
+    """Sorted, merged busy intervals with O(log n) overlap queries"""
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+
+    def add(self, start: int, end: int):
+        """Insert an interval, merging it with any it overlaps or touches"""
+        if end <= start:
+            return
+
+        i = bisect_left(self.ends, start)   # First interval ending at/after start
+        j = bisect_right(self.starts, end)  # First interval starting after end
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def overlaps(self, start: int, end: int) -> bool:
+        """True if [start, end) intersects any busy interval"""
+        # Last interval starting before the query ends; merged intervals keep
+        # ends sorted, so it is the only one that can still be running
+        i = bisect_left(self.starts, end) - 1
+        return i >= 0 and self.ends[i] > start
+
+    def __len__(self):
+        return len(self.starts)
+
+
+class AvailabilityIndex:
+    """Per-provider, per-date busy intervals
+
+    A provider's other_bookings carry no date, so (as before) they block the
+    same time on every service date. Assignments made during a planning run
+    are added per date so later bookings in the run see the provider as busy.
+    """
+
+    def __init__(self):
+        self._recurring: Dict[str, IntervalSet] = {}
+        self._dated: Dict[Tuple[str, str], IntervalSet] = {}
+
+    @classmethod
+    def from_providers(cls, providers: Iterable[Provider]) -> 'AvailabilityIndex':
+        index = cls()
+        for provider in providers:
+            index.add_provider(provider)
+        return index
+
+    def add_provider(self, provider: Provider):
+        """Index a provider's existing bookings (once per provider id)"""
+        if provider.id in self._recurring:
+            return
+
+        intervals = IntervalSet()
+        for other in provider.other_bookings or []:
+            start = parse_minutes(other.start_time)
+            try:
+                duration = float(other.duration_hours)
+            except (TypeError, ValueError):
+                duration = None
+
+            if start is None or duration is None:
+                instrumentation.count('warnings.unreadable_booking')
+                if PLANNING_DEBUG:
+                    print(f"Warning: Skipping unreadable booking {other.booking_id} for provider {provider.id}")
+                continue
+
+            intervals.add(start, start + int(round(duration * 60)))
+
+        self._recurring[provider.id] = intervals
+
+    def add(self, provider_id: str, date: str, start: int, end: int):
+        """Mark a provider busy on a date, e.g. after the planner assigns a booking"""
+        self._dated.setdefault((provider_id, date), IntervalSet()).add(start, end)
+
+    def assign(self, provider: Provider, booking: Booking):
+        """Record an assignment of booking to provider"""
+        interval = booking_interval(booking)
+        if interval:
+            self.add(provider.id, booking.service_date, *interval)
+
+    def is_available(self, provider_id: str, date: str, start: int, end: int) -> bool:
+        recurring = self._recurring.get(provider_id)
+        if recurring and recurring.overlaps(start, end):
+            return False
+
+        dated = self._dated.get((provider_id, date))
+        return not (dated and dated.overlaps(start, end))
+
+    def is_provider_available(self, provider: Provider, booking: Booking) -> bool:
+        """Check if provider is free for the booking time"""
+        self.add_provider(provider)
+
+        interval = booking_interval(booking)
+        if interval is None:
+            return True  # If can't parse, assume available
+
+        return self.is_available(provider.id, booking.service_date, *interval)
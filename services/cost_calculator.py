@@ -1,311 +1,778 @@
-from typing import List, Dict, Optional
+import contextvars
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Dict, Optional
 from models.booking import Booking, Provider
+from models.provider_table import ProviderTable
+from services import instrumentation, tracing
+from services.instrumentation import RunMetrics
 from services.maps_service import MapsService
+from services.route_matrix import RouteMatrix
+from services.assignment_solver import AssignmentSolver
+from services.availability import AvailabilityIndex, booking_interval
+from services.distance_estimator import DistanceEstimator
+from services.spatial_index import ProviderSpatialIndex
 from services.uk_transport import UKTransportService
-from datetime import datetime, timedelta
+from services.cost_kernel import CostKernel, value_or_default
+from services.cost_result import CandidateCosts, CostResult, ResultDetails
+from services.evaluation_cache import EvaluationCache
+from config import (
+    PLANNING_DEBUG,
+    PREFILTER_ENABLED,
+    PREFILTER_TOP_K,
+    SPATIAL_CANDIDATES,
+    SPATIAL_RADIUS_MILES,
+    WIDEN_MAX_ROUNDS
+)
+
+# Why a booking was left without a provider
+NO_PROVIDER_IN_RANGE = "No provider could be routed within its maximum distance"
 
 class CostCalculator:
     """Calculate travel and service costs with flat service rates"""
     
-    def __init__(self):
-        self.maps_service = MapsService()
+    def __init__(self, maps_service: Optional[MapsService] = None):
+        self.maps_service = maps_service or MapsService()
         self.uk_transport = UKTransportService()
+        self.cost_kernel = CostKernel(self.uk_transport)
+        self.assignment_solver = AssignmentSolver()
+        self.availability = AvailabilityIndex()
+        self.distance_estimator = DistanceEstimator(self.maps_service)
+        self.evaluation_cache = self._new_evaluation_cache()
+        self.last_assignment_summary: Optional[Dict] = None
+        self.last_run_metrics: Optional[RunMetrics] = None
+        self.last_trace_path: Optional[str] = None
     
-    def calculate_best_provider(self, booking: Booking) -> Dict:
-        """Find the best provider for a booking based on total cost"""
+    def calculate_best_provider(self, booking: Booking, route_matrix: Optional[RouteMatrix] = None,
+                                providers: Optional[List[Provider]] = None) -> Optional[CostResult]:
+        """Find the best provider for a single booking based on total cost
         
-        best_provider = None
-        min_cost = float('inf')
-        best_data = None
-        all_provider_costs = []
+        Evaluated with a fresh evaluation cache and availability index: both
+        hold the state of one run (pairs keyed by its bookings, its
+        assignments), so nothing is carried over from an earlier run.
+        """
+        self.availability = AvailabilityIndex()
+        self.evaluation_cache = self._new_evaluation_cache()
+        return self._best_provider(booking, route_matrix, providers)
+    
+    def _best_provider(self, booking: Booking, route_matrix: Optional[RouteMatrix] = None,
+                       providers: Optional[List[Provider]] = None) -> Optional[CostResult]:
+        """Best provider for a booking of the current run
+        
+        When a prefilled route_matrix is given, distances come from it instead
+        of per-booking matrix requests. Providers are ranked by an offline
+        estimate and routed PREFILTER_TOP_K at a time; those whose lower-bound
+        cost cannot beat the best routed provider are never routed. Costs are
+        computed in one vectorized pass and kept as arrays; the breakdown and
+        route of the winner are only built when read. providers narrows the
+        candidates (default: all of the booking's providers).
+        """
         
         # Debug: log number of providers
-        print(f"Booking {booking.booking_id}: Evaluating {len(booking.providers)} providers")
+        if PLANNING_DEBUG:
+            print(f"Booking {booking.booking_id}: Evaluating {len(booking.providers)} providers")
+        
+        with instrumentation.stage('candidates'):
+            ranked, lower_bounds = self._rank_candidates(booking, providers)
+        routed = []
+        best_cost = float('inf')
+        remaining = list(range(len(ranked)))
         
-        for provider in booking.providers:
-            # Calculate costs for this provider
-            cost_data = self.calculate_provider_cost(booking, provider)
+        while remaining:
+            # Skip providers that cannot beat the best cost found so far
+            remaining = [i for i in remaining if lower_bounds[i] < best_cost]
+            batch, remaining = remaining[:PREFILTER_TOP_K], remaining[PREFILTER_TOP_K:]
+            if not batch:
+                break
             
-            if cost_data:
-                all_provider_costs.append({
-                    'provider_name': provider.name,
-                    'provider_id': provider.id,
-                    'total_cost': cost_data['total_cost'],
-                    'distance': cost_data['distance'],
-                    'duration': cost_data['duration'],
-                    'travel_cost': cost_data['travel_cost'],
-                    'service_cost': cost_data['service_cost'],
-                    'available': cost_data['is_available']
-                })
-                
-                # Only consider available providers
-                if cost_data['is_available'] and cost_data['total_cost'] < min_cost:
-                    min_cost = cost_data['total_cost']
-                    best_provider = provider
-                    best_data = cost_data
+            # Distance and duration for the batch in batched matrix requests
+            batch_providers = [ranked[i] for i in batch]
+            with tracing.span('providers', 'provider', providers=len(batch_providers)):
+                routes = self._get_provider_routes(booking, route_matrix, batch_providers)
+            batch_routed = [
+                (provider, route) for provider, route in zip(batch_providers, routes)
+                if route['success'] and self._within_max_distance(provider, route['distance_miles'])
+            ]
+            if not batch_routed:
+                continue
+            routed.extend(batch_routed)
+            
+            batch_costs = self._routed_components(booking, batch_routed)['total_cost']
+            for (provider, _), cost in zip(batch_routed, batch_costs):
+                if cost < best_cost and self._check_provider_availability(provider, booking):
+                    best_cost = float(cost)
+        
+        if not routed:
+            return None
+        
+        # Every routed pair was evaluated in its batch; these are cache hits
+        providers = [provider for provider, _ in routed]
+        components = self._routed_components(booking, routed)
+        
+        best_index = None
+        min_cost = float('inf')
+        available = np.zeros(len(providers), dtype=bool)
+        
+        for i, provider in enumerate(providers):
+            available[i] = self._check_provider_availability(provider, booking)
+            total_cost = float(components['total_cost'][i])
+            
+            # Only consider available providers
+            if available[i] and total_cost < min_cost:
+                min_cost = total_cost
+                best_index = i
         
         # If no available providers, pick the cheapest regardless
-        if not best_data and all_provider_costs:
-            print(f"Warning: No available providers for {booking.booking_id}, selecting cheapest")
-            best_data = min((cd for cd in [self.calculate_provider_cost(booking, p) for p in booking.providers] if cd), 
-                           key=lambda x: x['total_cost'])
+        if best_index is None:
+            instrumentation.count('warnings.busy_fallback')
+            if PLANNING_DEBUG:
+                print(f"Warning: No available providers for {booking.booking_id}, selecting cheapest")
+            best_index = int(np.argmin(components['total_cost']))
+        
+        best_data = self._build_cost_data(
+            booking, providers[best_index], components, best_index, bool(available[best_index])
+        )
         
         # Add all provider costs to best_data for comparison
-        if best_data:
-            best_data['all_providers'] = all_provider_costs
-            best_data['total_providers_evaluated'] = len(booking.providers)
+        rows = np.arange(len(providers))
+        best_data.all_providers = CandidateCosts.from_components(providers, components, rows, rows, available)
+        best_data.total_providers_evaluated = len(booking.providers)
+        best_data.total_providers_routed = len(routed)
         
         return best_data
     
-    def calculate_provider_cost(self, booking: Booking, provider: Provider) -> Optional[Dict]:
-        """Calculate total cost for a specific provider with detailed travel costs"""
+    def _routed_components(self, booking: Booking, routed: List[tuple]) -> Dict[str, np.ndarray]:
+        """Kernel components for a booking's (provider, route) pairs, evaluated once per run"""
+        providers = [provider for provider, _ in routed]
+        distance = np.array([route['distance_miles'] for _, route in routed])
+        duration = np.array([route['duration_minutes'] for _, route in routed])
         
-        # Get route information
-        route_info = self.maps_service.get_route_with_directions(
-            provider.address,
-            booking.customer_address
+        def evaluate(positions: np.ndarray) -> Dict[str, np.ndarray]:
+            with instrumentation.stage('evaluation'):
+                return self.cost_kernel.evaluate_pairs(
+                    [providers[i] for i in positions], [booking],
+                    np.arange(len(positions)), np.zeros(len(positions), dtype=int),
+                    distance[positions], duration[positions],
+                    booking.provider_table, self.evaluation_cache.is_peak
+                )
+        
+        return self.evaluation_cache.pair_components([(id(booking), p.id) for p in providers], evaluate)
+    
+    def _get_provider_routes(self, booking: Booking, route_matrix: Optional[RouteMatrix] = None,
+                             providers: Optional[List[Provider]] = None) -> List[Dict]:
+        """Distance/duration from providers (default: all of the booking's) to the customer"""
+        if providers is None:
+            providers = booking.providers
+        
+        routes = [None] * len(providers)
+        if route_matrix:
+            routes = [route_matrix.get(p.address, booking.customer_address) for p in providers]
+        
+        # Anything the run matrix does not cover is fetched once per run
+        missing = [i for i, route in enumerate(routes) if route is None]
+        if missing:
+            with instrumentation.stage('routing'):
+                fetched = self.evaluation_cache.get_routes(
+                    [(providers[i].address, booking.customer_address) for i in missing],
+                    self._fetch_customer_routes
+                )
+            for i, route in zip(missing, fetched):
+                routes[i] = route
+        
+        return routes
+    
+    def _fetch_customer_routes(self, pairs: List[tuple]) -> List[Dict]:
+        """Distance Matrix routes from several origins to one customer address"""
+        origins = [origin for origin, _ in pairs]
+        customer_address = pairs[0][1]
+        routes = [row[0] for row in self.maps_service.get_distance_matrix(origins, [customer_address])]
+        
+        # Real distances calibrate the offline estimator's road factors
+        if self._prefilter_active():
+            self.distance_estimator.observe(
+                origins,
+                customer_address,
+                [route['distance_miles'] if route['success'] else np.nan for route in routes]
+            )
+        
+        return routes
+    
+    def _prefilter_active(self) -> bool:
+        # Mock routing is free and mock coordinates carry no information
+        return PREFILTER_ENABLED and self.maps_service.client is not None
+    
+    def _rank_candidates(self, booking: Booking, providers: Optional[List[Provider]] = None):
+        """Order a booking's providers by estimated cost, with lower-bound costs
+        
+        Providers that are out of range (straight-line distance beyond their
+        max_distance) are dropped. Lower bounds use the straight-line distance
+        at the fastest possible speed, so a provider whose bound exceeds a
+        routed cost can never be the cheapest. Providers without coordinates
+        sort last and are never pruned.
+        """
+        providers = list(booking.providers if providers is None else providers)
+        if not providers or not self._prefilter_active():
+            return providers, np.full(len(providers), -np.inf)
+        
+        estimate = self.distance_estimator.estimate([p.address for p in providers], booking.customer_address)
+        in_range = np.array([
+            self._within_max_distance(p, d) for p, d in zip(providers, estimate['min_distance'])
+        ], dtype=bool)
+        
+        provider_arrays = self.cost_kernel.provider_arrays(providers, booking.provider_table)
+        booking_arrays = self.cost_kernel.booking_arrays([booking])
+        estimated_cost = self.cost_kernel.evaluate(
+            estimate['distance'], estimate['duration'], provider_arrays, booking_arrays
+        )['total_cost']
+        
+        # Fares switch from train to coach at 100 miles; each side grows with
+        # distance, so the cheaper of the two ends bounds the cost from below
+        min_distance = estimate['min_distance']
+        lower_bound = np.minimum(
+            self.cost_kernel.evaluate(min_distance, estimate['min_duration'],
+                                      provider_arrays, booking_arrays)['total_cost'],
+            self.cost_kernel.evaluate(np.maximum(min_distance, 100), estimate['min_duration'],
+                                      provider_arrays, booking_arrays)['total_cost']
         )
         
-        if not route_info['success']:
-            return None
+        unknown = np.isnan(estimated_cost)
+        lower_bound = np.where(unknown, -np.inf, lower_bound)
+        order = [i for i in np.lexsort((estimated_cost, unknown)) if in_range[i]]
         
-        distance = route_info['distance_miles']
-        duration = route_info['duration_minutes']
+        return [providers[i] for i in order], lower_bound[order]
+    
+    def _spatial_candidates(self, bookings: List[Booking]) -> Dict[int, List[Provider]]:
+        """The SPATIAL_CANDIDATES nearest matching providers of each booking
         
-        # Get provider rates (from the file)
-        service_cost = getattr(provider, 'service_cost', 50.00)  # Flat service cost
-        travel_time_rate = getattr(provider, 'travel_time_rate', 15.00)  # Per hour for travel
-        mileage_rate = getattr(provider, 'mileage_rate', 0.45)  # Per mile
-        travel_mode = getattr(provider, 'travel_mode', 'Car')
+        Providers are indexed once per run by location and service type.
+        Results are limited to the booking's own provider list; a booking with
+        nobody within SPATIAL_RADIUS_MILES falls back to its nearest providers.
+        Returns an empty dict (no narrowing) when the pre-filter is off.
+        """
+        if not self._prefilter_active():
+            return {}
         
-        # Debug: Print rates being used
-        print(f"Provider {provider.name}: Service Cost: £{service_cost} (flat), Travel Rate: £{travel_time_rate}/hr, Mileage: £{mileage_rate}/mi, Mode: {travel_mode}")
+        providers = self._run_providers(bookings)
+        provider_coords = self.distance_estimator.coordinates([p.address for p in providers])
+        index = ProviderSpatialIndex(providers, provider_coords)
         
-        # Calculate detailed travel costs
-        travel_breakdown = {}
+        # Keep the locations on the upload's provider table
+        table = self._shared_table(bookings)
+        if table is not None:
+            table.locate(provider_coords, table.rows(providers))
+        customer_coords = self.distance_estimator.coordinates([b.customer_address for b in bookings])
         
-        if travel_mode in ['Car', 'Van']:
-            # For Car or Van, calculate driving costs
-            # 1. Mileage cost (round trip) - covers fuel and vehicle wear
-            mileage_cost = round(distance * 2 * mileage_rate, 2)
-            travel_breakdown['mileage'] = mileage_cost
-            
-            # 2. Parking costs at customer location
-            service_duration = getattr(booking, 'duration', 2.0)
-            parking = self.uk_transport.get_parking_costs(
-                booking.customer_address, 
-                service_duration
-            )
-            if parking['success'] and parking['total_cost'] > 0:
-                travel_breakdown['parking'] = parking['total_cost']
+        nearby = {}
+        own_ids = {}  # Bookings of a service type share one provider list
+        for booking, (lat, lng) in zip(bookings, customer_coords):
+            own = own_ids.get(id(booking.providers))
+            if own is None:
+                own = own_ids[id(booking.providers)] = {p.id for p in booking.providers}
+            if len(own) <= SPATIAL_CANDIDATES:
+                continue
             
-            # 3. Congestion charges (if applicable)
-            congestion = self.uk_transport.get_congestion_charge(booking.customer_address)
-            if congestion['charge'] > 0:
-                travel_breakdown['congestion_charge'] = congestion['charge']
-                travel_breakdown['congestion_zone'] = congestion.get('name', 'Charge Zone')
+            service_type = getattr(booking, 'service_type', None)
+            found = index.nearest(lat, lng, service_type, SPATIAL_CANDIDATES, SPATIAL_RADIUS_MILES)
+            if not found:
+                instrumentation.count('warnings.outside_radius')
+                if PLANNING_DEBUG:
+                    print(f"Warning: No providers within {SPATIAL_RADIUS_MILES:g} miles of {booking.booking_id}, using nearest")
+                found = index.nearest(lat, lng, service_type, SPATIAL_CANDIDATES)
             
-            # 4. Toll roads (if any on the route)
-            tolls = self.uk_transport.check_toll_roads(
+            candidates = [p for p, _ in found if p.id in own]
+            if candidates:
+                nearby[id(booking)] = candidates
+        
+        return nearby
+    
+    def _new_evaluation_cache(self) -> EvaluationCache:
+        """Empty per-run cache; the peak-fare flag is fixed for the whole run"""
+        return EvaluationCache(self.uk_transport._is_peak_time())
+    
+    @staticmethod
+    def _run_providers(bookings: List[Booking]) -> List[Provider]:
+        """Unique providers of the bookings, in first-seen order
+        
+        Provider lists shared between bookings are only walked once.
+        """
+        lists = {id(b.providers): b.providers for b in bookings}
+        return list({p.id: p for providers in lists.values() for p in providers}.values())
+    
+    @staticmethod
+    def _shared_table(bookings: List[Booking]) -> Optional[ProviderTable]:
+        """The ProviderTable every booking refers to, if they all share one"""
+        tables = {id(b.provider_table): b.provider_table for b in bookings}
+        return next(iter(tables.values())) if len(tables) == 1 else None
+    
+    @staticmethod
+    def _within_max_distance(provider: Provider, distance: float) -> bool:
+        """Honour the provider's travel radius (NaN distances are kept)"""
+        max_distance = getattr(provider, 'max_distance', None)
+        return max_distance is None or not distance > max_distance
+    
+    def calculate_provider_cost(self, booking: Booking, provider: Provider,
+                                route_info: Optional[Dict] = None) -> Optional[CostResult]:
+        """Calculate total cost for a specific provider with detailed travel costs
+        
+        route_info may be supplied from a batched distance lookup; otherwise the
+        full route is requested here.
+        """
+        
+        # Get route information
+        if route_info is None:
+            route_info = self.maps_service.get_route_with_directions(
                 provider.address,
                 booking.customer_address
             )
-            if tolls:
-                toll_cost = sum(toll['car_charge'] if travel_mode == 'Car' 
-                              else toll['van_charge'] for toll in tolls)
-                travel_breakdown['tolls'] = toll_cost
-                travel_breakdown['toll_roads'] = [toll['name'] for toll in tolls]
-        
-        elif travel_mode == 'Car and Public Transport':
-            # Mixed mode: Drive to station/park and ride, then public transport
-            # Assume driving 30% of distance to park & ride, then public transport
-            
-            # 1. Partial mileage (30% of distance for park & ride)
-            park_ride_distance = distance * 0.3
-            mileage_cost = round(park_ride_distance * 2 * mileage_rate, 2)
-            travel_breakdown['mileage_to_station'] = mileage_cost
-            
-            # 2. Park & Ride parking (full day)
-            travel_breakdown['park_and_ride'] = 5.00  # Typical UK park & ride cost
-            
-            # 3. Public transport for main journey (70% of distance)
-            public_distance = distance * 0.7
-            public_costs = self.uk_transport.estimate_public_transport_cost(
-                provider.address,
-                booking.customer_address,
-                public_distance
-            )
-            
-            if 'train' in public_costs:
-                travel_breakdown['public_transport'] = public_costs['train']['cost'] * 2
-                travel_breakdown['transport_type'] = 'Park & Ride + Train'
-            else:
-                travel_breakdown['public_transport'] = round(public_distance * 2 * 0.20, 2)
-                travel_breakdown['transport_type'] = 'Park & Ride + Bus'
-            
-            # Note in breakdown
-            travel_breakdown['mode_note'] = 'Car to station, then public transport'
-            
-        elif travel_mode == 'Public Transport':
-            # Public transport only mode
-            # Get detailed public transport costs
-            public_costs = self.uk_transport.estimate_public_transport_cost(
-                provider.address,
-                booking.customer_address,
-                distance
-            )
-            
-            if 'train' in public_costs:
-                # Choose between train and coach based on recommendation
-                recommended = public_costs.get('recommended', 'train')
-                if recommended == 'train':
-                    travel_breakdown['public_transport'] = public_costs['train']['cost'] * 2  # Round trip
-                    travel_breakdown['transport_type'] = 'Train'
-                    travel_breakdown['is_peak'] = public_costs['train'].get('is_peak', False)
-                else:
-                    travel_breakdown['public_transport'] = public_costs['coach']['cost'] * 2
-                    travel_breakdown['transport_type'] = 'Coach'
-            else:
-                # Fallback estimate
-                travel_breakdown['public_transport'] = round(distance * 2 * 0.20, 2)
-                travel_breakdown['transport_type'] = 'Bus (estimated)'
-        
-        # 5. Travel time compensation (round trip)
-        travel_time_hours = (duration * 2) / 60  # Convert to hours and multiply by 2 for round trip
-        travel_time_cost = round(travel_time_hours * travel_time_rate, 2)
-        travel_breakdown['travel_time'] = travel_time_cost
-        
-        # Calculate total travel cost
-        travel_cost = sum(v for k, v in travel_breakdown.items() if isinstance(v, (int, float)))
-        
-        # Total cost = Travel + Service (flat rate)
-        total_cost = round(travel_cost + service_cost, 2)
-        
-        # Check provider availability
-        is_available = self._check_provider_availability(provider, booking)
-        
-        # Create detailed route information
-        route_details = {
-            'distance_miles': distance,
-            'duration_minutes': duration,
-            'route_info': route_info,
-            'traffic_conditions': self._estimate_traffic(booking.service_time),
-            'weather_impact': 'Normal',  # Could be enhanced with weather API
-        }
         
-        return {
-            'provider': provider,
-            'distance': distance,
-            'duration': duration,
-            'travel_breakdown': travel_breakdown,
-            'travel_cost': round(travel_cost, 2),
-            'service_cost': service_cost,
-            'total_cost': total_cost,
-            'route_info': route_info,
-            'route_details': route_details,
-            'is_available': is_available,
-            'cost_details': {
-                'service_cost': service_cost,
-                'travel_time_rate': travel_time_rate,
-                'mileage_rate': mileage_rate,
-                'travel_mode': travel_mode,
-                'round_trip_distance': distance * 2,
-                'round_trip_duration': duration * 2,
-                'service_duration': getattr(booking, 'duration', 2.0)
-            }
-        }
+        if not route_info['success']:
+            return None
+        
+        components = self.cost_kernel.evaluate(
+            np.array([route_info['distance_miles']]),
+            np.array([route_info['duration_minutes']]),
+            self.cost_kernel.provider_arrays([provider]),
+            self.cost_kernel.booking_arrays([booking])
+        )
+        
+        return self._build_cost_data(
+            booking, provider, components, 0,
+            self._check_provider_availability(provider, booking)
+        )
+    
+    def _build_cost_data(self, booking: Booking, provider: Provider, components: Dict,
+                         index, is_available: bool) -> CostResult:
+        """Cost result for one evaluated provider
+        
+        Only the numbers are kept; the breakdown and the full route are
+        rebuilt from the result when they are read.
+        """
+        result = CostResult(
+            provider=provider,
+            booking=booking,
+            distance=float(components['distance'][index]),
+            duration=float(components['duration'][index]),
+            travel_cost=float(components['travel_cost'][index]),
+            service_cost=float(components['service_cost'][index]),
+            total_cost=float(components['total_cost'][index]),
+            is_available=is_available,
+            breakdown_values=self.cost_kernel.breakdown_values(components, index),
+            details=ResultDetails(self.cost_kernel, self.maps_service)
+        )
+        
+        # Debug: Print rates being used
+        if PLANNING_DEBUG:
+            cost_details = result.cost_details
+            print(f"Provider {provider.name}: Service Cost: £{result.service_cost} (flat), Travel Rate: £{cost_details['travel_time_rate']}/hr, Mileage: £{cost_details['mileage_rate']}/mi, Mode: {cost_details['travel_mode']}")
+        
+        return result
     
     def _check_provider_availability(self, provider: Provider, booking: Booking) -> bool:
         """Check if provider is available for the booking time"""
-        if not provider.other_bookings:
-            return True
-        
-        # Parse booking time
-        try:
-            booking_datetime = datetime.strptime(
-                f"{booking.service_date} {booking.service_time}", 
-                "%Y-%m-%d %H:%M"
-            )
-            booking_end = booking_datetime + timedelta(hours=getattr(booking, 'duration', 2.0))
-        except:
-            return True  # If can't parse, assume available
-        
-        # Check conflicts with other bookings
-        for other in provider.other_bookings:
-            try:
-                other_start = datetime.strptime(
-                    f"{booking.service_date} {other.start_time}", 
-                    "%Y-%m-%d %H:%M"
-                )
-                other_end = other_start + timedelta(hours=other.duration_hours)
-                
-                # Check for overlap
-                if (booking_datetime < other_end and booking_end > other_start):
-                    return False
-            except:
-                continue
+        return self.availability.is_provider_available(provider, booking)
+    
+    def calculate_all_bookings(self, bookings: List[Booking], method: str = 'optimal') -> List[Dict]:
+        """Calculate best provider for all bookings with optimization
         
-        return True
+        method='optimal' solves all bookings of a day together with the
+        assignment solver; method='greedy' assigns one booking at a time in
+        priority/time order. A summary of the run (including the cost gap
+        against greedy and evaluation cache hits/misses) is kept in
+        last_assignment_summary, and stage timings, API calls and cache hit
+        ratios in last_run_metrics. With PROFILE_TRACE_DIR set the run is
+        also written there as a trace (path in last_trace_path).
+        """
+        with instrumentation.measure_run() as metrics, \
+                tracing.trace_run('planning', bookings=len(bookings), method=method) as trace_path:
+            route_matrix = RouteMatrix(self.maps_service)
+            nearby, ranked, candidates = self._prepare_routes(bookings, route_matrix)
+            results = self._assign_all(bookings, route_matrix, nearby, ranked, candidates, method, metrics)
+        self.last_trace_path = trace_path
+        return results
     
-    def _estimate_traffic(self, service_time: str) -> str:
-        """Estimate traffic conditions based on time"""
-        try:
-            hour = int(service_time.split(':')[0])
-            if 7 <= hour <= 9 or 17 <= hour <= 19:
-                return "Heavy (Rush Hour)"
-            elif 10 <= hour <= 16:
-                return "Moderate"
-            else:
-                return "Light"
-        except:
-            return "Unknown"
+    def calculate_streamed_bookings(self, chunks: Iterable[List[Booking]], method: str = 'optimal') -> List[Dict]:
+        """calculate_all_bookings for bookings that arrive in chunks
+        
+        Each chunk is geocoded, ranked and routed on a background thread while
+        the next chunk is being read, so routing overlaps with parsing. The
+        assignment itself still needs every booking and runs at the end.
+        Reading the chunks is timed as parsing.
+        """
+        with instrumentation.measure_run() as metrics, \
+                tracing.trace_run('planning', method=method) as trace_path:
+            route_matrix = RouteMatrix(self.maps_service)
+            bookings: List[Booking] = []
+            nearby, ranked, candidates = {}, {}, {}
+            
+            # One worker keeps route matrix updates in order
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch') as worker:
+                pending = []
+                chunks = iter(chunks)
+                while True:
+                    with metrics.stage('parsing'):
+                        chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    bookings.extend(chunk)
+                    # The worker records into this run's metrics and trace
+                    pending.append(worker.submit(contextvars.copy_context().run,
+                                                 self._prepare_routes, chunk, route_matrix))
+                
+                for future in pending:
+                    chunk_nearby, chunk_ranked, chunk_candidates = future.result()
+                    nearby.update(chunk_nearby)
+                    ranked.update(chunk_ranked)
+                    candidates.update(chunk_candidates)
+            
+            results = self._assign_all(bookings, route_matrix, nearby, ranked, candidates, method, metrics)
+        self.last_trace_path = trace_path
+        return results
     
-    def calculate_all_bookings(self, bookings: List[Booking]) -> List[Dict]:
-        """Calculate best provider for all bookings with optimization"""
+    def _prepare_routes(self, bookings: List[Booking], route_matrix: RouteMatrix):
+        """Pick each booking's candidate providers and route them into route_matrix
         
-        results = []
-        assigned_providers = {}  # Track provider assignments
+        Returns (nearby, ranked, candidates), each keyed by id(booking).
+        """
+        # Geocode every address of the run in one concurrent batch
+        if self._prefilter_active():
+            with instrumentation.stage('geocoding'):
+                self.distance_estimator.coordinates(
+                    [b.customer_address for b in bookings] + [p.address for p in self._run_providers(bookings)]
+                )
+        
+        # Nearby providers only, then the top estimated candidates are routed up front
+        with instrumentation.stage('candidates'):
+            nearby = self._spatial_candidates(bookings)
+            ranked = {id(b): self._rank_candidates(b, nearby.get(id(b)))[0] for b in bookings}
+            top_k = PREFILTER_TOP_K if self._prefilter_active() else None
+            candidates = {key: providers[:top_k] for key, providers in ranked.items()}
         
+        # Route every candidate/customer pair in tiled batches
+        with instrumentation.stage('routing'):
+            route_matrix.add(bookings, candidates)
+        return nearby, ranked, candidates
+    
+    def _assign_all(self, bookings: List[Booking], route_matrix: RouteMatrix, nearby: Dict,
+                    ranked: Dict, candidates: Dict, method: str, metrics: RunMetrics) -> List[Dict]:
         # Sort bookings by priority (if available) or by time
         sorted_bookings = sorted(bookings, 
                                key=lambda b: (getattr(b, 'priority', 'normal') != 'high',
                                             b.service_date, 
                                             b.service_time))
         
+        # Index provider availability once for the whole run
+        self.availability = AvailabilityIndex.from_providers(self._run_providers(bookings))
+        self.evaluation_cache = self._new_evaluation_cache()
+        
+        with metrics.stage('assignment'):
+            if method == 'greedy':
+                results = self._assign_greedy(sorted_bookings, route_matrix, nearby)
+            else:
+                results = self._assign_optimal(sorted_bookings, route_matrix, nearby, ranked, candidates)
+        
+        # Close the run; the page adds its export time to the same metrics
+        stats = self.evaluation_cache.stats()
+        metrics.record_cache('evaluation_costs', stats['cost_hits'], stats['cost_misses'])
+        metrics.record_cache('evaluation_routes', stats['route_hits'], stats['route_misses'])
+        metrics.count('bookings', len(bookings))
+        metrics.finish()
+        self.last_run_metrics = metrics
+        if PLANNING_DEBUG:
+            print(metrics.report())
+        
+        return results
+    
+    def _assign_greedy(self, sorted_bookings: List[Booking], route_matrix: RouteMatrix,
+                       nearby: Dict[int, List[Provider]]) -> List[Dict]:
+        """Assign bookings one at a time, cheapest available provider first"""
+        
+        results = []
+        assigned_providers = {}  # Track provider assignments
+        
         for booking in sorted_bookings:
-            best_provider_data = self.calculate_best_provider(booking)
+            with tracing.span('booking', 'booking', booking_id=booking.booking_id):
+                best_provider_data = self._best_provider(booking, route_matrix, nearby.get(id(booking)))
             
             # If provider already assigned nearby, add travel cost savings
-            if best_provider_data and best_provider_data['provider'].id in assigned_providers:
-                last_booking = assigned_providers[best_provider_data['provider'].id]
+            if best_provider_data and best_provider_data.provider.id in assigned_providers:
+                last_booking = assigned_providers[best_provider_data.provider.id]
                 # Check if this booking is on the same day and nearby
                 if (booking.service_date == last_booking['date'] and 
                     self._are_bookings_nearby(last_booking['address'], booking.customer_address)):
                     # Reduce travel cost as provider is already in the area
-                    best_provider_data['travel_cost'] *= 0.5
-                    best_provider_data['total_cost'] = (
-                        best_provider_data['travel_cost'] + 
-                        best_provider_data['service_cost']
+                    best_provider_data.travel_cost *= 0.5
+                    best_provider_data.total_cost = (
+                        best_provider_data.travel_cost + 
+                        best_provider_data.service_cost
                     )
-                    best_provider_data['optimized'] = True
+                    best_provider_data.optimized = True
             
             # Track assignment
             if best_provider_data:
-                assigned_providers[best_provider_data['provider'].id] = {
+                assigned_providers[best_provider_data.provider.id] = {
                     'date': booking.service_date,
                     'address': booking.customer_address
                 }
+                # Later bookings in this run see the provider as busy
+                self.availability.assign(best_provider_data.provider, booking)
             
             results.append({
                 'booking': booking,
-                'best_provider': best_provider_data
+                'best_provider': best_provider_data,
+                'unassigned_reason': None if best_provider_data else NO_PROVIDER_IN_RANGE
             })
         
+        matched = [r['best_provider'] for r in results if r['best_provider']]
+        self.last_assignment_summary = {
+            'method': 'greedy',
+            'bookings': len(results),
+            'assigned': len(matched),
+            'total_cost': round(sum(b.total_cost for b in matched), 2),
+            'evaluation_cache': self.evaluation_cache.stats()
+        }
+        
         return results
     
+    def _assign_optimal(self, sorted_bookings: List[Booking], route_matrix: RouteMatrix,
+                        nearby: Dict[int, List[Provider]], ranked: Dict[int, List[Provider]],
+                        candidates: Dict[int, List[Provider]]) -> List[Dict]:
+        """Solve each day's bookings together at minimum total cost
+        
+        Bookings with no routable candidate (none within reach) get their next
+        PREFILTER_TOP_K candidates routed, for at most WIDEN_MAX_ROUNDS rounds,
+        and only those bookings are placed again around the day's plan. Once
+        a booking's nearby providers are used up, its ranking is extended with
+        every other provider of its service type. Bookings whose candidates
+        are only busy or full are not widened.
+        """
+        
+        best_by_booking = {}
+        unassigned_reasons = {}
+        summary = {
+            'method': 'optimal',
+            'bookings': len(sorted_bookings),
+            'assigned': 0,
+            'fallback': 0,
+            'unassigned': 0,
+            'total_cost': 0.0,
+            'greedy_assigned': 0,
+            'greedy_total_cost': 0.0,
+            'solve_seconds': 0.0
+        }
+        
+        # Bookings on different days never compete for provider capacity
+        days = {}
+        for booking in sorted_bookings:
+            days.setdefault(booking.service_date, []).append(booking)
+        
+        for day_bookings in days.values():
+            intervals = np.array([self._booking_interval(b) for b in day_bookings])
+            high_priority = np.array([getattr(b, 'priority', None) == 'high' for b in day_bookings])
+            assignment = None
+            
+            for widen_round in range(WIDEN_MAX_ROUNDS + 1):
+                previous = providers if assignment is not None else None
+                with tracing.span('evaluate_day', 'booking', date=str(day_bookings[0].service_date),
+                                  bookings=len(day_bookings)):
+                    providers, components, pair_index, candidate_mask, allowed = self._evaluate_day(
+                        day_bookings, route_matrix, candidates
+                    )
+                if not providers:
+                    # Nothing routable yet: every booking is a widening candidate
+                    assignment = np.full(len(day_bookings), -1)
+                    cost = np.empty((len(day_bookings), 0))
+                else:
+                    # Bookings x providers cost, infinite where the pair is not a candidate
+                    cost = np.where(candidate_mask, components['total_cost'][pair_index], np.inf).T
+                    # Only providers that declare MaxDailyBookings are capped
+                    capacity = np.array([
+                        int(value_or_default(getattr(p, 'max_daily_bookings', None), len(day_bookings)))
+                        for p in providers
+                    ])
+                
+                    started = time.perf_counter()
+                    if assignment is None:
+                        with tracing.span('solve', 'assignment', bookings=len(day_bookings), providers=len(providers)):
+                            assignment = self.assignment_solver.solve(cost, allowed, capacity, intervals, high_priority)
+                    else:
+                        # The day's plan stays; only the widened bookings are placed
+                        column = {p.id: i for i, p in enumerate(providers)}
+                        kept = np.array([column[previous[p].id] if p >= 0 else -1 for p in assignment])
+                        with tracing.span('solve', 'assignment', bookings=len(widened), providers=len(providers)):
+                            assignment = self.assignment_solver.solve_rows(
+                                cost, allowed, capacity, intervals, widened, kept
+                            )
+                    summary['solve_seconds'] += time.perf_counter() - started
+                
+                if widen_round == WIDEN_MAX_ROUNDS:
+                    break
+                
+                # Widen bookings with no routable candidate; busy or full
+                # candidates are left to the fallback below
+                widened = []
+                for j, booking in enumerate(day_bookings):
+                    key = id(booking)
+                    if assignment[j] >= 0 or np.isfinite(cost[j]).any():
+                        continue
+                    if len(candidates[key]) >= len(ranked[key]) and nearby.pop(key, None) is not None:
+                        ranked[key] = ranked[key] + self._beyond_nearby(booking, ranked[key])
+                    if len(candidates[key]) < len(ranked[key]):
+                        widened.append(j)
+                if not widened:
+                    break
+                for j in widened:
+                    key = id(day_bookings[j])
+                    candidates[key] = ranked[key][:len(candidates[key]) + PREFILTER_TOP_K]
+                with instrumentation.stage('routing'):
+                    route_matrix.add([day_bookings[j] for j in widened], candidates)
+            
+            if not providers:
+                continue
+            
+            greedy = self.assignment_solver.greedy(cost, allowed, capacity, intervals, range(len(day_bookings)))
+            summary['greedy_assigned'] += int((greedy >= 0).sum())
+            summary['greedy_total_cost'] += self.assignment_solver.total_cost(cost, greedy)
+            
+            booked = np.bincount(assignment[assignment >= 0], minlength=len(providers))
+            for j, booking in enumerate(day_bookings):
+                p = int(assignment[j])
+                is_available = p >= 0 and bool(allowed[j, p])
+                
+                # Nobody free at that time: as in the greedy planner, take the
+                # cheapest candidate regardless, within declared daily limits
+                if p < 0:
+                    spare = np.isfinite(cost[j]) & (booked < capacity)
+                    if not spare.any():
+                        summary['unassigned'] += 1
+                        unassigned_reasons[id(booking)] = (
+                            NO_PROVIDER_IN_RANGE if not np.isfinite(cost[j]).any()
+                            else "Every candidate provider is at its daily limit (MaxDailyBookings)"
+                        )
+                        continue
+                    instrumentation.count('warnings.busy_fallback')
+                    if PLANNING_DEBUG:
+                        print(f"Warning: No available providers for {booking.booking_id}, selecting cheapest")
+                    p = int(np.argmin(np.where(spare, cost[j], np.inf)))
+                    booked[p] += 1
+                    summary['fallback'] += 1
+                else:
+                    summary['assigned'] += 1
+                
+                best_data = self._build_cost_data(
+                    booking, providers[p], components, pair_index[p, j], is_available
+                )
+                rows = np.flatnonzero(candidate_mask[:, j])
+                best_data.all_providers = CandidateCosts.from_components(
+                    providers, components, rows, pair_index[rows, j], allowed[j, rows]
+                )
+                best_data.total_providers_evaluated = len(booking.providers)
+                best_data.total_providers_routed = len(rows)
+                best_by_booking[id(booking)] = best_data
+            
+            # Record the day's assignments in the availability index
+            for j, booking in enumerate(day_bookings):
+                best_data = best_by_booking.get(id(booking))
+                if best_data:
+                    self.availability.assign(best_data.provider, booking)
+        
+        summary['total_cost'] = round(sum(b.total_cost for b in best_by_booking.values()), 2)
+        summary['greedy_total_cost'] = round(summary['greedy_total_cost'], 2)
+        # Positive gap means the optimal plan is cheaper than greedy
+        summary['cost_gap'] = round(summary['greedy_total_cost'] - summary['total_cost'], 2)
+        summary['evaluation_cache'] = self.evaluation_cache.stats()
+        self.last_assignment_summary = summary
+        
+        if PLANNING_DEBUG:
+            print(f"Assignment: £{summary['total_cost']:.2f} for {summary['assigned']} bookings "
+                  f"(greedy £{summary['greedy_total_cost']:.2f}, gap £{summary['cost_gap']:.2f})")
+        
+        return [
+            {
+                'booking': booking,
+                'best_provider': best_by_booking.get(id(booking)),
+                'unassigned_reason': (None if id(booking) in best_by_booking
+                                      else unassigned_reasons.get(id(booking), NO_PROVIDER_IN_RANGE))
+            }
+            for booking in sorted_bookings
+        ]
+    
+    def _beyond_nearby(self, booking: Booking, ranked: List[Provider]) -> List[Provider]:
+        """The booking's other providers (outside the spatial candidates), ranked"""
+        seen = {p.id for p in ranked}
+        with instrumentation.stage('candidates'):
+            return [p for p in self._rank_candidates(booking)[0] if p.id not in seen]
+    
+    def _evaluate_day(self, day_bookings: List[Booking], route_matrix: RouteMatrix,
+                      candidates: Dict[int, List[Provider]]):
+        """Cost every candidate provider against every booking of a day
+        
+        Only candidate pairs are evaluated, through the run's evaluation
+        cache, so a day solved again after widening only evaluates the new
+        pairs. Returns the day's unique providers, the kernel components (one
+        row per pair), the pair row of each providers x bookings cell (-1
+        where none), the candidate mask (providers x bookings) and the
+        availability mask (bookings x providers).
+        """
+        provider_index = {}
+        providers = []
+        pair_providers, pair_bookings = [], []
+        for j, booking in enumerate(day_bookings):
+            for provider in candidates[id(booking)]:
+                if provider.id not in provider_index:
+                    provider_index[provider.id] = len(providers)
+                    providers.append(provider)
+                pair_providers.append(provider_index[provider.id])
+                pair_bookings.append(j)
+        
+        if not providers:
+            return providers, None, None, None, None
+        
+        pair_providers = np.array(pair_providers, dtype=int)
+        pair_bookings = np.array(pair_bookings, dtype=int)
+        # Slice shared provider arrays when the day's bookings come from one upload
+        table = self._shared_table(day_bookings)
+        
+        def evaluate(positions: np.ndarray) -> Dict[str, np.ndarray]:
+            with instrumentation.stage('evaluation'):
+                distance, duration = route_matrix.pairs(
+                    [p.address for p in providers], [b.customer_address for b in day_bookings],
+                    pair_providers[positions], pair_bookings[positions]
+                )
+                return self.cost_kernel.evaluate_pairs(
+                    providers, day_bookings, pair_providers[positions], pair_bookings[positions],
+                    distance, duration, table, self.evaluation_cache.is_peak
+                )
+        
+        components = self.evaluation_cache.pair_components(
+            [(id(day_bookings[j]), providers[i].id) for i, j in zip(pair_providers, pair_bookings)],
+            evaluate
+        )
+        
+        pair_index = np.full((len(providers), len(day_bookings)), -1, dtype=np.int32)
+        pair_index[pair_providers, pair_bookings] = np.arange(len(pair_providers))
+        
+        candidate_mask = np.zeros((len(providers), len(day_bookings)), dtype=bool)
+        allowed = np.zeros((len(day_bookings), len(providers)), dtype=bool)
+        for pair, (i, j) in enumerate(zip(pair_providers.tolist(), pair_bookings.tolist())):
+            candidate_mask[i, j] = (self._within_max_distance(providers[i], components['distance'][pair])
+                                    and np.isfinite(components['total_cost'][pair]))
+            allowed[j, i] = self._check_provider_availability(providers[i], day_bookings[j])
+        
+        return providers, components, pair_index, candidate_mask, allowed
+    
+    @staticmethod
+    def _booking_interval(booking: Booking):
+        """Booking start and end in minutes after midnight (NaN if unknown)"""
+        return booking_interval(booking) or (np.nan, np.nan)
+    
     def _are_bookings_nearby(self, address1: str, address2: str) -> bool:
         """Check if two addresses are nearby (within 5 miles)"""
-        route = self.maps_service.get_distance_duration(address1, address2)
+        with instrumentation.stage('routing'):
+            route = self.evaluation_cache.get_routes(
+                [(address1, address2)],
+                lambda pairs: [self.maps_service.get_distance_duration(*pairs[0])]
+            )[0]
         if route['success']:
             return route['distance_miles'] < 5
         return False
\ No newline at end of file
@@ -0,0 +1,360 @@
+import numpy as np
+from typing import Dict, List, Optional
+from models.booking import Booking, Provider
+from models.provider_table import ProviderTable
+from services import instrumentation
+from services.uk_transport import UKTransportService
+
+# Travel mode codes used by the vectorized kernel
+MODE_CAR = 0
+MODE_VAN = 1
+MODE_CAR_AND_PUBLIC = 2
+MODE_PUBLIC = 3
+MODE_OTHER = 4
+
+TRAVEL_MODE_CODES = {
+    'Car': MODE_CAR,
+    'Van': MODE_VAN,
+    'Car and Public Transport': MODE_CAR_AND_PUBLIC,
+    'Public Transport': MODE_PUBLIC
+}
+
+# Public transport option chosen for a row
+PT_NONE = 0
+PT_TRAIN = 1
+PT_COACH = 2
+PT_BUS_ESTIMATE = 3
+
+# Default rates when a provider does not carry its own
+DEFAULT_SERVICE_COST = 50.00
+DEFAULT_TRAVEL_TIME_RATE = 15.00
+DEFAULT_MILEAGE_RATE = 0.45
+DEFAULT_SERVICE_DURATION = 2.0
+
+# Itemized travel cost arrays of evaluate(); they sum to travel_cost
+COST_COMPONENTS = ('mileage', 'parking', 'congestion_charge', 'tolls', 'mileage_to_station',
+                   'park_and_ride', 'public_transport', 'travel_time')
+
+# evaluate() outputs that breakdown() reads for one row
+BREAKDOWN_FIELDS = COST_COMPONENTS + ('mode', 'pt_kind', 'toll_mask', 'is_peak')
+
+PARK_AND_RIDE_COST = 5.00
+PARK_AND_RIDE_SHARE = 0.3  # Share of the distance driven to the station
+BUS_COST_PER_MILE = 0.20
+
+
+def travel_mode_code(travel_mode: Optional[str]) -> int:
+    """Map a provider travel mode to its kernel code"""
+    return TRAVEL_MODE_CODES.get(travel_mode, MODE_OTHER)
+
+
+def value_or_default(value, default: float) -> float:
+    """Use the default when an optional rate or duration is missing"""
+    return default if value is None else float(value)
+
+
+class CostKernel:
+    """Vectorized provider cost calculation for all travel modes
+
+    Address-dependent tariffs (parking, congestion, tolls, fare cities) are
+    resolved once per unique address and then combined with distance/duration
+    arrays in a single pass. Arrays may be 1-D (providers of one booking) or
+    broadcast to a providers x bookings matrix.
+    """
+
+    def __init__(self, uk_transport: UKTransportService):
+        self.uk_transport = uk_transport
+        self._profiles: Dict[str, Dict] = {}
+        self._table_arrays: Optional[tuple] = None  # (table, arrays) of the latest table
+
+        # Toll roads as bits, with total charges for every combination of bits
+        self.toll_names = list(uk_transport.toll_roads.keys())
+        combos = 1 << len(self.toll_names)
+        self.toll_car = np.zeros(combos)
+        self.toll_van = np.zeros(combos)
+        for mask in range(combos):
+            for bit, name in enumerate(self.toll_names):
+                if mask & (1 << bit):
+                    self.toll_car[mask] += uk_transport.toll_roads[name]['car_charge']
+                    self.toll_van[mask] += uk_transport.toll_roads[name]['van_charge']
+
+        # Route-specific train fares indexed [origin_city, destination_city];
+        # the extra last index means "no recognised city"
+        cities = uk_transport.fare_cities
+        self.fare_peak = np.full((len(cities) + 1, len(cities) + 1), np.nan)
+        self.fare_off_peak = np.full((len(cities) + 1, len(cities) + 1), np.nan)
+        for i, origin_city in enumerate(cities):
+            for j, dest_city in enumerate(cities):
+                fares = uk_transport.specific_fares.get(tuple(sorted([origin_city, dest_city])))
+                if fares:
+                    self.fare_peak[i, j] = fares['peak']
+                    self.fare_off_peak[i, j] = fares['off_peak']
+
+    def address_profile(self, address: str) -> Dict:
+        """Tariff attributes of an address, resolved once and memoized"""
+        profile = self._profiles.get(address)
+        if profile is None:
+            address_lower = address.lower()
+
+            city = len(self.uk_transport.fare_cities)
+            for i, fare_city in enumerate(self.uk_transport.fare_cities):
+                if fare_city in address_lower:
+                    city = i
+
+            toll_mask = 0
+            for bit, name in enumerate(self.toll_names):
+                locations = self.uk_transport.toll_roads[name]['locations']
+                if any(location.lower() in address_lower for location in locations):
+                    toll_mask |= 1 << bit
+
+            profile = {
+                'city': city,
+                'london': 'london' in address_lower,
+                'toll_mask': toll_mask,
+                'parking_rate': self.uk_transport.get_parking_costs(address, 1.0)['hourly_rate'],
+                'congestion': self.uk_transport.get_congestion_charge(address)['charge']
+            }
+            self._profiles[address] = profile
+        return profile
+
+    def address_profiles(self, addresses: List[str]) -> List[Dict]:
+        """address_profile for a batch, timed and counted as tariff lookups"""
+        with instrumentation.stage('tariffs'):
+            known = len(self._profiles)
+            profiles = [self.address_profile(address) for address in addresses]
+            resolved = len(self._profiles) - known
+        instrumentation.current().record_cache('tariff_profiles', len(profiles) - resolved, resolved)
+        return profiles
+
+    def provider_arrays(self, providers: List[Provider],
+                        table: Optional[ProviderTable] = None) -> Dict[str, np.ndarray]:
+        """Rates, mode codes and address tariffs for a list of providers
+        
+        With the providers' ProviderTable, the arrays are row slices of the
+        table's arrays (built once per table) instead of per-provider lookups.
+        """
+        if table is not None:
+            rows = table.rows(providers)
+            return {name: values[rows] for name, values in self.table_arrays(table).items()}
+        
+        profiles = self.address_profiles([p.address for p in providers])
+        return {
+            'service_cost': np.array([value_or_default(getattr(p, 'service_cost', None), DEFAULT_SERVICE_COST)
+                                      for p in providers], dtype=float),
+            'travel_time_rate': np.array([value_or_default(getattr(p, 'travel_time_rate', None), DEFAULT_TRAVEL_TIME_RATE)
+                                          for p in providers], dtype=float),
+            'mileage_rate': np.array([value_or_default(getattr(p, 'mileage_rate', None), DEFAULT_MILEAGE_RATE)
+                                      for p in providers], dtype=float),
+            'mode': np.array([travel_mode_code(getattr(p, 'travel_mode', None)) for p in providers], dtype=np.int8),
+            'city': np.array([pr['city'] for pr in profiles], dtype=np.int16),
+            'london': np.array([pr['london'] for pr in profiles], dtype=bool),
+            'toll_mask': np.array([pr['toll_mask'] for pr in profiles], dtype=np.int16)
+        }
+
+    def table_arrays(self, table: ProviderTable) -> Dict[str, np.ndarray]:
+        """provider_arrays for every row of a table, memoized for the latest table"""
+        cached = self._table_arrays
+        if cached is None or cached[0] is not table:
+            profiles = self.address_profiles(table.addresses)
+            arrays = {
+                'service_cost': np.where(np.isnan(table.service_cost), DEFAULT_SERVICE_COST, table.service_cost),
+                'travel_time_rate': np.where(np.isnan(table.travel_time_rate), DEFAULT_TRAVEL_TIME_RATE,
+                                             table.travel_time_rate),
+                'mileage_rate': np.where(np.isnan(table.mileage_rate), DEFAULT_MILEAGE_RATE, table.mileage_rate),
+                'mode': np.array([travel_mode_code(mode) for mode in table.travel_modes], dtype=np.int8),
+                'city': np.array([pr['city'] for pr in profiles], dtype=np.int16),
+                'london': np.array([pr['london'] for pr in profiles], dtype=bool),
+                'toll_mask': np.array([pr['toll_mask'] for pr in profiles], dtype=np.int16)
+            }
+            # Only one upload is planned at a time, so older tables are dropped
+            cached = self._table_arrays = (table, arrays)
+        return cached[1]
+
+    def booking_arrays(self, bookings: List[Booking]) -> Dict[str, np.ndarray]:
+        """Customer-side tariffs (parking for the service duration, congestion)"""
+        profiles = self.address_profiles([b.customer_address for b in bookings])
+        durations = np.array([value_or_default(getattr(b, 'duration', None), DEFAULT_SERVICE_DURATION)
+                              for b in bookings], dtype=float)
+        parking_rate = np.array([pr['parking_rate'] for pr in profiles], dtype=float)
+
+        return {
+            'service_duration': durations,
+            # Daily cap after 8 hours, as in UKTransportService.get_parking_costs
+            'parking': np.where(durations >= 8, parking_rate * 8, np.round(parking_rate * durations, 2)),
+            'congestion': np.array([pr['congestion'] for pr in profiles], dtype=float),
+            'city': np.array([pr['city'] for pr in profiles], dtype=np.int16),
+            'london': np.array([pr['london'] for pr in profiles], dtype=bool),
+            'toll_mask': np.array([pr['toll_mask'] for pr in profiles], dtype=np.int16)
+        }
+
+    def evaluate(self, distance: np.ndarray, duration: np.ndarray,
+                 providers: Dict[str, np.ndarray], bookings: Dict[str, np.ndarray],
+                 is_peak: Optional[bool] = None) -> Dict[str, np.ndarray]:
+        """Compute every cost component for all rows in one pass
+
+        providers and bookings are the dicts from provider_arrays and
+        booking_arrays, already shaped to broadcast against distance.
+        """
+        if is_peak is None:
+            is_peak = self.uk_transport._is_peak_time()
+
+        distance = np.asarray(distance, dtype=float)
+        duration = np.asarray(duration, dtype=float)
+        shape = np.broadcast(distance, providers['mode'], bookings['parking']).shape
+        zeros = np.zeros(shape)
+
+        mode = np.broadcast_to(providers['mode'], shape)
+        mileage_rate = providers['mileage_rate']
+        driving = (mode == MODE_CAR) | (mode == MODE_VAN)
+        mixed = mode == MODE_CAR_AND_PUBLIC
+        public = mode == MODE_PUBLIC
+
+        # Car or Van: round-trip mileage, parking, congestion and tolls
+        mileage = np.where(driving, np.round(distance * 2 * mileage_rate, 2), zeros)
+        parking = np.where(driving, bookings['parking'], zeros)
+        congestion = np.where(driving, bookings['congestion'], zeros)
+
+        toll_mask = providers['toll_mask'] | bookings['toll_mask']
+        tolls = np.where(mode == MODE_CAR, self.toll_car[toll_mask],
+                         np.where(mode == MODE_VAN, self.toll_van[toll_mask], zeros))
+
+        # Train fares: route-specific where known, per mile otherwise.
+        # London to London journeys use TfL and have no train option.
+        fares = self.fare_peak if is_peak else self.fare_off_peak
+        route_fare = fares[providers['city'], bookings['city']]
+        train_rate = self.uk_transport.train_cost_per_mile['peak' if is_peak else 'off_peak']
+        has_train = ~(providers['london'] & bookings['london'])
+
+        def train_cost(miles):
+            return np.round(np.where(np.isnan(route_fare), miles * train_rate, route_fare), 2)
+
+        # Car and Public Transport: drive to park & ride, then train or bus
+        mileage_to_station = np.where(
+            mixed, np.round(distance * PARK_AND_RIDE_SHARE * 2 * mileage_rate, 2), zeros
+        )
+        park_and_ride = np.where(mixed, PARK_AND_RIDE_COST, zeros)
+        public_distance = distance * (1 - PARK_AND_RIDE_SHARE)
+        mixed_public = np.where(has_train, train_cost(public_distance) * 2,
+                                np.round(public_distance * 2 * BUS_COST_PER_MILE, 2))
+
+        # Public Transport only: train under 100 miles, coach beyond
+        coach = np.round(distance * self.uk_transport.bus_cost_per_mile, 2) * 2
+        public_only = np.where(has_train,
+                               np.where(distance < 100, train_cost(distance) * 2, coach),
+                               np.round(distance * 2 * BUS_COST_PER_MILE, 2))
+
+        public_transport = np.where(mixed, mixed_public, np.where(public, public_only, zeros))
+        pt_kind = np.where(
+            public & has_train, np.where(distance < 100, PT_TRAIN, PT_COACH),
+            np.where(public, PT_BUS_ESTIMATE,
+                     np.where(mixed, np.where(has_train, PT_TRAIN, PT_BUS_ESTIMATE), PT_NONE))
+        ).astype(np.int8)
+
+        # Travel time compensation (round trip)
+        travel_time = np.round((duration * 2) / 60 * providers['travel_time_rate'], 2)
+
+        travel_cost = (mileage + parking + congestion + tolls + mileage_to_station
+                       + park_and_ride + public_transport + travel_time)
+        total_cost = np.round(travel_cost + providers['service_cost'], 2)
+
+        return {
+            'distance': np.broadcast_to(distance, shape),
+            'duration': np.broadcast_to(duration, shape),
+            'mode': mode,
+            'mileage': mileage,
+            'parking': parking,
+            'congestion_charge': congestion,
+            'tolls': tolls,
+            'toll_mask': np.broadcast_to(toll_mask, shape),
+            'mileage_to_station': mileage_to_station,
+            'park_and_ride': park_and_ride,
+            'public_transport': public_transport,
+            'pt_kind': pt_kind,
+            'is_peak': is_peak,
+            'travel_time': travel_time,
+            'travel_cost': np.round(travel_cost, 2),
+            'service_cost': np.broadcast_to(providers['service_cost'], shape),
+            'total_cost': total_cost
+        }
+
+    def evaluate_matrix(self, providers: List[Provider], bookings: List[Booking],
+                        distance: np.ndarray, duration: np.ndarray,
+                        table: Optional[ProviderTable] = None) -> Dict[str, np.ndarray]:
+        """Evaluate a providers x bookings distance/duration matrix in one pass"""
+        provider_arrays = {k: v[:, np.newaxis] for k, v in self.provider_arrays(providers, table).items()}
+        booking_arrays = {k: v[np.newaxis, :] for k, v in self.booking_arrays(bookings).items()}
+        return self.evaluate(distance, duration, provider_arrays, booking_arrays)
+
+    def evaluate_pairs(self, providers: List[Provider], bookings: List[Booking],
+                       provider_index: np.ndarray, booking_index: np.ndarray,
+                       distance: np.ndarray, duration: np.ndarray,
+                       table: Optional[ProviderTable] = None,
+                       is_peak: Optional[bool] = None) -> Dict[str, np.ndarray]:
+        """Evaluate only the (providers[i], bookings[j]) pairs listed in the index arrays
+
+        Tariff arrays are built once for the unique providers and bookings and
+        gathered per pair, so sparse candidate sets cost what they contain
+        rather than the full providers x bookings matrix.
+        """
+        provider_arrays = {k: v[provider_index] for k, v in self.provider_arrays(providers, table).items()}
+        booking_arrays = {k: v[booking_index] for k, v in self.booking_arrays(bookings).items()}
+        return self.evaluate(distance, duration, provider_arrays, booking_arrays, is_peak)
+
+    @staticmethod
+    def breakdown_values(components: Dict[str, np.ndarray], index) -> np.ndarray:
+        """The BREAKDOWN_FIELDS of one row, to rebuild its breakdown later"""
+        return np.array([float(components[name] if name == 'is_peak' else components[name][index])
+                         for name in BREAKDOWN_FIELDS])
+
+    def breakdown_from_values(self, values: np.ndarray, customer_address: str) -> Dict:
+        """breakdown() of a row kept with breakdown_values()"""
+        return self.breakdown(dict(zip(BREAKDOWN_FIELDS, values[:, np.newaxis])), 0, customer_address)
+
+    def breakdown(self, components: Dict[str, np.ndarray], index, customer_address: str) -> Dict:
+        """Materialize the itemized travel breakdown for a single row"""
+        mode = int(components['mode'][index])
+        breakdown = {}
+
+        if mode in (MODE_CAR, MODE_VAN):
+            breakdown['mileage'] = float(components['mileage'][index])
+
+            parking = float(components['parking'][index])
+            if parking > 0:
+                breakdown['parking'] = parking
+
+            congestion = float(components['congestion_charge'][index])
+            if congestion > 0:
+                breakdown['congestion_charge'] = congestion
+                breakdown['congestion_zone'] = self.uk_transport.get_congestion_charge(
+                    customer_address
+                ).get('name', 'Charge Zone')
+
+            toll_mask = int(components['toll_mask'][index])
+            if toll_mask:
+                breakdown['tolls'] = float(components['tolls'][index])
+                breakdown['toll_roads'] = [name for bit, name in enumerate(self.toll_names)
+                                           if toll_mask & (1 << bit)]
+
+        elif mode == MODE_CAR_AND_PUBLIC:
+            breakdown['mileage_to_station'] = float(components['mileage_to_station'][index])
+            breakdown['park_and_ride'] = float(components['park_and_ride'][index])
+            breakdown['public_transport'] = float(components['public_transport'][index])
+            if int(components['pt_kind'][index]) == PT_TRAIN:
+                breakdown['transport_type'] = 'Park & Ride + Train'
+            else:
+                breakdown['transport_type'] = 'Park & Ride + Bus'
+            breakdown['mode_note'] = 'Car to station, then public transport'
+
+        elif mode == MODE_PUBLIC:
+            breakdown['public_transport'] = float(components['public_transport'][index])
+            pt_kind = int(components['pt_kind'][index])
+            if pt_kind == PT_TRAIN:
+                breakdown['transport_type'] = 'Train'
+                breakdown['is_peak'] = bool(components['is_peak'])
+            elif pt_kind == PT_COACH:
+                breakdown['transport_type'] = 'Coach'
+            else:
+                breakdown['transport_type'] = 'Bus (estimated)'
+
+        breakdown['travel_time'] = float(components['travel_time'][index])
+        return breakdown
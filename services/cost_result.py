@@ -0,0 +1,214 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+from models.booking import Booking, Provider
+from services.cost_kernel import (
+    COST_COMPONENTS,
+    DEFAULT_TRAVEL_TIME_RATE,
+    DEFAULT_MILEAGE_RATE,
+    DEFAULT_SERVICE_DURATION,
+    CostKernel,
+    value_or_default
+)
+
+if TYPE_CHECKING:
+    from services.maps_service import MapsService
+
+# Numbers kept for every evaluated provider, one column each
+CANDIDATE_FIELDS = ('total_cost', 'distance', 'duration', 'travel_cost', 'service_cost') + COST_COMPONENTS
+
+# Keys a CostResult answers to, as in the result dicts it replaced
+RESULT_KEYS = (
+    'provider', 'distance', 'duration', 'travel_breakdown', 'travel_cost', 'service_cost',
+    'total_cost', 'route_info', 'route_details', 'is_available', 'cost_details', 'optimized',
+    'all_providers', 'total_providers_evaluated', 'total_providers_routed'
+)
+
+
+def estimate_traffic(service_time: str) -> str:
+    """Estimate traffic conditions based on time"""
+    try:
+        hour = int(service_time.split(':')[0])
+        if 7 <= hour <= 9 or 17 <= hour <= 19:
+            return "Heavy (Rush Hour)"
+        elif 10 <= hour <= 16:
+            return "Moderate"
+        else:
+            return "Light"
+    except:
+        return "Unknown"
+
+
+@dataclass(slots=True)
+class ResultDetails:
+    """What a CostResult needs to rebuild its details
+
+    Holds the cost kernel (for the breakdown) and the maps service (for
+    the route) rather than the calculator, so stored results do not keep
+    a run's caches and indexes alive.
+    """
+    cost_kernel: CostKernel
+    maps_service: 'MapsService'
+
+    def breakdown(self, values: np.ndarray, customer_address: str) -> Dict:
+        return self.cost_kernel.breakdown_from_values(values, customer_address)
+
+    def route(self, result: 'CostResult') -> Dict:
+        """Full route (polyline, bounds) for a selected provider
+
+        Directions go through the maps route cache, so only the first read of
+        a route calls the API.
+        """
+        route_info = self.maps_service.get_route_with_directions(
+            result.provider.address, result.booking.customer_address
+        )
+        if not route_info['success']:
+            return {'success': True, 'distance_miles': result.distance, 'duration_minutes': result.duration}
+
+        # Keep the matrix distance/duration the costs were calculated from
+        route_info = dict(route_info)
+        route_info['distance_miles'] = result.distance
+        route_info['duration_minutes'] = result.duration
+        return route_info
+
+
+@dataclass(slots=True)
+class CandidateCosts:
+    """Costs of every provider evaluated for one booking, as arrays
+
+    providers is the list the costs were evaluated over (shared by all
+    bookings of a day) and rows picks this booking's candidates from it.
+    Indexing or iterating gives the per-provider comparison dicts.
+    """
+    providers: List[Provider]
+    rows: np.ndarray
+    available: np.ndarray
+    values: np.ndarray  # len(rows) x len(CANDIDATE_FIELDS)
+
+    @classmethod
+    def from_components(cls, providers: List[Provider], components: Dict[str, np.ndarray],
+                        rows: np.ndarray, columns, available: np.ndarray) -> 'CandidateCosts':
+        """Candidates at rows of the providers; columns selects them in the component arrays"""
+        values = np.empty((len(rows), len(CANDIDATE_FIELDS)))
+        for k, name in enumerate(CANDIDATE_FIELDS):
+            values[:, k] = components[name][columns]
+        return cls(providers, np.asarray(rows, dtype=np.int32), np.asarray(available, dtype=bool), values)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, i: int) -> Dict:
+        provider = self.providers[self.rows[i]]
+        values = dict(zip(CANDIDATE_FIELDS, self.values[i].tolist()))
+        return {
+            'provider_name': provider.name,
+            'provider_id': provider.id,
+            'total_cost': values['total_cost'],
+            'distance': values['distance'],
+            'duration': values['duration'],
+            'travel_cost': values['travel_cost'],
+            'service_cost': values['service_cost'],
+            'available': bool(self.available[i]),
+            **{name: values[name] for name in COST_COMPONENTS}
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        return (self[i] for i in range(len(self)))
+
+    def column(self, name: str) -> np.ndarray:
+        return self.values[:, CANDIDATE_FIELDS.index(name)]
+
+    def provider_ids(self) -> List[str]:
+        return [self.providers[row].id for row in self.rows]
+
+    def position(self, provider_id: str) -> Optional[int]:
+        """Index of a provider among the candidates, or None"""
+        return next((i for i, row in enumerate(self.rows) if self.providers[row].id == provider_id), None)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """All candidates in one frame, with the columns of the comparison dicts"""
+        frame = pd.DataFrame({
+            'provider_name': [self.providers[row].name for row in self.rows],
+            'provider_id': self.provider_ids()
+        })
+        for name in ('total_cost', 'distance', 'duration', 'travel_cost', 'service_cost'):
+            frame[name] = self.column(name)
+        frame['available'] = self.available
+        for name in COST_COMPONENTS:
+            frame[name] = self.column(name)
+        return frame
+
+
+@dataclass(slots=True)
+class CostResult:
+    """Cost of the provider selected for a booking
+
+    Holds the numbers only. The itemized breakdown and cost details are
+    rebuilt through details when they are read; the full route (with its
+    polyline) is loaded on first read and kept. Supports result['key'] and
+    result.get('key') like the dicts results used to be.
+    """
+    provider: Provider
+    booking: Booking
+    distance: float
+    duration: float
+    travel_cost: float
+    service_cost: float
+    total_cost: float
+    is_available: bool
+    breakdown_values: np.ndarray = field(repr=False)  # BREAKDOWN_FIELDS of the selected row
+    details: Optional[ResultDetails] = field(default=None, repr=False, compare=False)
+    all_providers: Optional[CandidateCosts] = field(default=None, repr=False)
+    total_providers_evaluated: int = 0
+    total_providers_routed: int = 0
+    optimized: bool = False
+    _route: Optional[Dict] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def travel_breakdown(self) -> Dict:
+        return self.details.breakdown(self.breakdown_values, self.booking.customer_address)
+
+    @property
+    def route_info(self) -> Dict:
+        """Full route from provider to customer, fetched (or read from the route cache) on first access"""
+        if self._route is None:
+            self._route = self.details.route(self)
+        return self._route
+
+    @property
+    def route_details(self) -> Dict:
+        return {
+            'distance_miles': self.distance,
+            'duration_minutes': self.duration,
+            'route_info': self.route_info,
+            'traffic_conditions': estimate_traffic(self.booking.service_time),
+            'weather_impact': 'Normal',  # Could be enhanced with weather API
+        }
+
+    @property
+    def cost_details(self) -> Dict:
+        provider = self.provider
+        return {
+            'service_cost': self.service_cost,
+            'travel_time_rate': value_or_default(getattr(provider, 'travel_time_rate', None), DEFAULT_TRAVEL_TIME_RATE),
+            'mileage_rate': value_or_default(getattr(provider, 'mileage_rate', None), DEFAULT_MILEAGE_RATE),
+            'travel_mode': getattr(provider, 'travel_mode', 'Car'),
+            'round_trip_distance': self.distance * 2,
+            'round_trip_duration': self.duration * 2,
+            'service_duration': value_or_default(getattr(self.booking, 'duration', None), DEFAULT_SERVICE_DURATION)
+        }
+
+    def __getitem__(self, key: str):
+        if key not in self:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in RESULT_KEYS and (key != 'all_providers' or self.all_providers is not None)
+
+    def get(self, key: str, default=None):
+        return self[key] if key in self else default
+
+    def keys(self) -> List[str]:
+        return [key for key in RESULT_KEYS if key in self]
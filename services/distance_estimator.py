@@ -0,0 +1,125 @@
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from services.maps_service import MapsService
+from services.route_cache import normalize_address
+
+EARTH_RADIUS_MILES = 3958.8
+
+# Road distance / straight-line distance by region, refined by observe()
+DEFAULT_ROAD_FACTOR = 1.3
+REGION_ROAD_FACTORS = {
+    'london': 1.45,
+    'birmingham': 1.35,
+    'manchester': 1.35,
+    'leeds': 1.35,
+    'bristol': 1.35
+}
+ROAD_FACTOR_PRIOR_WEIGHT = 20  # Observations needed to move halfway from the prior
+
+# Average driving speed by distance band (upper bound in miles, mph)
+SPEED_BANDS = ((5, 15), (20, 25), (60, 40), (np.inf, 50))
+URBAN_SPEED_FACTOR = {'london': 0.6}
+
+# Nothing is driven faster than this, so it bounds duration from below
+MAX_SPEED_MPH = 70
+
+
+def haversine_miles(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Great-circle distance in miles (vectorized)"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lng1, lat2, lng2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def region_for(address: str) -> str:
+    """Calibration region of an address ('' when no known region matches)"""
+    address = (address or '').lower()
+    for region in REGION_ROAD_FACTORS:
+        if region in address:
+            return region
+    return ''
+
+
+class DistanceEstimator:
+    """Offline road distance and duration estimates from coordinates
+
+    Straight-line (haversine) distance is scaled by a per-region road factor
+    and converted to a duration with a banded speed model. Road factors start
+    from REGION_ROAD_FACTORS and are calibrated against real routing results
+    passed to observe(). Coordinates come from the maps service's geocode
+    cache and are also kept here for the life of the estimator.
+    """
+
+    def __init__(self, maps_service: MapsService):
+        self.maps_service = maps_service
+        self._coordinates: Dict[str, Tuple[float, float]] = {}
+        self._observed: Dict[str, List[float]] = {}  # region -> [sum of ratios, count]
+
+    def coordinates(self, addresses: List[str]) -> np.ndarray:
+        """(lat, lng) per address, NaN where geocoding failed"""
+        keys = [normalize_address(a) for a in addresses]
+        missing = {key: address for key, address in zip(keys, addresses) if key not in self._coordinates}
+
+        if missing:
+            located = self.maps_service.geocode_addresses(list(missing.values()))
+            for key, location in zip(missing, located):
+                self._coordinates[key] = (location['lat'], location['lng']) if location else (np.nan, np.nan)
+
+        return np.array([self._coordinates[key] for key in keys], dtype=float).reshape(-1, 2)
+
+    def straight_line(self, origins: List[str], destination: str) -> np.ndarray:
+        """Straight-line miles from each origin to the destination"""
+        origin_coords = self.coordinates(origins)
+        destination_coords = self.coordinates([destination])[0]
+        return haversine_miles(origin_coords[:, 0], origin_coords[:, 1],
+                               destination_coords[0], destination_coords[1])
+
+    def road_factor(self, region: str) -> float:
+        """Prior road factor for a region, blended with observed ratios"""
+        prior = REGION_ROAD_FACTORS.get(region, DEFAULT_ROAD_FACTOR)
+        total, count = self._observed.get(region, (0.0, 0))
+        return (prior * ROAD_FACTOR_PRIOR_WEIGHT + total) / (ROAD_FACTOR_PRIOR_WEIGHT + count)
+
+    def estimate_duration(self, distance: np.ndarray, region: str = '') -> np.ndarray:
+        """Driving minutes for road distances using the banded speed model"""
+        distance = np.asarray(distance, dtype=float)
+        hours = np.zeros_like(distance)
+        lower = 0.0
+        for upper, speed in SPEED_BANDS:
+            hours += np.clip(distance - lower, 0, upper - lower) / speed
+            lower = upper
+        return hours * 60 / URBAN_SPEED_FACTOR.get(region, 1.0)
+
+    def estimate(self, origins: List[str], destination: str) -> Dict[str, np.ndarray]:
+        """Estimated and lower-bound distance/duration from each origin
+
+        Returns arrays 'distance', 'duration' (best estimates) and
+        'min_distance', 'min_duration' (straight line at MAX_SPEED_MPH, which
+        no real route can beat). Unknown coordinates give NaN.
+        """
+        straight = self.straight_line(origins, destination)
+        region = region_for(destination)
+        distance = straight * self.road_factor(region)
+
+        return {
+            'distance': distance,
+            'duration': self.estimate_duration(distance, region),
+            'min_distance': straight,
+            'min_duration': straight / MAX_SPEED_MPH * 60
+        }
+
+    def observe(self, origins: List[str], destination: str, road_miles: np.ndarray):
+        """Calibrate the destination region's road factor from routed distances"""
+        straight = self.straight_line(origins, destination)
+        road_miles = np.asarray(road_miles, dtype=float)
+
+        # Very short hops are dominated by geocoding noise
+        usable = np.isfinite(road_miles) & (straight > 1)
+        if not usable.any():
+            return
+
+        ratios = np.clip(road_miles[usable] / straight[usable], 1.0, 3.0)
+        observed = self._observed.setdefault(region_for(destination), [0.0, 0])
+        observed[0] += float(ratios.sum())
+        observed[1] += int(usable.sum())
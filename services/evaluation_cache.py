@@ -0,0 +1,90 @@
+import numpy as np
+from typing import Callable, Dict, List, Tuple
+from services.route_cache import normalize_address
+
+# Kernel outputs kept per (booking, provider) pair; is_peak is fixed per run
+PAIR_FIELDS = (
+    'distance', 'duration', 'mode', 'mileage', 'parking', 'congestion_charge', 'tolls', 'toll_mask',
+    'mileage_to_station', 'park_and_ride', 'public_transport', 'pt_kind', 'travel_time',
+    'travel_cost', 'service_cost', 'total_cost'
+)
+
+
+class EvaluationCache:
+    """Everything evaluated during one planning run, each pair at most once
+
+    Costs are memoized per (booking, provider) pair as rows of one growing
+    array, so the greedy search, the assignment solver's repeated day
+    solves and the result builders all read the same evaluation. Routes
+    looked up outside the run's RouteMatrix are memoized per (origin,
+    destination) address pair. Hits and misses are counted for both.
+    """
+
+    def __init__(self, is_peak: bool):
+        self.is_peak = is_peak
+        self.pair_rows: Dict[tuple, int] = {}
+        self.values = np.empty((0, len(PAIR_FIELDS)))
+        self.routes: Dict[tuple, Dict] = {}
+        self.hits = {'costs': 0, 'routes': 0}
+        self.misses = {'costs': 0, 'routes': 0}
+
+    def pair_components(self, keys: List[tuple],
+                        evaluate: Callable[[np.ndarray], Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        """Kernel components for (booking, provider) keys, one row per key
+
+        evaluate(positions) is called once with the positions of keys not
+        evaluated before in this run and returns their components.
+        """
+        missing = {}
+        for position, key in enumerate(keys):
+            if key not in self.pair_rows and key not in missing:
+                missing[key] = position
+        self.misses['costs'] += len(missing)
+        self.hits['costs'] += len(keys) - len(missing)
+
+        if missing:
+            positions = np.fromiter(missing.values(), dtype=np.int64, count=len(missing))
+            computed = evaluate(positions)
+            start = len(self.pair_rows)
+            self._reserve(start + len(missing))
+            for k, name in enumerate(PAIR_FIELDS):
+                self.values[start:start + len(missing), k] = computed[name]
+            for offset, key in enumerate(missing):
+                self.pair_rows[key] = start + offset
+
+        rows = np.fromiter((self.pair_rows[key] for key in keys), dtype=np.int64, count=len(keys))
+        components = {name: self.values[rows, k] for k, name in enumerate(PAIR_FIELDS)}
+        components['is_peak'] = self.is_peak
+        return components
+
+    def _reserve(self, size: int):
+        """Grow the value rows geometrically so appends stay amortized O(1)"""
+        if size > len(self.values):
+            grown = np.empty((max(size, 2 * len(self.values)), len(PAIR_FIELDS)))
+            grown[:len(self.pair_rows)] = self.values[:len(self.pair_rows)]
+            self.values = grown
+
+    def get_routes(self, pairs: List[Tuple[str, str]],
+                   fetch: Callable[[List[Tuple[str, str]]], List[Dict]]) -> List[Dict]:
+        """Route results for (origin, destination) pairs; fetch(pairs) gets the unseen ones"""
+        keys = [(normalize_address(origin), normalize_address(destination)) for origin, destination in pairs]
+        missing = {}
+        for pair, key in zip(pairs, keys):
+            if key not in self.routes and key not in missing:
+                missing[key] = pair
+        self.misses['routes'] += len(missing)
+        self.hits['routes'] += len(keys) - len(missing)
+
+        if missing:
+            for key, route in zip(missing, fetch(list(missing.values()))):
+                self.routes[key] = route
+
+        return [self.routes[key] for key in keys]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'cost_hits': self.hits['costs'],
+            'cost_misses': self.misses['costs'],
+            'route_hits': self.hits['routes'],
+            'route_misses': self.misses['routes']
+        }
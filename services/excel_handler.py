@@ -1,8 +1,94 @@
 import pandas as pd
+import numpy as np
+import hashlib
 import io
-from typing import List, Tuple, Dict
+import re
+import xlsxwriter
+from typing import BinaryIO, Iterable, Iterator, List, Tuple, Dict, Optional, Union
 from datetime import datetime
+from config import PLANNING_DEBUG, UPLOAD_CHUNK_ROWS
 from models.booking import Booking, Provider
+from models.provider_table import ProviderTable
+from services import instrumentation
+from services.cost_result import CandidateCosts
+from services.ingestion import (
+    IngestionReport,
+    coerce_text,
+    coerce_number,
+    coerce_time,
+    coerce_date,
+    require
+)
+from services.input_formats import iter_frames, PROVIDER_COLUMNS, BOOKING_COLUMNS
+
+# Service type token that matches every booking
+ALL_SERVICES = 'all'
+
+# Planning report sheets
+PLANNING_REPORT_COLUMNS = [
+    'Booking_ID', 'Customer_Address', 'Service_Date', 'Service_Time', 'Service_Type',
+    'Best_Provider', 'Provider_Address', 'Distance_Miles', 'Travel_Minutes',
+    'Travel_Cost', 'Service_Cost', 'Total_Cost'
+]
+PROVIDERS_COMPARED_COLUMNS = [
+    'Booking_ID', 'Provider_ID', 'Provider_Name', 'Distance_Miles', 'Travel_Minutes',
+    'Travel_Cost', 'Service_Cost', 'Total_Cost', 'Available', 'Selected'
+]
+
+# Numbered booking columns of the provider journey sheet
+JOURNEY_BOOKING_COLUMN = re.compile(r'^Booking_(Location|Appointment_Time|Duration)_(\d+)$')
+
+def normalize_service_type(service_type) -> str:
+    """Case-insensitive, whitespace-trimmed service type token"""
+    return ' '.join(str(service_type or '').split()).lower()
+
+def service_type_tokens(service_types) -> List[str]:
+    """Normalized tokens of a comma-separated ServiceTypes value"""
+    tokens = [normalize_service_type(s) for s in str(service_types or '').split(',')]
+    return [t for t in tokens if t]
+
+def build_service_type_index(providers: List[Provider]) -> Dict[str, List[str]]:
+    """Map each service type token to the ids of providers offering it"""
+    index: Dict[str, List[str]] = {}
+    for provider in providers:
+        for token in dict.fromkeys(service_type_tokens(provider.service_types)):
+            index.setdefault(token, []).append(provider.id)
+    return index
+
+class ServiceTypeMatcher:
+    """Providers for a booking's service type: its providers plus 'All' providers
+    
+    Built once per provider list; bookings of the same type share one list
+    and one array of rows in the matcher's ProviderTable.
+    """
+    
+    def __init__(self, all_providers: List[Provider]):
+        self.all_providers = all_providers
+        self.table = ProviderTable(all_providers)
+        self.service_index = build_service_type_index(all_providers)
+        self.matches_by_type: Dict[str, Tuple[List[Provider], np.ndarray]] = {}
+    
+    def match(self, service_type) -> List[Provider]:
+        return self.match_rows(service_type)[0]
+    
+    def match_rows(self, service_type) -> Tuple[List[Provider], np.ndarray]:
+        """Matched providers and their table rows, in upload order"""
+        service_key = normalize_service_type(service_type)
+        match = self.matches_by_type.get(service_key)
+        if match is None:
+            ids = set(self.service_index.get(service_key, [])) | set(self.service_index.get(ALL_SERVICES, []))
+            rows = np.array(sorted(self.table.row_of[i] for i in ids), dtype=np.int32)
+            
+            # If no providers matched, add all providers as fallback
+            if not len(rows):
+                instrumentation.count('warnings.unmatched_service_type')
+                if PLANNING_DEBUG:
+                    print(f"Warning: No providers matched for {service_type}, using all providers")
+                match = (self.all_providers, np.arange(len(self.table), dtype=np.int32))
+            else:
+                match = (self.table.take(rows), rows)
+            self.matches_by_type[service_key] = match
+        return match
 
 class ExcelHandler:
     """Simple Excel handler for any service type"""
@@ -176,248 +262,329 @@ class ExcelHandler:
         return output.getvalue()
     
     @staticmethod
-    def parse_provider_journey_excel(file_content: bytes) -> Dict:
+    def parse_provider_journey_excel(file_content: bytes, report: Optional[IngestionReport] = None) -> Dict:
         """Parse provider journey Excel file with new format"""
         try:
-            excel_file = pd.ExcelFile(io.BytesIO(file_content))
-            
-            # Read the main journey sheet
-            journey_df = pd.read_excel(excel_file, sheet_name='Provider_Journey')
-            
-            # Process each row as a separate provider journey
-            all_journeys = []
-            
-            for _, row in journey_df.iterrows():
-                # Helper function to parse currency values
-                def parse_currency(value):
-                    """Parse currency string to float"""
-                    if pd.isna(value):
-                        return 0.0
-                    if isinstance(value, (int, float)):
-                        return float(value)
-                    # Remove currency symbols and convert to float
-                    value_str = str(value).replace('£', '').replace(',', '').strip()
-                    try:
-                        return float(value_str)
-                    except:
-                        return 0.0
-                
-                # Extract provider details
-                provider_data = {
-                    'provider_id': str(row['Provider_ID']),
-                    'start_location': str(row['Provider_Start_Location']),
-                    'travel_mode': str(row['Provider_Travel_Type']),
-                    'travel_time_cost_per_hour': parse_currency(row.get('Provider_Travel_Time_Cost_Per_Hour', 15.00)),
-                    'mileage_cost_per_mile': parse_currency(row.get('Provider_Mileage_Cost_Per_Mile', 0.45)),
-                    'parking_paid': str(row.get('Parking_Paid', 'NO')).upper() == 'YES'
-                }
-                
-                # Extract bookings
-                bookings = []
-                booking_num = 1
-                
-                while True:
-                    # Check if booking columns exist
-                    location_col = f'Booking_Location_{booking_num}'
-                    time_col = f'Booking_Appointment_Time_{booking_num}'
-                    duration_col = f'Booking_Duration_{booking_num}'
-                    
-                    if location_col not in row or pd.isna(row[location_col]) or str(row[location_col]).strip() == '':
-                        break
-                    
-                    # Parse duration - handle both numeric and string formats
-                    duration_value = row.get(duration_col, 1.0)
-                    if isinstance(duration_value, str):
-                        # Remove any non-numeric characters except decimal point
-                        duration_str = ''.join(c for c in duration_value if c.isdigit() or c == '.')
-                        try:
-                            duration = float(duration_str) if duration_str else 1.0
-                        except:
-                            duration = 1.0
-                    else:
-                        duration = float(duration_value) if not pd.isna(duration_value) else 1.0
-                    
-                    booking = {
-                        'booking_id': f'B{booking_num:03d}',
-                        'address': str(row[location_col]),
-                        'start_time': str(row.get(time_col, '09:00')),
-                        'duration_hours': duration,
-                        'date': datetime.now().strftime('%Y-%m-%d'),  # Use today's date as default
-                        'service_type': 'service'
-                    }
-                    bookings.append(booking)
-                    booking_num += 1
-                
-                provider_data['bookings'] = bookings
-                all_journeys.append(provider_data)
-            
-            # For now, return the first journey (can be extended to handle multiple)
-            if all_journeys:
-                return all_journeys[0]
-            else:
-                raise ValueError("No valid journey data found in Excel file")
-            
+            journeys = ExcelHandler.parse_provider_journeys(file_content, report)
         except Exception as e:
             raise ValueError(f"Error parsing Excel file: {str(e)}")
+        
+        # For now, return the first journey (can be extended to handle multiple)
+        if journeys:
+            return journeys[0]
+        raise ValueError("Error parsing Excel file: No valid journey data found in Excel file")
     
     @staticmethod
-    def parse_planning_files(bookings_data: bytes, providers_data: bytes) -> List[Booking]:
-        """Parse Excel files and return bookings with matched providers"""
+    def parse_provider_journeys(file_content: bytes, report: Optional[IngestionReport] = None) -> List[Dict]:
+        """Parse every provider journey row, converting whole columns at once"""
+        if report is None:
+            report = IngestionReport()
+        report.source = 'Provider_Journey'
+        
+        excel_file = pd.ExcelFile(io.BytesIO(file_content))
+        journey_df = pd.read_excel(excel_file, sheet_name='Provider_Journey')
+        report.rows_read += len(journey_df)
+        
+        # Required columns raise like before; blank cells skip the row
+        journey_df = journey_df[require(journey_df, ['Provider_ID', 'Provider_Start_Location'], report)]
+        
+        provider_ids = journey_df['Provider_ID'].astype(str).str.strip()
+        start_locations = coerce_text(journey_df, 'Provider_Start_Location')
+        travel_modes = journey_df['Provider_Travel_Type'].astype(str)
+        # A blank rate cell means no cost; the defaults only apply without the column
+        time_rates = coerce_number(journey_df, 'Provider_Travel_Time_Cost_Per_Hour', 15.00, report,
+                                   currency=True, blank=0.0)
+        mileage_rates = coerce_number(journey_df, 'Provider_Mileage_Cost_Per_Mile', 0.45, report,
+                                      currency=True, blank=0.0)
+        parking_paid = coerce_text(journey_df, 'Parking_Paid', 'NO').str.upper() == 'YES'
+        
+        # Reshape the numbered booking column groups to one row per
+        # (journey row, booking number); a row's bookings stop at its first
+        # blank location
+        bookings = ExcelHandler._journey_bookings_long(journey_df, report)
+        today = datetime.now().strftime('%Y-%m-%d')  # Use today's date as default
+        
+        bookings_by_row: Dict = {label: [] for label in journey_df.index}
+        for (label, booking_num), address, start_time, duration in zip(
+                bookings.index, bookings['address'], bookings['start_time'], bookings['duration_hours']):
+            bookings_by_row[label].append({
+                'booking_id': f'B{booking_num:03d}',
+                'address': address,
+                'start_time': start_time,
+                'duration_hours': float(duration),
+                'date': today,
+                'service_type': 'service'
+            })
+        
+        all_journeys = []
+        for position, label in enumerate(journey_df.index):
+            all_journeys.append({
+                'provider_id': provider_ids.iat[position],
+                'start_location': start_locations.iat[position],
+                'travel_mode': travel_modes.iat[position],
+                'travel_time_cost_per_hour': float(time_rates.iat[position]),
+                'mileage_cost_per_mile': float(mileage_rates.iat[position]),
+                'parking_paid': bool(parking_paid.iat[position]),
+                'bookings': bookings_by_row[label]
+            })
+        
+        report.rows_loaded += len(all_journeys)
+        return all_journeys
+    
+    @staticmethod
+    def _journey_bookings_long(journey_df: pd.DataFrame, report: IngestionReport) -> pd.DataFrame:
+        """Booking_Location_N / _Appointment_Time_N / _Duration_N columns in long form
+        
+        One melt turns every numbered group into rows indexed by (sheet row,
+        booking number), with 'address', 'start_time' and 'duration_hours'
+        columns. Groups count up from 1 until a Booking_Location_N is missing.
+        """
+        booking_count = 0
+        while f'Booking_Location_{booking_count + 1}' in journey_df.columns:
+            booking_count += 1
+        
+        wide = journey_df[[
+            column for column in journey_df.columns
+            if (match := JOURNEY_BOOKING_COLUMN.match(str(column))) and int(match.group(2)) <= booking_count
+        ]]
+        index = pd.MultiIndex.from_arrays([[], []], names=['row', 'booking_num'])
+        if wide.empty:
+            return pd.DataFrame({'address': [], 'start_time': [], 'duration_hours': []}, index=index)
+        
+        long = wide.rename_axis('row').reset_index().melt(id_vars='row', var_name='column')
+        parts = long['column'].str.extract(JOURNEY_BOOKING_COLUMN.pattern)
+        long = long.assign(field='Booking_' + parts[0], booking_num=parts[1].astype(int)) \
+            .pivot(index=['row', 'booking_num'], columns='field', values='value') \
+            .reindex(journey_df.index, level='row').sort_index()
+        
+        # Keep each row's bookings up to its first blank location
+        locations = coerce_text(long, 'Booking_Location')
+        present = locations.ne('').groupby(level='row').cummin()
+        long, locations = long[present], locations[present]
+        
+        return pd.DataFrame({
+            'address': locations,
+            'start_time': coerce_time(long, 'Booking_Appointment_Time', '09:00', report),
+            'duration_hours': coerce_number(long, 'Booking_Duration', 1.0, report, strip_units=True)
+        }, index=long.index)
+    
+    @staticmethod
+    def parse_planning_files(bookings_data: bytes, providers_data: bytes,
+                             report: Optional[IngestionReport] = None,
+                             bookings_format: Optional[str] = None,
+                             providers_format: Optional[str] = None) -> List[Booking]:
+        """Parse planning files and return bookings with matched providers
+        
+        Files are Excel unless a format is given (see stream_planning_files).
+        Columns are converted in one pass each. Problems are collected in
+        report (rows missing an ID or address are skipped) instead of
+        aborting the upload.
+        """
+        bookings = []
+        for chunk in ExcelHandler.stream_planning_files(bookings_data, providers_data, report,
+                                                        bookings_format=bookings_format,
+                                                        providers_format=providers_format):
+            bookings.extend(chunk)
+        return bookings
+    
+    @staticmethod
+    def stream_planning_files(bookings_source: Union[bytes, BinaryIO, str],
+                              providers_source: Union[bytes, BinaryIO, str],
+                              report: Optional[IngestionReport] = None,
+                              chunk_rows: int = UPLOAD_CHUNK_ROWS,
+                              bookings_format: Optional[str] = None,
+                              providers_format: Optional[str] = None) -> Iterator[List[Booking]]:
+        """Yield matched bookings in chunks while the bookings file is still being read
+        
+        Sources are file contents, file objects or paths in any format of
+        services.input_formats (xlsx, csv, parquet, ndjson), detected from the
+        file name unless given. Every provider is loaded first since matching
+        needs the full list; bookings follow chunk_rows at a time so callers
+        can start work on each chunk early.
+        """
+        if report is None:
+            report = IngestionReport()
         
         # Read providers
-        providers_df = pd.read_excel(io.BytesIO(providers_data))
         all_providers = []
+        seen_ids = set()
+        for providers_df in iter_frames(providers_source, PROVIDER_COLUMNS, providers_format, chunk_rows):
+            all_providers.extend(ExcelHandler.providers_from_frame(providers_df, report, seen_ids))
+        matcher = ServiceTypeMatcher(all_providers)
         
-        for _, row in providers_df.iterrows():
-            provider = Provider(
-                id=str(row.get('ProviderID', '')),
-                address=str(row.get('ProviderAddress', '')),
-                postcode=''
-            )
-            provider.name = str(row.get('ProviderName', provider.id))
-            provider.service_types = str(row.get('ServiceTypes', 'All'))
-            provider.travel_mode = str(row.get('TravelMode', 'Car'))
-            provider.service_cost = float(row.get('ServiceCost', 50.00))  # Flat service cost
-            provider.travel_time_rate = float(row.get('TravelTimeRate', 15.00))  # Travel time rate
-            provider.mileage_rate = float(row.get('MileageRate', 0.45))
-            
-            # For backward compatibility
-            provider.hourly_rate = float(row.get('HourlyRate', provider.service_cost))
-            
+        # Read bookings
+        for bookings_df in iter_frames(bookings_source, BOOKING_COLUMNS, bookings_format, chunk_rows):
+            bookings = ExcelHandler.bookings_from_frame(bookings_df, all_providers, report, matcher)
+            if bookings:
+                yield bookings
+    
+    @staticmethod
+    def providers_from_frame(providers_df: pd.DataFrame, report: IngestionReport,
+                             seen_ids: Optional[set] = None) -> List[Provider]:
+        """Build providers from a providers sheet
+        
+        A provider ID names one provider throughout planning, so rows that
+        repeat an ID (in this frame or in seen_ids, the IDs of earlier
+        chunks) are reported and skipped; the first row wins.
+        """
+        report.source = 'Providers'
+        report.rows_read += len(providers_df)
+        providers_df = providers_df[require(providers_df, ['ProviderID'], report)]
+        
+        ids = coerce_text(providers_df, 'ProviderID')
+        seen_ids = set() if seen_ids is None else seen_ids
+        duplicate = ids.duplicated() | ids.isin(seen_ids)
+        if duplicate.any():
+            report.add(ids.index[duplicate], 'ProviderID', "Duplicate provider ID, row skipped", ids[duplicate])
+            providers_df, ids = providers_df[~duplicate], ids[~duplicate]
+        seen_ids.update(ids.tolist())
+        columns = {
+            'address': coerce_text(providers_df, 'ProviderAddress'),
+            'name': coerce_text(providers_df, 'ProviderName').mask(lambda names: names.eq(''), ids),
+            'service_types': coerce_text(providers_df, 'ServiceTypes', 'All'),
+            'travel_mode': coerce_text(providers_df, 'TravelMode', 'Car'),
+            'service_cost': coerce_number(providers_df, 'ServiceCost', 50.00, report, currency=True),  # Flat service cost
+            'travel_time_rate': coerce_number(providers_df, 'TravelTimeRate', 15.00, report, currency=True),  # Travel time rate
+            'mileage_rate': coerce_number(providers_df, 'MileageRate', 0.45, report, currency=True),
+            'hourly_rate': coerce_number(providers_df, 'HourlyRate', None, report, currency=True),
+            # Optional daily booking cap used by the assignment solver
+            'max_daily_bookings': coerce_number(providers_df, 'MaxDailyBookings', None, report),
+            # Optional travel radius in miles
+            'max_distance': coerce_number(providers_df, 'MaxDistance', None, report)
+        }
+        # For backward compatibility
+        columns['hourly_rate'] = columns['hourly_rate'].fillna(columns['service_cost'])
+        
+        all_providers = []
+        for provider_id, row in zip(ids.tolist(), zip(*(c.tolist() for c in columns.values()))):
+            values = dict(zip(columns, row))
+            provider = Provider(id=provider_id, address=values['address'], postcode='')
+            provider.name = values['name']
+            provider.service_types = values['service_types']
+            provider.travel_mode = values['travel_mode']
+            provider.service_cost = values['service_cost']
+            provider.travel_time_rate = values['travel_time_rate']
+            provider.mileage_rate = values['mileage_rate']
+            provider.hourly_rate = values['hourly_rate']
+            if not pd.isna(values['max_daily_bookings']):
+                provider.max_daily_bookings = int(values['max_daily_bookings'])
+            if not pd.isna(values['max_distance']):
+                provider.max_distance = float(values['max_distance'])
             all_providers.append(provider)
         
-        # Read bookings
-        bookings_df = pd.read_excel(io.BytesIO(bookings_data))
-        bookings = []
+        report.rows_loaded += len(all_providers)
+        return all_providers
+    
+    @staticmethod
+    def bookings_from_frame(bookings_df: pd.DataFrame, all_providers: List[Provider],
+                            report: IngestionReport,
+                            matcher: Optional[ServiceTypeMatcher] = None) -> List[Booking]:
+        """Build bookings from a bookings sheet and match their providers
         
-        for _, row in bookings_df.iterrows():
-            booking_id = str(row.get('BookingID', ''))
-            address = str(row.get('CustomerAddress', ''))
-            service_type = str(row.get('ServiceType', 'General'))
-            
-            if not booking_id or not address:
-                continue
-            
-            # Match providers based on service type
-            matched_providers = []
-            for provider in all_providers:
-                # Check if provider offers this service type
-                provider_services = provider.service_types.split(',')
-                provider_services = [s.strip() for s in provider_services]
-                
-                # Match if provider has 'All' or the specific service type
-                if 'All' in provider_services or service_type in provider_services:
-                    matched_providers.append(provider)
+        Pass the same matcher for every chunk of one sheet so bookings of a
+        service type share a provider list.
+        """
+        report.source = 'Bookings'
+        report.rows_read += len(bookings_df)
+        bookings_df = bookings_df[require(bookings_df, ['BookingID', 'CustomerAddress'], report)]
+        
+        if matcher is None:
+            matcher = ServiceTypeMatcher(all_providers)
+        
+        columns = {
+            'booking_id': coerce_text(bookings_df, 'BookingID'),
+            'address': coerce_text(bookings_df, 'CustomerAddress'),
+            'service_date': coerce_date(bookings_df, 'ServiceDate', report),
+            'service_time': coerce_time(bookings_df, 'ServiceTime', '', report),
+            'service_type': coerce_text(bookings_df, 'ServiceType', 'General'),
+            'duration': coerce_number(bookings_df, 'Duration', 2.0, report, strip_units=True),
+            'priority': coerce_text(bookings_df, 'Priority', 'normal').str.lower()
+        }
+        
+        bookings = []
+        for row in zip(*(c.tolist() for c in columns.values())):
+            values = dict(zip(columns, row))
+            service_type = values['service_type']
             
-            # If no providers matched, add all providers as fallback
-            if not matched_providers:
-                print(f"Warning: No providers matched for {service_type}, using all providers")
-                matched_providers = all_providers
+            # Match providers offering 'All' or the specific service type
+            matched_providers, provider_rows = matcher.match_rows(service_type)
             
             booking = Booking(
-                booking_id=booking_id,
-                customer_address=address,
-                service_date=str(row.get('ServiceDate', '')),
-                service_time=str(row.get('ServiceTime', '')),
+                booking_id=values['booking_id'],
+                customer_address=values['address'],
+                service_date=values['service_date'],
+                service_time=values['service_time'],
                 providers=matched_providers,
-                booking_type='service'
+                booking_type='service',
+                service_type=service_type,
+                duration=values['duration'],
+                priority=values['priority'],
+                provider_table=matcher.table,
+                provider_rows=provider_rows
             )
-            booking.service_type = service_type
-            booking.duration = float(row.get('Duration', 2.0))
             
             bookings.append(booking)
         
+        report.rows_loaded += len(bookings)
         return bookings
     
     @staticmethod
-    def create_results_excel(results, report_type: str = 'planning') -> bytes:
-        """Create Excel report with results"""
+    def create_results_excel(results, report_type: str = 'planning',
+                             include_all_providers: bool = False) -> bytes:
+        """Create Excel report with results
+        
+        Planning reports are streamed row by row (see
+        write_planning_report); include_all_providers adds a sheet comparing
+        every provider evaluated for each booking.
+        """
         output = io.BytesIO()
         
+        if report_type == 'planning':
+            ExcelHandler.write_planning_report(results, output, include_all_providers)
+            return output.getvalue()
+        
         with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            if report_type == 'planning':
-                # Results sheet for planning
-                data = []
-                for result in results:
-                    booking = result['booking']
-                    best = result['best_provider']
-                    
-                    if best:
-                        data.append({
-                            'Booking_ID': booking.booking_id,
-                            'Customer_Address': booking.customer_address,
-                            'Service_Date': booking.service_date,
-                            'Service_Time': booking.service_time,
-                            'Service_Type': booking.service_type,
-                            'Best_Provider': best['provider'].name,
-                            'Provider_Address': best['provider'].address,
-                            'Distance_Miles': round(best['distance'], 1),
-                            'Travel_Minutes': round(best['duration'], 0),
-                            'Travel_Cost': round(best['travel_cost'], 2),
-                            'Service_Cost': round(best['service_cost'], 2),
-                            'Total_Cost': round(best['total_cost'], 2)
-                        })
-                    else:
-                        data.append({
-                            'Booking_ID': booking.booking_id,
-                            'Customer_Address': booking.customer_address,
-                            'Service_Date': booking.service_date,
-                            'Service_Time': booking.service_time,
-                            'Service_Type': booking.service_type,
-                            'Best_Provider': 'No Match',
-                            'Provider_Address': '',
-                            'Distance_Miles': 0,
-                            'Travel_Minutes': 0,
-                            'Travel_Cost': 0,
-                            'Service_Cost': 0,
-                            'Total_Cost': 0
-                        })
-                
-                df = pd.DataFrame(data)
-                df.to_excel(writer, sheet_name='Results', index=False)
+            # Journey report: summary sheet
+            summary_data = {
+                'Metric': ['Total Distance', 'Total Duration', 'Total Cost', 'Number of Stops'],
+                'Value': [
+                    f"{results.get('total_distance_miles', 0)} miles",
+                    f"{results.get('total_duration_minutes', 0)} minutes",
+                    f"£{results.get('total_cost', 0):.2f}",
+                    len(results.get('journey_legs', []))
+                ]
+            }
+            summary_df = pd.DataFrame(summary_data)
+            summary_df.to_excel(writer, sheet_name='Summary', index=False)
             
-            else:  # journey report
-                # Summary sheet
-                summary_data = {
-                    'Metric': ['Total Distance', 'Total Duration', 'Total Cost', 'Number of Stops'],
-                    'Value': [
-                        f"{results.get('total_distance_miles', 0)} miles",
-                        f"{results.get('total_duration_minutes', 0)} minutes",
-                        f"£{results.get('total_cost', 0):.2f}",
-                        len(results.get('journey_legs', []))
-                    ]
-                }
-                summary_df = pd.DataFrame(summary_data)
-                summary_df.to_excel(writer, sheet_name='Summary', index=False)
+            # Journey legs
+            if 'journey_legs' in results:
+                legs_data = []
+                for leg in results['journey_legs']:
+                    legs_data.append({
+                        'Booking ID': leg['booking_id'],
+                        'From': leg['from'],
+                        'To': leg['to'],
+                        'Distance (miles)': leg['distance'],
+                        'Duration (minutes)': leg['duration'],
+                        'Cost (£)': leg['cost']
+                    })
                 
-                # Journey legs
-                if 'journey_legs' in results:
-                    legs_data = []
-                    for leg in results['journey_legs']:
-                        legs_data.append({
-                            'Booking ID': leg['booking_id'],
-                            'From': leg['from'],
-                            'To': leg['to'],
-                            'Distance (miles)': leg['distance'],
-                            'Duration (minutes)': leg['duration'],
-                            'Cost (£)': leg['cost']
-                        })
-                    
-                    legs_df = pd.DataFrame(legs_data)
-                    legs_df.to_excel(writer, sheet_name='Journey_Details', index=False)
-                
-                # Cost breakdown
-                if 'cost_breakdown' in results:
-                    breakdown_data = []
-                    for category, amount in results['cost_breakdown'].items():
-                        breakdown_data.append({
-                            'Category': category.replace('_', ' ').title(),
-                            'Amount (£)': amount
-                        })
-                    
-                    breakdown_df = pd.DataFrame(breakdown_data)
-                    breakdown_df.to_excel(writer, sheet_name='Cost_Breakdown', index=False)
+                legs_df = pd.DataFrame(legs_data)
+                legs_df.to_excel(writer, sheet_name='Journey_Details', index=False)
             
+            # Cost breakdown
+            if 'cost_breakdown' in results:
+                breakdown_data = []
+                for category, amount in results['cost_breakdown'].items():
+                    breakdown_data.append({
+                        'Category': category.replace('_', ' ').title(),
+                        'Amount (£)': amount
+                    })
+                
+                breakdown_df = pd.DataFrame(breakdown_data)
+                breakdown_df.to_excel(writer, sheet_name='Cost_Breakdown', index=False)
+        
             # Format
             workbook = writer.book
             header_format = workbook.add_format({'bold': True, 'bg_color': '#4472C4', 'font_color': 'white'})
@@ -425,16 +592,140 @@ class ExcelHandler:
             for sheet_name in writer.sheets:
                 worksheet = writer.sheets[sheet_name]
                 worksheet.set_row(0, 20, header_format)
-                
-                # Auto-fit columns
-                if sheet_name == 'Results':
-                    worksheet.set_column('A:A', 12)  # Booking ID
-                    worksheet.set_column('B:B', 35)  # Customer Address
-                    worksheet.set_column('C:E', 12)  # Dates, Times
-                    worksheet.set_column('F:F', 15)  # Provider
-                    worksheet.set_column('G:G', 25)  # Provider Address
-                    worksheet.set_column('H:L', 12)  # Numbers
-                else:
-                    worksheet.set_column('A:Z', 15)
-        
-        return output.getvalue()
\ No newline at end of file
+                worksheet.set_column('A:Z', 15)
+        
+        return output.getvalue()
+    
+    @staticmethod
+    def write_planning_report(results: Iterable[Dict], output: Union[BinaryIO, str],
+                              include_all_providers: bool = False):
+        """Write the planning report straight from the results, one row at a time
+        
+        The workbook runs in xlsxwriter's constant_memory mode: each row is
+        flushed to a temporary file once the next one starts, so memory does
+        not grow with the number of bookings. Results are read in a single
+        pass, so a generator works too.
+        """
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+        header_format = workbook.add_format({'bold': True, 'bg_color': '#4472C4', 'font_color': 'white'})
+        
+        results_sheet = workbook.add_worksheet('Results')
+        results_sheet.set_column('A:A', 12)  # Booking ID
+        results_sheet.set_column('B:B', 35)  # Customer Address
+        results_sheet.set_column('C:E', 12)  # Dates, Times
+        results_sheet.set_column('F:F', 15)  # Provider
+        results_sheet.set_column('G:G', 25)  # Provider Address
+        results_sheet.set_column('H:L', 12)  # Numbers
+        results_sheet.set_row(0, 20, header_format)
+        results_sheet.write_row(0, 0, PLANNING_REPORT_COLUMNS)
+        
+        # Rows are written in order on both sheets, so they can fill side by side
+        compared_sheet = None
+        compared_row = 1
+        if include_all_providers:
+            compared_sheet = workbook.add_worksheet('All Providers Compared')
+            compared_sheet.set_column('A:C', 15)
+            compared_sheet.set_column('D:J', 12)
+            compared_sheet.set_row(0, 20, header_format)
+            compared_sheet.write_row(0, 0, PROVIDERS_COMPARED_COLUMNS)
+        
+        for row, result in enumerate(results, start=1):
+            booking = result['booking']
+            best = result['best_provider']
+            
+            if best:
+                values = [
+                    booking.booking_id,
+                    booking.customer_address,
+                    booking.service_date,
+                    booking.service_time,
+                    booking.service_type,
+                    best['provider'].name,
+                    best['provider'].address,
+                    round(best['distance'], 1),
+                    round(best['duration'], 0),
+                    round(best['travel_cost'], 2),
+                    round(best['service_cost'], 2),
+                    round(best['total_cost'], 2)
+                ]
+            else:
+                values = [
+                    booking.booking_id,
+                    booking.customer_address,
+                    booking.service_date,
+                    booking.service_time,
+                    booking.service_type,
+                    'No Match', '', 0, 0, 0, 0, 0
+                ]
+            results_sheet.write_row(row, 0, values)
+            
+            if compared_sheet is not None and best:
+                for candidate in best.get('all_providers', []):
+                    compared_sheet.write_row(compared_row, 0, [
+                        booking.booking_id,
+                        candidate['provider_id'],
+                        candidate['provider_name'],
+                        round(candidate['distance'], 1),
+                        round(candidate['duration'], 0),
+                        round(candidate['travel_cost'], 2),
+                        round(candidate['service_cost'], 2),
+                        round(candidate['total_cost'], 2),
+                        'Yes' if candidate.get('available', True) else 'No',
+                        'Yes' if candidate['provider_id'] == best['provider'].id else ''
+                    ])
+                    compared_row += 1
+        
+        workbook.close()
+    
+    @staticmethod
+    def results_digest(results: List[Dict]) -> str:
+        """Hash of everything a planning report or export writes, to reuse a built one
+
+        Covers the booking, the selected provider and its rates, every cost
+        and breakdown value, and each candidate's costs and availability.
+        """
+        digest = hashlib.sha1()
+        for result in results:
+            booking = result['booking']
+            best = result['best_provider']
+            digest.update(repr((
+                booking.booking_id,
+                booking.customer_address,
+                booking.service_date,
+                booking.service_time,
+                getattr(booking, 'service_type', None),
+                getattr(booking, 'duration', None),
+                getattr(booking, 'priority', None),
+                result.get('unassigned_reason')
+            )).encode())
+            if not best:
+                continue
+            
+            provider = best['provider']
+            digest.update(repr((
+                provider.id,
+                provider.name,
+                provider.address,
+                tuple(sorted(best['cost_details'].items())),
+                best['distance'],
+                best['duration'],
+                best['travel_cost'],
+                best['service_cost'],
+                best['total_cost'],
+                best['is_available'],
+                best.get('optimized', False)
+            )).encode())
+            breakdown = getattr(best, 'breakdown_values', None)
+            if breakdown is not None:
+                digest.update(np.ascontiguousarray(breakdown).tobytes())
+            else:
+                digest.update(repr(sorted(best['travel_breakdown'].items())).encode())
+            
+            candidates = best.get('all_providers')
+            if isinstance(candidates, CandidateCosts):
+                digest.update(repr(candidates.provider_ids()).encode())
+                digest.update(np.ascontiguousarray(candidates.values).tobytes())
+                digest.update(np.ascontiguousarray(candidates.available).tobytes())
+            elif candidates:
+                digest.update(repr([sorted(candidate.items()) for candidate in candidates]).encode())
+        return digest.hexdigest()
\ No newline at end of file
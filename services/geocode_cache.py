@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from config import GEOCODE_CACHE_PATH, GEOCODE_CACHE_TTL_HOURS, GEOCODE_LRU_SIZE, GEOCODE_NOT_FOUND_TTL_HOURS
+from services import instrumentation
+from services.route_cache import normalize_address
+
+# Marks an address the API could not geocode (kept in memory only)
+NOT_FOUND = (None, None)
+
+
+class GeocodeCache:
+    """Address -> coordinates store: in-memory LRU in front of SQLite
+
+    Keys are normalized addresses. Successful lookups are persisted.
+    Addresses the API found no result for are remembered in memory for
+    not_found_ttl_hours, so a bad address is not requested again on every
+    rerun but is retried eventually. Failed requests are never stored.
+    """
+
+    def __init__(self, path: str = GEOCODE_CACHE_PATH, ttl_hours: float = GEOCODE_CACHE_TTL_HOURS,
+                 lru_size: int = GEOCODE_LRU_SIZE, not_found_ttl_hours: float = GEOCODE_NOT_FOUND_TTL_HOURS):
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.not_found_ttl_seconds = not_found_ttl_hours * 3600
+        self.lru_size = lru_size
+        self._lru: OrderedDict = OrderedDict()
+        self._not_found_expiry: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS geocodes (
+                    address TEXT PRIMARY KEY,
+                    lat REAL NOT NULL,
+                    lng REAL NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._conn.commit()
+
+    def get_many(self, addresses: List[str]) -> List[Optional[Tuple]]:
+        """Cached (lat, lng) per address in input order
+
+        Returns None for unknown addresses and NOT_FOUND for addresses known
+        to fail geocoding.
+        """
+        keys = [normalize_address(a) for a in addresses]
+        results = {}
+        now = time.time()
+
+        with self._lock:
+            for key in keys:
+                if self._not_found_expiry.get(key, now) < now:
+                    self._forget(key)
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    results[key] = self._lru[key]
+
+            # Anything not in memory is looked up in the persistent store
+            missing = [key for key in dict.fromkeys(keys) if key not in results]
+            expired_before = now - self.ttl_seconds
+            for key in missing:
+                row = self._conn.execute(
+                    "SELECT lat, lng FROM geocodes WHERE address = ? AND created_at >= ?",
+                    (key, expired_before)
+                ).fetchone()
+                if row:
+                    results[key] = row
+                    self._remember(key, row)
+
+            found = sum(1 for key in keys if key in results)
+            self.hits += found
+            self.misses += len(keys) - found
+            instrumentation.current().record_cache('geocode_cache', found, len(keys) - found)
+
+        return [results.get(key) for key in keys]
+
+    def get(self, address: str) -> Optional[Tuple]:
+        return self.get_many([address])[0]
+
+    def set_many(self, entries: List[Tuple[str, Optional[Tuple]]]):
+        """Store (address, (lat, lng) or None) results; None means no result"""
+        now = time.time()
+        found = []
+
+        with self._lock:
+            for address, location in entries:
+                key = normalize_address(address)
+                self._remember(key, location or NOT_FOUND)
+                if location:
+                    self._not_found_expiry.pop(key, None)
+                    found.append((key, location[0], location[1], now))
+                else:
+                    self._not_found_expiry[key] = now + self.not_found_ttl_seconds
+
+            if found:
+                self._conn.executemany("INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?)", found)
+                self._conn.commit()
+
+    def set(self, address: str, location: Optional[Tuple]):
+        self.set_many([(address, location)])
+
+    def _remember(self, key: str, location: Tuple):
+        """Put a key in the LRU, evicting the oldest (caller holds the lock)"""
+        self._lru[key] = tuple(location)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            evicted, _ = self._lru.popitem(last=False)
+            self._not_found_expiry.pop(evicted, None)
+
+    def _forget(self, key: str):
+        """Drop a key from memory (caller holds the lock)"""
+        self._lru.pop(key, None)
+        self._not_found_expiry.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'in_memory': len(self._lru)}
+
+    def clear(self):
+        """Remove all cached coordinates"""
+        with self._lock:
+            self._lru.clear()
+            self._not_found_expiry.clear()
+            self._conn.execute("DELETE FROM geocodes")
+            self._conn.commit()
@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from datetime import time as dt_time
+from typing import Dict, List, Optional
+
+# Header is spreadsheet row 1, so DataFrame index 0 is row 2
+FIRST_DATA_ROW = 2
+
+
+@dataclass
+class IngestionReport:
+    """Per-row problems found while loading an upload
+
+    Rows with problems in optional columns are kept with defaults; rows
+    missing required values are skipped. Nothing here aborts the upload.
+    """
+    source: str = ''
+    rows_read: int = 0
+    rows_loaded: int = 0
+    errors: List[Dict] = field(default_factory=list)
+
+    def add(self, index, column: str, message: str, values=None):
+        """Record a problem for each DataFrame index label given
+
+        Reshaped frames with a MultiIndex report the first level as the row.
+        """
+        index = list(index)
+        values = [None] * len(index) if values is None else list(values)
+        for label, value in zip(index, values):
+            if isinstance(label, tuple):
+                label = label[0]
+            self.errors.append({
+                'source': self.source,
+                'row': int(label) + FIRST_DATA_ROW if isinstance(label, (int, np.integer)) else label,
+                'column': column,
+                'value': None if value is None or pd.isna(value) else str(value),
+                'message': message
+            })
+
+    @property
+    def rows_skipped(self) -> int:
+        return self.rows_read - self.rows_loaded
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(self.errors, columns=['source', 'row', 'column', 'value', 'message'])
+
+    def summary(self) -> str:
+        return (f"{self.rows_loaded}/{self.rows_read} rows loaded, "
+                f"{len(self.errors)} problem(s) found")
+
+
+def _column(df: pd.DataFrame, column: str) -> pd.Series:
+    """Column values, or all-missing when the column is absent"""
+    if column in df.columns:
+        return df[column]
+    return pd.Series([np.nan] * len(df), index=df.index, dtype=object)
+
+
+def _blank(series: pd.Series) -> pd.Series:
+    """Missing or whitespace-only cells"""
+    return series.isna() | series.astype(str).str.strip().eq('')
+
+
+def coerce_text(df: pd.DataFrame, column: str, default: str = '') -> pd.Series:
+    """Trimmed strings, default for blank cells"""
+    series = _column(df, column)
+    text = series.astype(str).str.strip()
+    return text.mask(_blank(series), default)
+
+
+def coerce_number(df: pd.DataFrame, column: str, default: Optional[float],
+                  report: Optional[IngestionReport] = None, currency: bool = False,
+                  strip_units: bool = False, blank: Optional[float] = None) -> pd.Series:
+    """Floats for a whole column in one pass
+
+    currency removes '£' and thousands separators; strip_units drops every
+    character except digits and '.', e.g. '1.5 hours'. Blank cells take
+    blank (the default unless given); unreadable ones take the default and
+    are reported.
+    """
+    series = _column(df, column)
+    numbers = pd.to_numeric(series, errors='coerce')
+
+    # Only text cells need cleaning before a second conversion attempt
+    text = series[numbers.isna() & ~_blank(series)].astype(str)
+    if len(text):
+        if currency:
+            text = text.str.replace('£', '', regex=False).str.replace(',', '', regex=False).str.strip()
+        if strip_units:
+            text = text.str.replace(r'[^\d.]', '', regex=True)
+        numbers.loc[text.index] = pd.to_numeric(text, errors='coerce')
+
+    unreadable = numbers.isna() & ~_blank(series)
+    if report is not None and unreadable.any():
+        report.add(series.index[unreadable], column, f"Not a number, using {default}", series[unreadable])
+
+    if blank is not None:
+        numbers[_blank(series)] = blank
+    return numbers.fillna(default) if default is not None else numbers
+
+
+def coerce_time(df: pd.DataFrame, column: str, default: str = '',
+                report: Optional[IngestionReport] = None) -> pd.Series:
+    """'HH:MM' strings from time cells, datetimes or text like '9:00' / '09:00:00'
+
+    Unreadable values are kept as text and reported.
+    """
+    series = _column(df, column)
+    result = pd.Series(default, index=df.index, dtype=object)
+    present = ~_blank(series)
+
+    # Excel time cells arrive as datetime.time objects
+    is_time = series.map(lambda v: isinstance(v, dt_time))
+    result[is_time] = series[is_time].map(lambda v: v.strftime('%H:%M'))
+
+    rest = present & ~is_time
+    if rest.any():
+        text = series[rest].astype(str).str.strip()
+        parts = text.str.extract(r'(?:^|\s)(\d{1,2})[:.](\d{2})(?::\d{2})?(?:\.\d+)?$')
+        hours = pd.to_numeric(parts[0], errors='coerce')
+        minutes = pd.to_numeric(parts[1], errors='coerce')
+        valid = hours.between(0, 23) & minutes.between(0, 59)
+
+        formatted = hours[valid].astype(int).map('{:02d}'.format) + ':' + minutes[valid].astype(int).map('{:02d}'.format)
+        result[formatted.index] = formatted
+        result[text.index[~valid]] = text[~valid]
+        if report is not None and (~valid).any():
+            report.add(text.index[~valid], column, "Unreadable time", text[~valid])
+
+    return result
+
+
+def coerce_date(df: pd.DataFrame, column: str, report: Optional[IngestionReport] = None) -> pd.Series:
+    """'YYYY-MM-DD' strings from date cells or text; unreadable values kept as text and reported
+
+    Text starting with a year (ISO dates, date cells) is read year-month-day;
+    anything else is a UK date and read day first, so 03/04/2024 is 3 April.
+    """
+    series = _column(df, column)
+    present = ~_blank(series)
+    result = pd.Series('', index=df.index, dtype=object)
+    if not present.any():
+        return result
+
+    values = series[present]
+    year_first = values.astype(str).str.strip().str.match(r'\d{4}\D')
+    dates = pd.concat([
+        pd.to_datetime(values[year_first], errors='coerce', format='mixed'),
+        pd.to_datetime(values[~year_first], errors='coerce', format='mixed', dayfirst=True)
+    ]).reindex(values.index)
+    valid = dates.notna()
+    result[dates.index[valid]] = dates[valid].dt.strftime('%Y-%m-%d')
+
+    invalid = dates.index[~valid]
+    result[invalid] = series[invalid].astype(str).str.strip()
+    if report is not None and len(invalid):
+        report.add(invalid, column, "Unreadable date", series[invalid])
+
+    return result
+
+
+def require(df: pd.DataFrame, columns: List[str], report: Optional[IngestionReport] = None) -> pd.Series:
+    """Mask of rows with every required column filled; the rest are reported"""
+    keep = pd.Series(True, index=df.index)
+    for column in columns:
+        missing = _blank(_column(df, column))
+        if report is not None and missing.any():
+            report.add(df.index[missing & keep], column, "Missing required value, row skipped")
+        keep &= ~missing
+    return keep
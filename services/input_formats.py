@@ -0,0 +1,142 @@
+import io
+import os
+import pandas as pd
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+from typing import BinaryIO, Iterator, List, Optional, Union
+from config import UPLOAD_CHUNK_ROWS
+
+# Planning input schema, shared by every format. Only these columns are read.
+PROVIDER_COLUMNS = [
+    'ProviderID', 'ProviderName', 'ProviderAddress', 'ServiceTypes', 'TravelMode',
+    'ServiceCost', 'TravelTimeRate', 'MileageRate', 'HourlyRate',
+    'MaxDailyBookings', 'MaxDistance'
+]
+BOOKING_COLUMNS = [
+    'BookingID', 'CustomerAddress', 'ServiceDate', 'ServiceTime', 'ServiceType',
+    'Duration', 'Priority'
+]
+
+# File extension -> format
+FORMATS = {
+    '.xlsx': 'xlsx',
+    '.xlsm': 'xlsx',
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson'
+}
+UPLOAD_TYPES = [extension.lstrip('.') for extension in FORMATS]
+
+Source = Union[bytes, BinaryIO, str]
+
+
+def detect_format(source: Source, format: Optional[str] = None) -> str:
+    """Input format from an explicit name, a file name or a path (xlsx by default)"""
+    if format:
+        format = format.lower().lstrip('.')
+        return FORMATS.get('.' + format, format)
+
+    name = source if isinstance(source, str) else getattr(source, 'name', '')
+    return FORMATS.get(os.path.splitext(name or '')[1].lower(), 'xlsx')
+
+
+def iter_frames(source: Source, columns: Optional[List[str]] = None, format: Optional[str] = None,
+                chunk_rows: int = UPLOAD_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Stream an upload as DataFrames of at most chunk_rows rows
+
+    Sources are file contents, file objects (e.g. Streamlit uploads) or
+    paths. With columns, only those are kept (and, where the format allows,
+    only those are parsed). Index labels count data rows from 0 across
+    chunks, so report row numbers line up with the file.
+    """
+    format = detect_format(source, format)
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    readers = {
+        'xlsx': iter_sheet_frames,
+        'csv': iter_csv_frames,
+        'parquet': iter_parquet_frames,
+        'ndjson': iter_ndjson_frames
+    }
+    if format not in readers:
+        raise ValueError(f"Unsupported file format: {format}")
+    return readers[format](source, columns, chunk_rows)
+
+
+def iter_sheet_frames(source: Source, columns: Optional[List[str]] = None,
+                      chunk_rows: int = UPLOAD_CHUNK_ROWS,
+                      sheet_name: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """First (or named) worksheet of a workbook, read-only
+
+    Rows are parsed from the sheet XML as they are iterated, so memory stays
+    flat however long the sheet is. The first row is the header; empty rows
+    are dropped.
+    """
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        # Some exporters write a wrong sheet size; read until the rows run out
+        worksheet.reset_dimensions()
+        rows = worksheet.iter_rows(values_only=True)
+
+        header = next(rows, None)
+        if header is None:
+            return
+        names = [str(name) if name is not None else f'Unnamed: {i}' for i, name in enumerate(header)]
+        keep = [i for i, name in enumerate(names) if columns is None or name in columns]
+        names = [names[i] for i in keep]
+
+        chunk, labels = [], []
+        for label, row in enumerate(rows):
+            if all(value is None or value == '' for value in row):
+                continue
+            # Rows can be shorter than the header
+            chunk.append(tuple(row[i] if i < len(row) else None for i in keep))
+            labels.append(label)
+            if len(chunk) >= chunk_rows:
+                yield pd.DataFrame.from_records(chunk, columns=names, index=labels)
+                chunk, labels = [], []
+
+        if chunk:
+            yield pd.DataFrame.from_records(chunk, columns=names, index=labels)
+    finally:
+        workbook.close()
+
+
+def iter_csv_frames(source: Source, columns: Optional[List[str]] = None,
+                    chunk_rows: int = UPLOAD_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """CSV with a header row; cells stay text and are converted by the loaders"""
+    usecols = (lambda name: name in columns) if columns is not None else None
+    with pd.read_csv(source, usecols=usecols, dtype=str, chunksize=chunk_rows,
+                     skip_blank_lines=True, encoding='utf-8-sig') as reader:
+        yield from reader
+
+
+def iter_parquet_frames(source: Source, columns: Optional[List[str]] = None,
+                        chunk_rows: int = UPLOAD_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Parquet read one batch at a time, decoding only the wanted columns"""
+    parquet_file = pq.ParquetFile(source)
+    if columns is not None:
+        columns = [name for name in parquet_file.schema_arrow.names if name in columns]
+
+    offset = 0
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+        # Nullable integer IDs stay integers instead of becoming floats
+        frame = batch.to_pandas(integer_object_nulls=True)
+        frame.index = pd.RangeIndex(offset, offset + len(frame))
+        offset += len(frame)
+        yield frame
+
+
+def iter_ndjson_frames(source: Source, columns: Optional[List[str]] = None,
+                       chunk_rows: int = UPLOAD_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Newline-delimited JSON, one record per line"""
+    with pd.read_json(source, lines=True, chunksize=chunk_rows, dtype=False,
+                      convert_dates=False) as reader:
+        for frame in reader:
+            if columns is not None:
+                frame = frame[[name for name in frame.columns if name in columns]]
+            yield frame
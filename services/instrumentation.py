@@ -0,0 +1,168 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from services import tracing
+
+# Report order; stages not listed here are reported after these
+STAGES = ('parsing', 'geocoding', 'candidates', 'routing', 'tariffs', 'evaluation', 'assignment', 'export')
+
+
+class _StageTimer:
+    """Context manager timing one stage entry (see RunMetrics.stage)
+
+    While a trace is being recorded the entry is also a span of it.
+    """
+    __slots__ = ('metrics', 'name', 'span')
+
+    def __init__(self, metrics: 'RunMetrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.metrics._enter(self.name)
+        self.span = tracing.span(self.name, 'stage')
+        self.span.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.span.__exit__(*exc)
+        self.metrics._exit()
+        return False
+
+
+class RunMetrics:
+    """Time per stage and event counters for one planning run
+
+    Stage time is exclusive: entering a stage pauses the enclosing one, so
+    tariff lookups made while ranking candidates count as tariffs, not
+    candidates. Timers wrap whole batches, chunks and days, never single
+    pairs. Stages timed on worker threads overlap the main thread, so their
+    sum can exceed the wall time.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.seconds: Dict[str, float] = {}
+        self.entries: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def stage(self, name: str) -> _StageTimer:
+        """with metrics.stage('routing'): ..."""
+        return _StageTimer(self, name)
+
+    def _enter(self, name: str):
+        now = time.perf_counter()
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        if stack:
+            parent = stack[-1]
+            self._add_time(parent[0], now - parent[1], entered=False)
+        stack.append([name, now])
+
+    def _exit(self):
+        now = time.perf_counter()
+        stack = self._local.stack
+        name, started = stack.pop()
+        self._add_time(name, now - started, entered=True)
+        if stack:
+            stack[-1][1] = now  # Resume the enclosing stage
+
+    def _add_time(self, name: str, seconds: float, entered: bool):
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+            if entered:
+                self.entries[name] = self.entries.get(name, 0) + 1
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_cache(self, name: str, hits: int, misses: int):
+        """Hit/miss totals of a cache that keeps its own counts"""
+        self.count(f'{name}.hits', hits)
+        self.count(f'{name}.misses', misses)
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def wall_seconds(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def hit_ratios(self) -> Dict[str, float]:
+        """Hit ratio of every counter pair named <cache>.hits / <cache>.misses"""
+        ratios = {}
+        for name, hits in self.counters.items():
+            if name.endswith('.hits'):
+                cache = name[:-len('.hits')]
+                total = hits + self.counters.get(f'{cache}.misses', 0)
+                if total:
+                    ratios[cache] = hits / total
+        return ratios
+
+    def summary(self) -> Dict:
+        order = [name for name in STAGES if name in self.seconds]
+        order += sorted(name for name in self.seconds if name not in STAGES)
+        return {
+            'wall_seconds': round(self.wall_seconds, 3),
+            'stages': {name: {'seconds': round(self.seconds[name], 3), 'entries': self.entries.get(name, 0)}
+                       for name in order},
+            'api_calls': {name[len('api.'):]: value for name, value in sorted(self.counters.items())
+                          if name.startswith('api.')},
+            'cache_hit_ratio': {name: round(ratio, 3) for name, ratio in sorted(self.hit_ratios().items())},
+            'counters': {name: value for name, value in sorted(self.counters.items())
+                         if not name.startswith('api.')}
+        }
+
+    def report(self) -> str:
+        """Plain-text summary for the console"""
+        summary = self.summary()
+        lines = [f"Planning run: {summary['wall_seconds']:.2f}s wall"]
+        for name, stage in summary['stages'].items():
+            lines.append(f"  {name:<12} {stage['seconds']:>9.3f}s  ({stage['entries']} entries)")
+        if summary['api_calls']:
+            lines.append("  API calls: " + ", ".join(f"{k} {v}" for k, v in summary['api_calls'].items()))
+        if summary['cache_hit_ratio']:
+            lines.append("  Cache hits: " + ", ".join(f"{k} {v:.0%}" for k, v in summary['cache_hit_ratio'].items()))
+        return "\n".join(lines)
+
+
+# The run being measured in this context (each Streamlit session runs in
+# its own). Services record into it without holding a reference; work
+# handed to worker threads must carry the context along (see
+# MapsService.map_concurrent). Outside a run, records go to _untracked.
+_current: ContextVar[Optional[RunMetrics]] = ContextVar('run_metrics', default=None)
+_untracked = RunMetrics()
+
+
+@contextmanager
+def measure_run() -> Iterator[RunMetrics]:
+    """Make a new RunMetrics the current run for the block"""
+    metrics = RunMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def current() -> RunMetrics:
+    return _current.get() or _untracked
+
+
+def stage(name: str) -> _StageTimer:
+    """Time a block against the current run"""
+    return current().stage(name)
+
+
+def count(name: str, n: int = 1):
+    """Add to a counter of the current run"""
+    current().count(name, n)
+
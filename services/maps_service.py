@@ -1,61 +1,306 @@
+import contextvars
+import random
+import threading
+import time
 import googlemaps
-from typing import Dict, Optional, List
-from config import GOOGLE_MAPS_API_KEY
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, List, Tuple
+from config import (
+    GOOGLE_MAPS_API_KEY,
+    ROUTE_CACHE_ENABLED,
+    MAPS_MAX_WORKERS,
+    MAPS_QPS,
+    MAPS_MAX_RETRIES,
+    MAPS_BACKOFF_SECONDS,
+    PLANNING_DEBUG
+)
+from services import instrumentation, tracing
+from services.route_cache import RouteCache, normalize_address
+from services.geocode_cache import GeocodeCache, NOT_FOUND
+from services.postcode_geocoder import PostcodeGeocoder
 
-class MapsService:
+# Google Distance Matrix request limits
+MATRIX_MAX_ORIGINS = 25
+MATRIX_MAX_DESTINATIONS = 25
+MATRIX_MAX_ELEMENTS = 100
+
+METERS_PER_MILE = 1609.34
+
+# _fetch_geocode result for a failed request (as opposed to no result)
+GEOCODE_FAILED = object()
+
+def parse_directions(routes: List[Dict]) -> Dict:
+    """Build a route result from a Directions API 'routes' list"""
+    if not routes:
+        return {
+            'success': False,
+            'error': 'No route found'
+        }
+    
+    route = routes[0]
+    leg = route['legs'][0]
+    
+    return {
+        'success': True,
+        'distance_miles': leg['distance']['value'] / METERS_PER_MILE,
+        'duration_minutes': leg['duration']['value'] / 60,
+        # Route polyline for drawing on map, bounds for map fitting
+        'polyline': route['overview_polyline']['points'],
+        'bounds': route['bounds'],
+        'start_location': leg['start_location'],
+        'end_location': leg['end_location']
+    }
+
+def parse_matrix_element(element: Dict) -> Dict:
+    """Build a distance result from one Distance Matrix element"""
+    if element.get('status') != 'OK':
+        return {
+            'success': False,
+            'error': 'Route not found'
+        }
+    
+    return {
+        'success': True,
+        'distance_miles': element['distance']['value'] / METERS_PER_MILE,
+        'duration_minutes': element['duration']['value'] / 60
+    }
+
+def parse_geocode(results: List[Dict]) -> Optional[Dict[str, float]]:
+    """Coordinates of the first Geocoding API result"""
+    if not results:
+        return None
+    location = results[0]['geometry']['location']
+    return {'lat': location['lat'], 'lng': location['lng']}
+
+def mock_route() -> Dict:
+    """Route returned when no API key is configured"""
+    return {
+        'success': True,
+        'distance_miles': 25.5,
+        'duration_minutes': 35,
+        'polyline': None,
+        'bounds': None,
+        'start_location': {'lat': 52.4862, 'lng': -1.8904},
+        'end_location': {'lat': 52.5062, 'lng': -1.8704}
+    }
+
+def mock_distance() -> Dict:
+    """Distance returned when no API key is configured"""
+    return {
+        'success': True,
+        'distance_miles': 25.5,
+        'duration_minutes': 35
+    }
+
+def cached_distance(cache: RouteCache, origin: str, destination: str) -> Optional[Dict]:
+    """Distance result from the cache, also answered by a cached full route"""
+    cached = cache.get('distance', origin, destination)
+    if cached:
+        return cached
+    
+    cached = cache.get('directions', origin, destination)
+    if cached:
+        return {
+            'success': True,
+            'distance_miles': cached['distance_miles'],
+            'duration_minutes': cached['duration_minutes']
+        }
+    return None
+
+class RateLimiter:
+    """Thread-safe token bucket limiting requests per second"""
+    
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a request may be sent"""
+        if self.rate <= 0:
+            return
+        
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one upstream call
+    
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait and receive a copy of the same result (or its exception).
+    """
+    
     def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[tuple, Dict] = {}
+        self.shared = 0  # Calls answered by another caller's request
+    
+    def do(self, key: tuple, func: Callable):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+            else:
+                self.shared += 1
+        
+        if not leader:
+            call['done'].wait()
+            if call['error']:
+                raise call['error']
+            result = call['result']
+            return dict(result) if isinstance(result, dict) else result
+        
+        try:
+            call['result'] = func()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+class MapsService:
+    def __init__(self, cache: Optional[RouteCache] = None, max_workers: int = MAPS_MAX_WORKERS,
+                 qps: float = MAPS_QPS, geocode_cache: Optional[GeocodeCache] = None):
         if GOOGLE_MAPS_API_KEY:
-            self.client = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
+            # OVER_QUERY_LIMIT is retried by _call with our own backoff
+            self.client = googlemaps.Client(key=GOOGLE_MAPS_API_KEY, retry_over_query_limit=False)
         else:
             self.client = None
+        
+        # Persistent route cache (only used for real API results)
+        if cache is None and ROUTE_CACHE_ENABLED:
+            cache = RouteCache()
+        self.cache = cache
+        
+        # Geocodes: persistent store with an in-memory LRU in front
+        if geocode_cache is None and ROUTE_CACHE_ENABLED:
+            geocode_cache = GeocodeCache()
+        self.geocode_cache = geocode_cache
+        
+        # Addresses with a known postcode are geocoded offline
+        self.postcode_geocoder = PostcodeGeocoder()
+        
+        # Concurrent fetching: bounded worker pool shared by all batch calls
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(qps)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._worker_state = threading.local()
+        
+        # Identical lookups already in flight share one upstream request
+        self.single_flight = SingleFlight()
+    
+    def _call(self, method: str, **kwargs):
+        """Call a googlemaps client method under the QPS limit
+        
+        OVER_QUERY_LIMIT responses are retried with jittered exponential backoff.
+        """
+        instrumentation.count(f'api.{method}')
+        if method == 'distance_matrix':
+            # Billed per element
+            instrumentation.count('api.distance_matrix_elements',
+                                  len(kwargs['origins']) * len(kwargs['destinations']))
+        
+        for attempt in range(MAPS_MAX_RETRIES + 1):
+            with tracing.span('rate_limit', 'api'):
+                self.rate_limiter.acquire()
+            try:
+                with tracing.span(f'api.{method}', 'api', attempt=attempt):
+                    return getattr(self.client, method)(**kwargs)
+            except googlemaps.exceptions.ApiError as e:
+                if e.status != 'OVER_QUERY_LIMIT' or attempt == MAPS_MAX_RETRIES:
+                    raise
+            
+            delay = MAPS_BACKOFF_SECONDS * (2 ** attempt)
+            with tracing.span('backoff', 'api'):
+                time.sleep(delay * random.uniform(0.5, 1.5))
+    
+    def map_concurrent(self, func: Callable, items: Iterable) -> List:
+        """Run func over items on the worker pool, returning results in input order"""
+        items = list(items)
+        
+        # Calls made from inside a worker run inline so the pool cannot deadlock
+        if len(items) <= 1 or self.max_workers <= 1 or getattr(self._worker_state, 'active', False):
+            return [func(item) for item in items]
+        
+        def run(item, context):
+            self._worker_state.active = True
+            try:
+                return context.run(func, item)
+            finally:
+                self._worker_state.active = False
+        
+        # Workers see the caller's context (run metrics, trace); one copy per
+        # item since a context cannot be entered by two threads at once
+        contexts = [contextvars.copy_context() for _ in items]
+        return list(self._get_executor().map(run, items, contexts))
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='maps'
+                )
+            return self._executor
+    
+    def get_routes_with_directions(self, pairs: List[Tuple[str, str]]) -> List[Dict]:
+        """Get full routes for several origin/destination pairs concurrently"""
+        return self.map_concurrent(lambda pair: self.get_route_with_directions(*pair), pairs)
     
     def get_route_with_directions(self, origin: str, destination: str) -> Dict:
         """Get complete route information including polyline for map display"""
         if not self.client:
             # Mock data for testing without API key
-            return {
-                'success': True,
-                'distance_miles': 25.5,
-                'duration_minutes': 35,
-                'polyline': None,
-                'bounds': None,
-                'start_location': {'lat': 52.4862, 'lng': -1.8904},
-                'end_location': {'lat': 52.5062, 'lng': -1.8704}
-            }
+            return mock_route()
+        
+        return self.single_flight.do(
+            ('directions', normalize_address(origin), normalize_address(destination)),
+            lambda: self._cached_route_with_directions(origin, destination)
+        )
+    
+    def _cached_route_with_directions(self, origin: str, destination: str) -> Dict:
+        """Serve a route from the cache, fetching and storing it on a miss"""
+        if self.cache:
+            cached = self.cache.get('directions', origin, destination)
+            if cached:
+                return cached
+        
+        route = self._fetch_route_with_directions(origin, destination)
         
+        if self.cache and route['success']:
+            self.cache.set('directions', origin, destination, route)
+        
+        return route
+    
+    def _fetch_route_with_directions(self, origin: str, destination: str) -> Dict:
+        """Request directions from the Google API"""
         try:
             # Get directions which includes polyline
-            directions = self.client.directions(
+            directions = self._call(
+                'directions',
                 origin=origin,
                 destination=destination,
                 mode="driving",
                 units="imperial"
             )
-            
-            if directions:
-                route = directions[0]
-                leg = route['legs'][0]
-                
-                # Extract route polyline for drawing on map
-                polyline = route['overview_polyline']['points']
-                
-                # Get bounds for map fitting
-                bounds = route['bounds']
-                
-                return {
-                    'success': True,
-                    'distance_miles': leg['distance']['value'] / 1609.34,
-                    'duration_minutes': leg['duration']['value'] / 60,
-                    'polyline': polyline,
-                    'bounds': bounds,
-                    'start_location': leg['start_location'],
-                    'end_location': leg['end_location']
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': 'No route found'
-                }
+            return parse_directions(directions)
                 
         except Exception as e:
             return {
@@ -67,33 +312,38 @@ class MapsService:
         """Get distance and duration between two points"""
         if not self.client:
             # Mock data for testing without API key
-            return {
-                'success': True,
-                'distance_miles': 25.5,
-                'duration_minutes': 35
-            }
+            return mock_distance()
         
+        return self.single_flight.do(
+            ('distance', normalize_address(origin), normalize_address(destination)),
+            lambda: self._cached_distance_duration(origin, destination)
+        )
+    
+    def _cached_distance_duration(self, origin: str, destination: str) -> Dict:
+        """Serve a distance from the cache, fetching and storing it on a miss"""
+        if self.cache:
+            cached = cached_distance(self.cache, origin, destination)
+            if cached:
+                return cached
+        
+        result = self._fetch_distance_duration(origin, destination)
+        
+        if self.cache and result['success']:
+            self.cache.set('distance', origin, destination, result)
+        
+        return result
+    
+    def _fetch_distance_duration(self, origin: str, destination: str) -> Dict:
+        """Request a single distance matrix element from the Google API"""
         try:
-            result = self.client.distance_matrix(
+            result = self._call(
+                'distance_matrix',
                 origins=[origin],
                 destinations=[destination],
                 mode="driving",
                 units="imperial"
             )
-            
-            if result['rows'][0]['elements'][0]['status'] == 'OK':
-                element = result['rows'][0]['elements'][0]
-                
-                return {
-                    'success': True,
-                    'distance_miles': element['distance']['value'] / 1609.34,
-                    'duration_minutes': element['duration']['value'] / 60
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': 'Route not found'
-                }
+            return parse_matrix_element(result['rows'][0]['elements'][0])
                 
         except Exception as e:
             return {
@@ -101,20 +351,151 @@ class MapsService:
                 'error': str(e)
             }
     
+    def get_distance_matrix(self, origins: List[str], destinations: List[str]) -> List[List[Dict]]:
+        """Get distance and duration for every origin/destination pair
+        
+        Returns a matrix indexed [origin][destination] of results shaped like
+        get_distance_duration. Cached pairs are served locally; the misses are
+        requested in chunks that respect the Distance Matrix element limits.
+        """
+        if not self.client:
+            # Mock data for testing without API key
+            return [[mock_distance() for _ in destinations] for _ in origins]
+        
+        unique_pairs = [(origin, destination)
+                        for origin in dict.fromkeys(origins)
+                        for destination in dict.fromkeys(destinations)]
+        cached = self.cache.get_many('distance', unique_pairs) if self.cache else [None] * len(unique_pairs)
+        
+        results = {}
+        missing = []
+        for pair, hit in zip(unique_pairs, cached):
+            if hit:
+                results[pair] = hit
+            else:
+                missing.append(pair)
+        
+        if missing:
+            missing_origins = list(dict.fromkeys(o for o, _ in missing))
+            missing_destinations = list(dict.fromkeys(d for _, d in missing))
+            missing_pairs = set(missing)
+            
+            # Skip tiles that are already fully cached
+            tiles = [
+                (origin_chunk, destination_chunk)
+                for origin_chunk, destination_chunk in self._matrix_tiles(missing_origins, missing_destinations)
+                if any((o, d) in missing_pairs for o in origin_chunk for d in destination_chunk)
+            ]
+            fetched_tiles = self.map_concurrent(lambda t: self._fetch_distance_matrix(*t), tiles)
+            
+            for (origin_chunk, destination_chunk), tile in zip(tiles, fetched_tiles):
+                fetched = []
+                for origin, row in zip(origin_chunk, tile):
+                    for destination, element in zip(destination_chunk, row):
+                        results[(origin, destination)] = element
+                        if element['success']:
+                            fetched.append((origin, destination, element))
+                
+                if self.cache and fetched:
+                    self.cache.set_many('distance', fetched)
+        
+        return [[results[(origin, destination)] for destination in destinations] for origin in origins]
+    
+    @staticmethod
+    def _matrix_tiles(origins: List[str], destinations: List[str]):
+        """Split origins x destinations into request-sized tiles"""
+        destination_chunk = min(len(destinations), MATRIX_MAX_DESTINATIONS)
+        origin_chunk = max(1, min(MATRIX_MAX_ORIGINS, MATRIX_MAX_ELEMENTS // destination_chunk))
+        
+        for i in range(0, len(origins), origin_chunk):
+            for j in range(0, len(destinations), destination_chunk):
+                yield origins[i:i + origin_chunk], destinations[j:j + destination_chunk]
+    
+    def _fetch_distance_matrix(self, origins: List[str], destinations: List[str]) -> List[List[Dict]]:
+        """Request one Distance Matrix tile from the Google API"""
+        try:
+            result = self._call(
+                'distance_matrix',
+                origins=origins,
+                destinations=destinations,
+                mode="driving",
+                units="imperial"
+            )
+            
+            return [[parse_matrix_element(element) for element in row['elements']]
+                    for row in result['rows']]
+            
+        except Exception as e:
+            error = {'success': False, 'error': str(e)}
+            return [[error for _ in destinations] for _ in origins]
+    
     def geocode_address(self, address: str) -> Optional[Dict[str, float]]:
         """Convert address to coordinates"""
+        return self.geocode_addresses([address])[0]
+    
+    def geocode_addresses(self, addresses: List[str]) -> List[Optional[Dict[str, float]]]:
+        """Convert several addresses to coordinates, in input order
+        
+        Addresses are deduplicated and resolved from the offline postcode
+        file first, then the geocode cache; only the remaining misses are
+        requested (concurrently).
+        """
+        offline = (self.postcode_geocoder.geocode_many(addresses) if self.postcode_geocoder.available
+                   else [None] * len(addresses))
         if not self.client:
             # Mock coordinates for testing
-            return {'lat': 52.4862, 'lng': -1.8904}  # Birmingham
+            return [location or {'lat': 52.4862, 'lng': -1.8904} for location in offline]  # Birmingham
+        
+        online = [address for address, location in zip(addresses, offline) if not location]
+        if not online:
+            return offline
+        
+        located = iter(self._geocode_online(online))
+        return [location or next(located) for location in offline]
+    
+    def _geocode_online(self, addresses: List[str]) -> List[Optional[Dict[str, float]]]:
+        """Geocode through the cache and the Google API, in input order"""
+        unique = list({normalize_address(a): a for a in addresses}.items())
+        cached = self.geocode_cache.get_many([a for _, a in unique]) if self.geocode_cache else [None] * len(unique)
+        locations = {key: hit for (key, _), hit in zip(unique, cached) if hit}
+        
+        missing = [(key, address) for key, address in unique if key not in locations]
+        if missing:
+            fetched = self.map_concurrent(
+                lambda item: self.single_flight.do(('geocode', item[0]), lambda: self._fetch_geocode(item[1])),
+                missing
+            )
+            # Failed requests are not cached, so the next lookup retries them
+            if self.geocode_cache:
+                self.geocode_cache.set_many([
+                    (address, (location['lat'], location['lng']) if location else None)
+                    for (_, address), location in zip(missing, fetched)
+                    if location is not GEOCODE_FAILED
+                ])
+            for (key, _), location in zip(missing, fetched):
+                found = location and location is not GEOCODE_FAILED
+                locations[key] = (location['lat'], location['lng']) if found else NOT_FOUND
+        
+        results = []
+        for address in addresses:
+            lat, lng = locations[normalize_address(address)]
+            results.append(None if lat is None else {'lat': lat, 'lng': lng})
+        return results
+    
+    def _fetch_geocode(self, address: str):
+        """Request coordinates from the Google API
         
+        Returns None when the API has no result for the address (ZERO_RESULTS)
+        and GEOCODE_FAILED when the request itself failed.
+        """
         try:
-            result = self.client.geocode(address)
-            if result:
-                location = result[0]['geometry']['location']
-                return {'lat': location['lat'], 'lng': location['lng']}
-            return None
-        except:
-            return None
+            return parse_geocode(self._call('geocode', address=address))
+        except (googlemaps.exceptions.ApiError, googlemaps.exceptions.HTTPError,
+                googlemaps.exceptions.Timeout, googlemaps.exceptions.TransportError) as e:
+            instrumentation.count('warnings.geocode_failed')
+            if PLANNING_DEBUG:
+                print(f"Warning: Geocoding failed for {address}: {e}")
+            return GEOCODE_FAILED
     
     def get_parking_costs(self, destination: str, duration_hours: float) -> Dict:
         """Estimate parking costs for a destination"""
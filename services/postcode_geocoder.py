@@ -0,0 +1,171 @@
+import argparse
+import csv
+import os
+import re
+import sys
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+from config import POSTCODE_DB_PATH
+
+# UK postcode anywhere in an address, e.g. "SO16 5YA" or "so165ya"
+POSTCODE_IN_ADDRESS = re.compile(r'\b([A-Z]{1,2}\d[A-Z\d]?)\s*(\d[A-Z]{2})\b', re.IGNORECASE)
+
+# File layout: 16-byte header, then fixed-size records sorted by postcode.
+# Postcodes are stored uppercase without spaces (at most 7 characters).
+FILE_MAGIC = b'PCGEO1'  # NUL-padded to 8 bytes
+HEADER = np.dtype([('magic', 'S8'), ('count', '<u8')])
+RECORD = np.dtype([('postcode', 'S8'), ('lat', '<f4'), ('lng', '<f4')])
+
+# ONS postcode directories use this latitude for postcodes without a grid reference
+ONS_MISSING_LAT = 99.999999
+
+
+def extract_postcode(address: str) -> Optional[str]:
+    """Normalized postcode (uppercase, no space) from the end of an address"""
+    matches = POSTCODE_IN_ADDRESS.findall(address or '')
+    if not matches:
+        return None
+    outward, inward = matches[-1]
+    return (outward + inward).upper()
+
+
+class PostcodeGeocoder:
+    """Offline postcode -> centroid lookup over a memory-mapped sorted file
+
+    Opening maps the file without reading it; each lookup is a binary search
+    touching a handful of pages. Batches are searched in one vectorized call.
+    When the file is missing the geocoder is simply unavailable.
+    """
+
+    def __init__(self, path: str = POSTCODE_DB_PATH):
+        self.path = path
+        self.records = None
+
+        if path and os.path.exists(path):
+            header = np.fromfile(path, dtype=HEADER, count=1)
+            if len(header) != 1 or header['magic'][0] != FILE_MAGIC:
+                print(f"Warning: {path} is not a postcode lookup file, offline geocoding disabled")
+                return
+            count = int(header['count'][0])
+            if count:
+                self.records = np.memmap(path, dtype=RECORD, mode='r', offset=HEADER.itemsize, shape=(count,))
+
+    @property
+    def available(self) -> bool:
+        return self.records is not None
+
+    def __len__(self):
+        return 0 if self.records is None else len(self.records)
+
+    def lookup_many(self, postcodes: Iterable[Optional[str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Coordinates for normalized postcodes as (lat/lng array n x 2, found mask)"""
+        keys = np.array([(p or '').encode('ascii', 'ignore') for p in postcodes], dtype='S8')
+        coords = np.full((len(keys), 2), np.nan)
+        if not self.available or not len(keys):
+            return coords, np.zeros(len(keys), dtype=bool)
+
+        column = self.records['postcode']
+        positions = np.minimum(np.searchsorted(column, keys), len(column) - 1)
+        found = (column[positions] == keys) & (keys != b'')
+
+        hits = self.records[positions[found]]
+        coords[found, 0] = hits['lat']
+        coords[found, 1] = hits['lng']
+        return coords, found
+
+    def lookup(self, postcode: str) -> Optional[Tuple[float, float]]:
+        coords, found = self.lookup_many([postcode])
+        return (float(coords[0, 0]), float(coords[0, 1])) if found[0] else None
+
+    def geocode_many(self, addresses: List[str]) -> List[Optional[Dict[str, float]]]:
+        """Coordinates for addresses whose postcode is in the file, else None"""
+        coords, found = self.lookup_many(extract_postcode(a) for a in addresses)
+        return [
+            {'lat': float(lat), 'lng': float(lng)} if ok else None
+            for (lat, lng), ok in zip(coords, found)
+        ]
+
+    def geocode(self, address: str) -> Optional[Dict[str, float]]:
+        return self.geocode_many([address])[0]
+
+
+def build_postcode_file(csv_path: str, output_path: str, postcode_column: str = 'pcds',
+                        lat_column: str = 'lat', lng_column: str = 'long') -> int:
+    """Build the sorted lookup file from an ONS-style postcode CSV
+
+    Terminated postcodes and rows without coordinates are skipped. Returns
+    the number of postcodes written.
+    """
+    postcodes, lats, lngs = [], [], []
+
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            postcode = extract_postcode(row.get(postcode_column, ''))
+            if not postcode or row.get('doterm'):
+                continue
+            try:
+                lat, lng = float(row[lat_column]), float(row[lng_column])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if abs(lat - ONS_MISSING_LAT) < 1e-6:
+                continue
+
+            postcodes.append(postcode)
+            lats.append(lat)
+            lngs.append(lng)
+
+    records = np.empty(len(postcodes), dtype=RECORD)
+    records['postcode'] = postcodes
+    records['lat'] = lats
+    records['lng'] = lngs
+
+    # Sort for binary search; keep the last row for duplicate postcodes
+    records = records[np.argsort(records['postcode'], kind='stable')]
+    if len(records):
+        last = np.append(records['postcode'][1:] != records['postcode'][:-1], True)
+        records = records[last]
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    header = np.array([(FILE_MAGIC, len(records))], dtype=HEADER)
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        header.tofile(f)
+        records.tofile(f)
+    os.replace(tmp_path, output_path)
+
+    return len(records)
+
+
+def main(argv: Optional[List[str]] = None):
+    """python -m services.postcode_geocoder build ONSPD.csv data/postcodes.bin"""
+    parser = argparse.ArgumentParser(description="Offline UK postcode geocoder")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="Build the lookup file from an ONS-style CSV")
+    build.add_argument('csv_path')
+    build.add_argument('output_path', nargs='?', default=POSTCODE_DB_PATH)
+    build.add_argument('--postcode-column', default='pcds')
+    build.add_argument('--lat-column', default='lat')
+    build.add_argument('--lng-column', default='long')
+
+    lookup = commands.add_parser('lookup', help="Look up postcodes or addresses")
+    lookup.add_argument('addresses', nargs='+')
+    lookup.add_argument('--path', default=POSTCODE_DB_PATH)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        count = build_postcode_file(args.csv_path, args.output_path, args.postcode_column,
+                                    args.lat_column, args.lng_column)
+        print(f"Wrote {count} postcodes to {args.output_path}")
+    else:
+        geocoder = PostcodeGeocoder(args.path)
+        for address, location in zip(args.addresses, geocoder.geocode_many(args.addresses)):
+            print(f"{address}: {location}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
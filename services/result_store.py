@@ -0,0 +1,216 @@
+import hashlib
+import io
+import os
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from datetime import datetime, timezone
+from typing import BinaryIO, Dict, List, Optional, Union
+from services.cost_kernel import COST_COMPONENTS
+
+_components = [pa.field(name, pa.float64()) for name in COST_COMPONENTS]
+
+# One row per booking; provider columns are null for unmatched bookings
+ASSIGNMENT_SCHEMA = pa.schema([
+    pa.field('plan_id', pa.string()),
+    pa.field('planned_at', pa.timestamp('s', tz='UTC')),
+    pa.field('booking_id', pa.string()),
+    pa.field('customer_address', pa.string()),
+    pa.field('service_date', pa.date32()),
+    pa.field('service_time', pa.string()),
+    pa.field('service_type', pa.string()),
+    pa.field('priority', pa.string()),
+    pa.field('service_duration', pa.float64()),
+    pa.field('provider_id', pa.string()),
+    pa.field('provider_name', pa.string()),
+    pa.field('provider_address', pa.string()),
+    pa.field('travel_mode', pa.string()),
+    pa.field('is_available', pa.bool_()),
+    pa.field('distance_miles', pa.float64()),
+    pa.field('duration_minutes', pa.float64()),
+    pa.field('travel_cost', pa.float64()),
+    pa.field('service_cost', pa.float64()),
+    pa.field('total_cost', pa.float64()),
+    # Greedy runs halve travel_cost for a provider already nearby; the
+    # itemized components stay undiscounted
+    pa.field('optimized', pa.bool_()),
+    *_components,
+    pa.field('providers_evaluated', pa.int32()),
+    pa.field('providers_routed', pa.int32())
+])
+
+# One row per evaluated (booking, provider) pair
+CANDIDATE_SCHEMA = pa.schema([
+    pa.field('plan_id', pa.string()),
+    pa.field('booking_id', pa.string()),
+    pa.field('provider_id', pa.string()),
+    pa.field('provider_name', pa.string()),
+    pa.field('selected', pa.bool_()),
+    pa.field('available', pa.bool_()),
+    pa.field('distance_miles', pa.float64()),
+    pa.field('duration_minutes', pa.float64()),
+    pa.field('travel_cost', pa.float64()),
+    pa.field('service_cost', pa.float64()),
+    pa.field('total_cost', pa.float64()),
+    *_components
+])
+
+# Candidate schema field -> CandidateCosts column
+CANDIDATE_COLUMNS = {
+    'distance_miles': 'distance',
+    'duration_minutes': 'duration',
+    'travel_cost': 'travel_cost',
+    'service_cost': 'service_cost',
+    'total_cost': 'total_cost',
+    **{name: name for name in COST_COMPONENTS}
+}
+
+Sink = Union[str, BinaryIO]
+
+
+def _column_lists(schema: pa.Schema) -> Dict[str, List]:
+    return {name: [] for name in schema.names}
+
+
+def _table(columns: Dict[str, List], schema: pa.Schema) -> pa.Table:
+    """Typed table from column lists; service_date text becomes a date (null if unreadable)"""
+    arrays = []
+    for field in schema:
+        values = columns[field.name]
+        if field.name == 'service_date':
+            text = pa.array(values, type=pa.string())
+            arrays.append(pc.strptime(text, format='%Y-%m-%d', unit='s', error_is_null=True).cast(pa.date32()))
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class ResultStore:
+    """Planning results as two Arrow tables: assignments and candidates
+
+    Tables are built column by column from a results list in one pass, then
+    written as Arrow IPC (readable back zero-copy through a memory map) or
+    Parquet. Every row carries plan_id, so many plans can be queried
+    together, e.g. in DuckDB: SELECT * FROM 'plans/*/assignments.parquet'.
+    """
+
+    def __init__(self, assignments: pa.Table, candidates: pa.Table):
+        self.assignments = assignments
+        self.candidates = candidates
+
+    @classmethod
+    def from_results(cls, results: List[Dict], plan_id: Optional[str] = None,
+                     planned_at: Optional[datetime] = None) -> 'ResultStore':
+        """Flatten calculate_all_bookings results (CostResult records)
+
+        plan_id defaults to a hash of the booking ids and selected providers.
+        """
+        planned_at = planned_at or datetime.now(timezone.utc)
+        if plan_id is None:
+            digest = hashlib.sha1()
+            for result in results:
+                best = result['best_provider']
+                digest.update(f"{result['booking'].booking_id}:{best['provider'].id if best else ''};".encode())
+            plan_id = digest.hexdigest()[:16]
+
+        assignments = _column_lists(ASSIGNMENT_SCHEMA)
+        candidates = _column_lists(CANDIDATE_SCHEMA)
+
+        for result in results:
+            booking = result['booking']
+            best = result['best_provider'] or {}
+            provider = best.get('provider')
+            compared = best.get('all_providers')
+
+            row = {
+                'plan_id': plan_id,
+                'planned_at': planned_at,
+                'booking_id': booking.booking_id,
+                'customer_address': booking.customer_address,
+                'service_date': booking.service_date or None,
+                'service_time': booking.service_time,
+                'service_type': getattr(booking, 'service_type', None),
+                'priority': getattr(booking, 'priority', None),
+                'service_duration': getattr(booking, 'duration', None),
+                'provider_id': provider.id if provider else None,
+                'provider_name': getattr(provider, 'name', None) if provider else None,
+                'provider_address': provider.address if provider else None,
+                'travel_mode': getattr(provider, 'travel_mode', None) if provider else None,
+                'is_available': best.get('is_available'),
+                'distance_miles': best.get('distance'),
+                'duration_minutes': best.get('duration'),
+                'travel_cost': best.get('travel_cost'),
+                'service_cost': best.get('service_cost'),
+                'total_cost': best.get('total_cost'),
+                'optimized': best.get('optimized', False) if provider else None,
+                'providers_evaluated': best.get('total_providers_evaluated'),
+                'providers_routed': best.get('total_providers_routed')
+            }
+
+            # Itemized costs come from the selected provider's comparison row
+            chosen = compared.position(provider.id) if compared is not None else None
+            for name in COST_COMPONENTS:
+                row[name] = float(compared.column(name)[chosen]) if chosen is not None else None
+
+            for name, values in assignments.items():
+                values.append(row[name])
+
+            if not compared:
+                continue
+
+            # Candidate columns are copied from the result's arrays
+            count = len(compared)
+            selected = [False] * count
+            if chosen is not None:
+                selected[chosen] = True
+            candidates['plan_id'].extend([plan_id] * count)
+            candidates['booking_id'].extend([booking.booking_id] * count)
+            candidates['provider_id'].extend(compared.provider_ids())
+            candidates['provider_name'].extend(compared.providers[row].name for row in compared.rows)
+            candidates['selected'].extend(selected)
+            candidates['available'].extend(compared.available.tolist())
+            for field, name in CANDIDATE_COLUMNS.items():
+                candidates[field].extend(compared.column(name).tolist())
+
+        return cls(_table(assignments, ASSIGNMENT_SCHEMA), _table(candidates, CANDIDATE_SCHEMA))
+
+    @property
+    def plan_id(self) -> Optional[str]:
+        return self.assignments['plan_id'][0].as_py() if self.assignments.num_rows else None
+
+    def tables(self) -> Dict[str, pa.Table]:
+        return {'assignments': self.assignments, 'candidates': self.candidates}
+
+    @staticmethod
+    def write_ipc(table: pa.Table, sink: Sink):
+        """Arrow IPC file; record batches are written as-is, without conversion"""
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    @staticmethod
+    def read_ipc(path: str) -> pa.Table:
+        """Read an Arrow IPC file zero-copy through a memory map"""
+        with pa.memory_map(path, 'r') as source:
+            return pa.ipc.open_file(source).read_all()
+
+    @staticmethod
+    def write_parquet(table: pa.Table, sink: Sink, compression: str = 'zstd'):
+        pq.write_table(table, sink, compression=compression)
+
+    def save(self, directory: str, format: str = 'parquet'):
+        """Write assignments and candidates as files in a directory"""
+        os.makedirs(directory, exist_ok=True)
+        extension = 'arrow' if format == 'ipc' else 'parquet'
+        write = self.write_ipc if format == 'ipc' else self.write_parquet
+        for name, table in self.tables().items():
+            write(table, os.path.join(directory, f'{name}.{extension}'))
+
+    def to_bytes(self, table_name: str, format: str = 'parquet') -> bytes:
+        """One table as file bytes, e.g. for a download button"""
+        sink = io.BytesIO()
+        table = self.tables()[table_name]
+        if format == 'ipc':
+            self.write_ipc(table, sink)
+        else:
+            self.write_parquet(table, sink)
+        return sink.getvalue()
@@ -0,0 +1,168 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    ROUTE_CACHE_PATH,
+    ROUTE_CACHE_TTL_HOURS,
+    DISTANCE_CACHE_TTL_HOURS,
+    ROUTE_CACHE_MAX_ENTRIES
+)
+from services import instrumentation
+
+# UK postcode at the end of an address part, e.g. "SO16 5YA" or "SO165YA"
+POSTCODE_PATTERN = re.compile(r'\b([a-z]{1,2}\d[a-z\d]?)\s*(\d[a-z]{2})\b')
+
+# accessed_at is only refreshed once it is this old, so reads rarely write
+TOUCH_INTERVAL_SECONDS = 3600
+
+
+def normalize_address(address: str) -> str:
+    """Normalize an address so equivalent spellings share one cache key"""
+    key = (address or '').strip().lower()
+    key = re.sub(r'\s*,\s*', ', ', key)
+    key = re.sub(r'\s+', ' ', key)
+    key = key.strip(' ,.')
+    # Postcodes with or without the inward-code space are the same place
+    key = POSTCODE_PATTERN.sub(r'\1\2', key)
+    return key
+
+
+class RouteCache:
+    """Persistent SQLite cache for route lookups keyed by normalized addresses"""
+
+    def __init__(self, path: str = ROUTE_CACHE_PATH, ttl_hours: Optional[Dict[str, float]] = None,
+                 max_entries: int = ROUTE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = {
+            kind: hours * 3600
+            for kind, hours in (ttl_hours or {
+                'directions': ROUTE_CACHE_TTL_HOURS,
+                'distance': DISTANCE_CACHE_TTL_HOURS
+            }).items()
+        }
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS routes (
+                    kind TEXT NOT NULL,
+                    origin TEXT NOT NULL,
+                    destination TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (kind, origin, destination)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_routes_accessed ON routes (accessed_at)")
+            self._conn.commit()
+
+    def get(self, kind: str, origin: str, destination: str) -> Optional[Dict]:
+        """Return the cached result for a route, or None if missing or expired"""
+        return self.get_many(kind, [(origin, destination)])[0]
+
+    def get_many(self, kind: str, pairs: List[Tuple[str, str]]) -> List[Optional[Dict]]:
+        """Look up several routes in one transaction, in input order
+
+        Hits refresh accessed_at (for eviction) only when it is older than
+        TOUCH_INTERVAL_SECONDS, and a batch that changes nothing does not
+        commit, so repeated lookups stay reads.
+        """
+        now = time.time()
+        ttl = self.ttl_seconds.get(kind)
+        results = []
+        expired, touched = [], []
+
+        with self._lock:
+            for origin, destination in pairs:
+                key = (kind, normalize_address(origin), normalize_address(destination))
+                row = self._conn.execute(
+                    "SELECT payload, created_at, accessed_at FROM routes "
+                    "WHERE kind = ? AND origin = ? AND destination = ?",
+                    key
+                ).fetchone()
+
+                if not row:
+                    results.append(None)
+                    continue
+
+                payload, created_at, accessed_at = row
+                if ttl is not None and now - created_at > ttl:
+                    expired.append(key)
+                    results.append(None)
+                    continue
+
+                if now - accessed_at > TOUCH_INTERVAL_SECONDS:
+                    touched.append((now,) + key)
+                results.append(json.loads(payload))
+
+            if expired:
+                self._conn.executemany(
+                    "DELETE FROM routes WHERE kind = ? AND origin = ? AND destination = ?", expired
+                )
+            if touched:
+                self._conn.executemany(
+                    "UPDATE routes SET accessed_at = ? WHERE kind = ? AND origin = ? AND destination = ?",
+                    touched
+                )
+            if expired or touched:
+                self._conn.commit()
+
+        found = sum(1 for result in results if result is not None)
+        instrumentation.current().record_cache(f'route_cache.{kind}', found, len(results) - found)
+        return results
+
+    def set(self, kind: str, origin: str, destination: str, value: Dict):
+        """Store a route result"""
+        self.set_many(kind, [(origin, destination, value)])
+
+    def set_many(self, kind: str, entries: List[Tuple[str, str, Dict]]):
+        """Store several route results in one transaction"""
+        now = time.time()
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO routes VALUES (?, ?, ?, ?, ?, ?)",
+                [(kind, normalize_address(origin), normalize_address(destination),
+                  json.dumps(value), now, now)
+                 for origin, destination, value in entries]
+            )
+            self._conn.commit()
+
+            # Size-bounded eviction, checked periodically to keep writes cheap
+            self._writes_since_prune += len(entries)
+            if self._writes_since_prune >= 100:
+                self._writes_since_prune = 0
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries beyond max_entries (caller holds the lock)"""
+        count = self._conn.execute("SELECT COUNT(*) FROM routes").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM routes WHERE rowid IN "
+                "(SELECT rowid FROM routes ORDER BY accessed_at ASC LIMIT ?)",
+                (excess,)
+            )
+            self._conn.commit()
+
+    def clear(self):
+        """Remove all cached routes"""
+        with self._lock:
+            self._conn.execute("DELETE FROM routes")
+            self._conn.commit()
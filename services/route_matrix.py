@@ -0,0 +1,148 @@
+import numpy as np
+from typing import Dict, List, Optional
+from models.booking import Booking, Provider
+from services.maps_service import MapsService
+from services.route_cache import normalize_address
+
+class RouteMatrix:
+    """Provider x customer distance/duration matrix for a whole planning run
+
+    Unique provider addresses become rows and unique customer addresses become
+    columns. The matrix is filled once with tiled Distance Matrix requests, so
+    a provider origin shared by many bookings is only routed once per customer.
+    """
+
+    def __init__(self, maps_service: MapsService):
+        self.maps_service = maps_service
+        self.origin_index: Dict[str, int] = {}
+        self.destination_index: Dict[str, int] = {}
+        self.origins: List[str] = []
+        self.destinations: List[str] = []
+        self.distance = np.empty((0, 0))
+        self.duration = np.empty((0, 0))
+        self.filled = np.empty((0, 0), dtype=bool)
+        self.errors: Dict[tuple, str] = {}
+
+    @classmethod
+    def build(cls, maps_service: MapsService, bookings: List[Booking],
+              candidates: Optional[Dict[int, List[Provider]]] = None) -> 'RouteMatrix':
+        """Collect unique addresses from the bookings and fill the matrix
+
+        candidates optionally maps id(booking) to the providers worth routing
+        for it; by default every provider of the booking is routed.
+        """
+        matrix = cls(maps_service)
+        matrix.add(bookings, candidates)
+        return matrix
+
+    def add(self, bookings: List[Booking], candidates: Optional[Dict[int, List[Provider]]] = None):
+        """Grow the matrix with the bookings' addresses and fill the new pairs"""
+        # Bookings that share a candidate list are filled together, so pairs
+        # that no booking needs are never requested
+        groups: Dict[tuple, Dict] = {}
+        for booking in bookings:
+            providers = candidates.get(id(booking), booking.providers) if candidates else booking.providers
+            if not providers:
+                continue
+
+            destination = self._add_destination(booking.customer_address)
+            origins = tuple(self._add_origin(p.address) for p in providers)
+            group_key = tuple(sorted(set(origins)))
+            group = groups.setdefault(group_key, {'origins': group_key, 'destinations': set()})
+            group['destinations'].add(destination)
+
+        # Pad the arrays for addresses seen for the first time
+        shape = (len(self.origins), len(self.destinations))
+        if shape != self.distance.shape:
+            old_rows, old_cols = self.distance.shape
+            for name, fill_value in (('distance', np.nan), ('duration', np.nan), ('filled', False)):
+                old = getattr(self, name)
+                grown = np.full(shape, fill_value, dtype=old.dtype)
+                grown[:old_rows, :old_cols] = old
+                setattr(self, name, grown)
+
+        for group in groups.values():
+            self.fill(list(group['origins']), sorted(group['destinations']))
+
+    def _add_origin(self, address: str) -> int:
+        key = normalize_address(address)
+        if key not in self.origin_index:
+            self.origin_index[key] = len(self.origins)
+            self.origins.append(address)
+        return self.origin_index[key]
+
+    def _add_destination(self, address: str) -> int:
+        key = normalize_address(address)
+        if key not in self.destination_index:
+            self.destination_index[key] = len(self.destinations)
+            self.destinations.append(address)
+        return self.destination_index[key]
+
+    def fill(self, origin_rows: List[int], destination_cols: List[int]):
+        """Request the unfilled cells of an origin/destination block"""
+        rows = [r for r in origin_rows if not self.filled[r, destination_cols].all()]
+        if not rows:
+            return
+
+        routes = self.maps_service.get_distance_matrix(
+            [self.origins[r] for r in rows],
+            [self.destinations[c] for c in destination_cols]
+        )
+
+        for r, route_row in zip(rows, routes):
+            for c, route in zip(destination_cols, route_row):
+                self.filled[r, c] = True
+                if route['success']:
+                    self.distance[r, c] = route['distance_miles']
+                    self.duration[r, c] = route['duration_minutes']
+                else:
+                    self.errors[(r, c)] = route.get('error', 'Route not found')
+
+    def block(self, origins: List[str], destinations: List[str]):
+        """Distance and duration arrays (origins x destinations), NaN where unknown"""
+        rows = np.array([self.origin_index.get(normalize_address(a), -1) for a in origins], dtype=int)
+        cols = np.array([self.destination_index.get(normalize_address(a), -1) for a in destinations], dtype=int)
+
+        distance = np.full((len(rows), len(cols)), np.nan)
+        duration = np.full((len(rows), len(cols)), np.nan)
+        known_rows = np.flatnonzero(rows >= 0)
+        known_cols = np.flatnonzero(cols >= 0)
+        if len(known_rows) and len(known_cols):
+            cells = np.ix_(rows[known_rows], cols[known_cols])
+            distance[np.ix_(known_rows, known_cols)] = self.distance[cells]
+            duration[np.ix_(known_rows, known_cols)] = self.duration[cells]
+
+        return distance, duration
+
+    def pairs(self, origins: List[str], destinations: List[str],
+              origin_index: np.ndarray, destination_index: np.ndarray):
+        """Distance and duration for (origins[i], destinations[j]) index pairs, NaN where unknown"""
+        rows = np.array([self.origin_index.get(normalize_address(a), -1) for a in origins], dtype=int)[origin_index]
+        cols = np.array([self.destination_index.get(normalize_address(a), -1) for a in destinations],
+                        dtype=int)[destination_index]
+
+        distance = np.full(len(rows), np.nan)
+        duration = np.full(len(rows), np.nan)
+        known = (rows >= 0) & (cols >= 0)
+        distance[known] = self.distance[rows[known], cols[known]]
+        duration[known] = self.duration[rows[known], cols[known]]
+        return distance, duration
+
+    def get(self, origin: str, destination: str) -> Optional[Dict]:
+        """Route result for a pair, shaped like MapsService.get_distance_duration
+
+        Returns None when the pair is not part of this matrix.
+        """
+        r = self.origin_index.get(normalize_address(origin))
+        c = self.destination_index.get(normalize_address(destination))
+        if r is None or c is None or not self.filled[r, c]:
+            return None
+
+        if np.isnan(self.distance[r, c]):
+            return {'success': False, 'error': self.errors.get((r, c), 'Route not found')}
+
+        return {
+            'success': True,
+            'distance_miles': float(self.distance[r, c]),
+            'duration_minutes': float(self.duration[r, c])
+        }
@@ -0,0 +1,88 @@
+import numpy as np
+from scipy.spatial import cKDTree
+from typing import Dict, List, Optional, Tuple
+from models.booking import Provider
+from services.distance_estimator import EARTH_RADIUS_MILES
+from services.excel_handler import ALL_SERVICES, normalize_service_type, build_service_type_index
+
+
+def to_unit_vectors(coords: np.ndarray) -> np.ndarray:
+    """(lat, lng) degrees -> points on the unit sphere"""
+    lat, lng = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    return np.column_stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)])
+
+
+def chord_for_miles(miles: float) -> float:
+    """Straight-line distance through the unit sphere for a surface distance"""
+    return 2 * np.sin(min(miles / EARTH_RADIUS_MILES, np.pi) / 2)
+
+
+def miles_for_chord(chord: np.ndarray) -> np.ndarray:
+    return 2 * np.arcsin(np.clip(chord / 2, 0, 1)) * EARTH_RADIUS_MILES
+
+
+class ProviderSpatialIndex:
+    """KD-trees over provider locations, one per service type
+
+    A service type's tree holds the providers listing that type plus those
+    offering 'All'. Points live on the unit sphere, so tree distances order
+    exactly like great-circle distances. Providers without coordinates cannot
+    be placed and are returned with every query for their service types.
+    """
+
+    def __init__(self, providers: List[Provider], coords: np.ndarray):
+        self.providers = list(providers)
+        located = ~np.isnan(coords).any(axis=1)
+        self.points = np.zeros((len(self.providers), 3))
+        self.points[located] = to_unit_vectors(coords[located])
+        self.located = located
+
+        # Provider rows per normalized service type (same index as matching)
+        row_of = {p.id: row for row, p in enumerate(self.providers)}
+        self.rows_by_type: Dict[str, List[int]] = {
+            token: [row_of[i] for i in ids]
+            for token, ids in build_service_type_index(self.providers).items()
+        }
+
+        self._trees: Dict[Optional[str], Tuple[cKDTree, np.ndarray, List[int]]] = {}
+
+    def _tree(self, service_type: Optional[str]):
+        """Tree, tree-row -> provider-row map and unlocated rows for a service type"""
+        key = normalize_service_type(service_type)
+        if key not in self.rows_by_type or key == ALL_SERVICES:
+            key = None
+        if key not in self._trees:
+            # Same rule as matching: the type's providers plus 'All' providers,
+            # or everyone when nobody matches
+            rows = sorted(set(self.rows_by_type.get(key, [])) | set(self.rows_by_type.get(ALL_SERVICES, [])))
+            rows = rows or list(range(len(self.providers)))
+
+            rows = np.array(rows, dtype=int)
+            placed = rows[self.located[rows]]
+            tree = cKDTree(self.points[placed]) if len(placed) else None
+            self._trees[key] = (tree, placed, [int(r) for r in rows[~self.located[rows]]])
+
+        return self._trees[key]
+
+    def nearest(self, lat: float, lng: float, service_type: Optional[str] = None,
+                k: int = 20, radius_miles: Optional[float] = None) -> List[Tuple[Provider, float]]:
+        """Up to k nearest providers for a service type, as (provider, straight-line miles)
+
+        With radius_miles, only providers within that distance are returned.
+        Providers without coordinates follow the located ones (distance NaN).
+        """
+        tree, placed, unlocated = self._tree(service_type)
+        results = []
+
+        if tree is not None and not (np.isnan(lat) or np.isnan(lng)):
+            point = to_unit_vectors(np.array([[lat, lng]]))[0]
+            bound = chord_for_miles(radius_miles) if radius_miles is not None else np.inf
+            chords, indices = tree.query(point, k=min(k, len(placed)), distance_upper_bound=bound)
+            chords, indices = np.atleast_1d(chords), np.atleast_1d(indices)
+
+            hit = np.isfinite(chords)
+            for chord, index in zip(miles_for_chord(chords[hit]), indices[hit]):
+                results.append((self.providers[placed[index]], float(chord)))
+
+        results.extend((self.providers[row], float('nan')) for row in unlocated)
+        return results
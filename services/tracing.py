@@ -0,0 +1,204 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from config import PLANNING_DEBUG, PROFILE_TRACE_DIR, PROFILE_TRACE_FORMAT
+
+TRACE_FORMATS = ('chrome', 'speedscope')
+
+
+class _NoSpan:
+    """Span used while nothing is being traced"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'cat', 'args', 'started', 'depth')
+
+    def __init__(self, tracer: 'Tracer', name: str, cat: str, args: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.depth = self.tracer._push()
+        self.started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        ended = time.perf_counter_ns()
+        self.tracer._pop()
+        self.tracer._record(self, ended)
+        return False
+
+
+class Tracer:
+    """Nested, per-thread spans of one profiled run
+
+    Spans are kept as (thread, name, category, start, end, depth, args) and
+    written either as Chrome trace events (chrome://tracing, Perfetto) or as
+    a speedscope evented profile with one timeline per thread.
+    """
+
+    def __init__(self, name: str = 'planning'):
+        self.name = name
+        self.origin = time.perf_counter_ns()
+        self.spans: List[tuple] = []
+        self.thread_names: Dict[int, str] = {}
+        self._local = threading.local()
+
+    def span(self, name: str, cat: str = 'run', **args) -> _Span:
+        return _Span(self, name, cat, args)
+
+    def _push(self) -> int:
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        return depth
+
+    def _pop(self):
+        self._local.depth -= 1
+
+    def _record(self, span: _Span, ended: int):
+        thread = threading.current_thread()
+        if thread.ident not in self.thread_names:
+            self.thread_names[thread.ident] = thread.name
+        # list.append is atomic, so worker threads need no lock
+        self.spans.append((thread.ident, span.name, span.cat, span.started - self.origin,
+                           ended - self.origin, span.depth, span.args))
+
+    def to_chrome(self) -> Dict:
+        """Chrome trace event JSON: one complete ('X') event per span"""
+        pid = os.getpid()
+        events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in self.thread_names.items()
+        ]
+        for tid, name, cat, start, end, _, args in sorted(self.spans, key=lambda s: (s[3], s[5])):
+            events.append({
+                'name': name, 'cat': cat, 'ph': 'X', 'pid': pid, 'tid': tid,
+                'ts': start / 1000, 'dur': (end - start) / 1000, 'args': args
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'run': self.name}}
+
+    def to_speedscope(self) -> Dict:
+        """speedscope file: an evented profile per thread, span names as frames"""
+        frames: Dict[str, int] = {}
+        by_thread: Dict[int, List[tuple]] = {}
+        for span in self.spans:
+            by_thread.setdefault(span[0], []).append(span)
+
+        profiles = []
+        for tid, spans in by_thread.items():
+            # Spans of a thread nest properly; replay them as open/close events
+            events, open_spans = [], []
+            for _, name, _, start, end, _, _ in sorted(spans, key=lambda s: (s[3], s[5])):
+                while open_spans and open_spans[-1][1] <= start:
+                    frame, closed_at = open_spans.pop()
+                    events.append({'type': 'C', 'frame': frame, 'at': closed_at / 1000})
+                frame = frames.setdefault(name, len(frames))
+                events.append({'type': 'O', 'frame': frame, 'at': start / 1000})
+                open_spans.append((frame, end))
+            while open_spans:
+                frame, closed_at = open_spans.pop()
+                events.append({'type': 'C', 'frame': frame, 'at': closed_at / 1000})
+
+            profiles.append({
+                'type': 'evented',
+                'name': self.thread_names.get(tid, str(tid)),
+                'unit': 'microseconds',
+                'startValue': events[0]['at'],
+                'endValue': events[-1]['at'],
+                'events': events
+            })
+
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': [{'name': name} for name in frames]},
+            'profiles': profiles,
+            'name': self.name,
+            'exporter': 'travel-planner'
+        }
+
+    def write(self, path: str, fmt: str = 'chrome') -> str:
+        if fmt not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format '{fmt}', expected one of {', '.join(TRACE_FORMATS)}")
+        data = self.to_speedscope() if fmt == 'speedscope' else self.to_chrome()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        return path
+
+
+# The trace being recorded in this context, if any (each Streamlit session
+# runs in its own). Worker threads given a copy of the context record into
+# it; runs started while it is set join it.
+_tracer: ContextVar[Optional[Tracer]] = ContextVar('tracer', default=None)
+
+
+def active() -> bool:
+    return _tracer.get() is not None
+
+
+def span(name: str, cat: str = 'run', **args):
+    """Time a block as a span of the active trace (a no-op when not profiling)"""
+    tracer = _tracer.get()
+    if tracer is None:
+        return _NO_SPAN
+    return tracer.span(name, cat, **args)
+
+
+@contextmanager
+def profile(path: str, fmt: Optional[str] = None, name: str = 'planning'):
+    """Record every span in the block and write them to path
+
+    fmt is 'chrome' or 'speedscope' (default PROFILE_TRACE_FORMAT).
+    """
+    fmt = fmt or PROFILE_TRACE_FORMAT
+    tracer = Tracer(name)
+    token = _tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _tracer.reset(token)
+        tracer.write(path, fmt)
+        if PLANNING_DEBUG:
+            print(f"Trace written to {path} ({len(tracer.spans)} spans, {fmt})")
+
+
+@contextmanager
+def trace_run(name: str, **args):
+    """Span for a whole run, profiled to PROFILE_TRACE_DIR when that is set
+
+    A run inside an active trace (e.g. journeys costed for a batch) only
+    adds its span to it. Yields the path the trace will be written to, or
+    None.
+    """
+    if active() or not PROFILE_TRACE_DIR:
+        with span(name, **args):
+            yield None
+        return
+
+    # The run id keeps runs started in the same second apart
+    extension = '.speedscope.json' if PROFILE_TRACE_FORMAT == 'speedscope' else '.trace.json'
+    run_id = uuid.uuid4().hex[:8]
+    path = os.path.join(PROFILE_TRACE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{run_id}{extension}")
+    with profile(path, name=name):
+        with span(name, **args):
+            yield path
@@ -42,6 +42,17 @@ class UKTransportService:
         
         self.bus_cost_per_mile = 0.12  # National Express type coaches
         
+        # Cities used for route-specific fare lookups
+        self.fare_cities = ['london', 'birmingham', 'manchester', 'southampton', 'leeds', 'bristol']
+        
+        # Major routes have specific pricing
+        self.specific_fares = {
+            ('london', 'birmingham'): {'peak': 65, 'off_peak': 25},
+            ('london', 'manchester'): {'peak': 85, 'off_peak': 35},
+            ('london', 'southampton'): {'peak': 55, 'off_peak': 28},
+            ('birmingham', 'manchester'): {'peak': 45, 'off_peak': 20}
+        }
+        
     def calculate_fuel_cost(self, distance_miles: float) -> float:
         """Calculate fuel cost for journey"""
         gallons_needed = distance_miles / self.average_mpg
@@ -154,15 +165,9 @@ class UKTransportService:
         
         # Major routes have specific pricing
         route_key = self._get_route_key(origin, destination)
-        specific_fares = {
-            ('london', 'birmingham'): {'peak': 65, 'off_peak': 25},
-            ('london', 'manchester'): {'peak': 85, 'off_peak': 35},
-            ('london', 'southampton'): {'peak': 55, 'off_peak': 28},
-            ('birmingham', 'manchester'): {'peak': 45, 'off_peak': 20}
-        }
         
-        if route_key in specific_fares:
-            train_cost = specific_fares[route_key]['peak' if is_peak else 'off_peak']
+        if route_key in self.specific_fares:
+            train_cost = self.specific_fares[route_key]['peak' if is_peak else 'off_peak']
         else:
             train_cost = distance_miles * train_rate
         
@@ -230,12 +235,10 @@ class UKTransportService:
     
     def _get_route_key(self, origin: str, destination: str) -> tuple:
         """Get standardized route key for fare lookup"""
-        cities = ['london', 'birmingham', 'manchester', 'southampton', 'leeds', 'bristol']
-        
         origin_city = None
         dest_city = None
         
-        for city in cities:
+        for city in self.fare_cities:
             if city in origin.lower():
                 origin_city = city
             if city in destination.lower():
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import sys
+
+# Tests never touch the real Google APIs or the on-disk caches
+os.environ['GOOGLE_MAPS_API_KEY'] = ''
+os.environ['GEMINI_API_KEY'] = ''
+os.environ['ROUTE_CACHE_ENABLED'] = 'false'
+os.environ['POSTCODE_DB_PATH'] = ''
+os.environ['PROFILE_TRACE_DIR'] = ''
+os.environ['PLANNING_DEBUG'] = 'false'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from models.booking import Booking, Provider
+from services.maps_service import MapsService
+
+
+def fake_value(*parts: str) -> int:
+    """Deterministic pseudo-random number for a set of strings"""
+    return int(hashlib.md5('|'.join(parts).encode()).hexdigest()[:6], 16)
+
+
+class FakeMapsClient:
+    """Stands in for googlemaps.Client and counts the requests made"""
+
+    def __init__(self):
+        self.calls = {'distance_matrix': 0, 'directions': 0, 'geocode': 0, 'elements': 0}
+
+    def distance_matrix(self, origins, destinations, mode, units):
+        self.calls['distance_matrix'] += 1
+        self.calls['elements'] += len(origins) * len(destinations)
+        return {'rows': [{'elements': [self._element(o, d) for d in destinations]} for o in origins]}
+
+    def directions(self, origin, destination, mode, units):
+        self.calls['directions'] += 1
+        element = self._element(origin, destination)
+        return [{
+            'legs': [{
+                'distance': element['distance'],
+                'duration': element['duration'],
+                'start_location': {'lat': 52.0, 'lng': -1.0},
+                'end_location': {'lat': 52.1, 'lng': -1.1}
+            }],
+            'overview_polyline': {'points': 'abc'},
+            'bounds': {}
+        }]
+
+    def geocode(self, address):
+        self.calls['geocode'] += 1
+        value = fake_value(address, 'geocode')
+        return [{'geometry': {'location': {'lat': 50 + (value % 400) / 100, 'lng': -4 + (value % 500) / 100}}}]
+
+    @staticmethod
+    def _element(origin, destination):
+        value = fake_value(origin, destination)
+        return {
+            'status': 'OK',
+            'distance': {'value': 1000 + value % 80000},
+            'duration': {'value': 300 + value % 5000}
+        }
+
+
+@pytest.fixture
+def fake_client():
+    return FakeMapsClient()
+
+
+@pytest.fixture
+def maps_service(fake_client):
+    """MapsService on the fake client, without the persistent caches or a QPS limit"""
+    service = MapsService(cache=None, geocode_cache=None, qps=0)
+    service.client = fake_client
+    return service
+
+
+def make_providers(count: int):
+    providers = []
+    for i in range(count):
+        provider = Provider(id=f'P{i}', address=f'{i} Road, Birmingham, B{i % 9} 1AA')
+        provider.name = f'Provider {i}'
+        provider.service_types = 'All'
+        provider.travel_mode = ['Car', 'Van', 'Public Transport', 'Car and Public Transport'][i % 4]
+        provider.service_cost = 40.0 + i % 7
+        provider.travel_time_rate = 15.0
+        provider.mileage_rate = 0.45
+        providers.append(provider)
+    return providers
+
+
+def make_bookings(count: int, providers, service_date: str = '2024-03-25'):
+    return [
+        Booking(booking_id=f'B{j}', customer_address=f'{j} Street, London, SW1 {j % 9}AB',
+                service_date=service_date, service_time=f'{9 + j % 8:02d}:00', providers=providers)
+        for j in range(count)
+    ]
@@ -0,0 +1,108 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from services.assignment_solver import AssignmentSolver
+
+
+def overlaps(assignment, intervals):
+    """Pairs of bookings placed on the same provider at overlapping times"""
+    found = []
+    for a, b in itertools.combinations(range(len(assignment)), 2):
+        if assignment[a] >= 0 and assignment[a] == assignment[b]:
+            (a_start, a_end), (b_start, b_end) = intervals[a], intervals[b]
+            if a_start < b_end and b_start < a_end:
+                found.append((a, b))
+    return found
+
+
+def brute_force(cost, allowed, capacity):
+    """Most bookings placed, then lowest cost, by trying every assignment"""
+    n_bookings, n_providers = cost.shape
+    best = None
+    for choice in itertools.product(range(-1, n_providers), repeat=n_bookings):
+        assignment = np.array(choice)
+        placed = assignment >= 0
+        if not all(allowed[b, assignment[b]] and np.isfinite(cost[b, assignment[b]])
+                   for b in np.flatnonzero(placed)):
+            continue
+        if (np.bincount(assignment[placed], minlength=n_providers) > capacity).any():
+            continue
+        score = (-int(placed.sum()), AssignmentSolver.total_cost(cost, assignment))
+        if best is None or score < best:
+            best = score
+    return best
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_solve_is_optimal_without_time_conflicts(seed):
+    rng = np.random.default_rng(seed)
+    cost = rng.uniform(10, 100, (5, 3))
+    cost[rng.random(cost.shape) < 0.2] = np.inf
+    allowed = rng.random(cost.shape) > 0.1
+    capacity = rng.integers(1, 3, 3)
+    intervals = np.full((5, 2), np.nan)
+
+    assignment = AssignmentSolver().solve(cost, allowed, capacity, intervals)
+
+    placed = assignment >= 0
+    assert brute_force(cost, allowed, capacity) == pytest.approx(
+        (-int(placed.sum()), AssignmentSolver.total_cost(cost, assignment)))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_solve_never_overlaps_or_exceeds_capacity_and_beats_greedy(seed):
+    rng = np.random.default_rng(seed)
+    n_bookings, n_providers = 12, 4
+    cost = rng.uniform(10, 100, (n_bookings, n_providers))
+    allowed = np.ones(cost.shape, dtype=bool)
+    capacity = rng.integers(1, 5, n_providers)
+    starts = rng.integers(8, 16, n_bookings) * 60.0
+    intervals = np.column_stack([starts, starts + 90])
+    high_priority = rng.random(n_bookings) < 0.3
+
+    solver = AssignmentSolver()
+    assignment = solver.solve(cost, allowed, capacity, intervals, high_priority)
+    order = list(np.flatnonzero(high_priority)) + list(np.flatnonzero(~high_priority))
+    greedy = solver.greedy(cost, allowed, capacity, intervals, order)
+
+    assert not overlaps(assignment, intervals)
+    assert (np.bincount(assignment[assignment >= 0], minlength=n_providers) <= capacity).all()
+    assert not solver._better(cost, greedy, assignment, high_priority)
+
+
+def test_slots_are_limited_to_bookings_that_fit_side_by_side():
+    intervals = np.array([[540, 660], [600, 720], [630, 690], [720, 780], [np.nan, np.nan]])
+    assert AssignmentSolver._max_side_by_side(intervals) == 3
+
+
+def test_high_priority_bookings_are_placed_first():
+    cost = np.array([[10.0], [50.0]])
+    intervals = np.array([[540, 600], [570, 630]])
+
+    assignment = AssignmentSolver().solve(cost, np.ones((2, 1), dtype=bool), np.array([2]), intervals,
+                                          high_priority=np.array([False, True]))
+
+    assert list(assignment) == [-1, 0]
+
+
+def test_greedy_takes_bookings_in_order_and_respects_time_and_capacity():
+    cost = np.array([[10.0, 20.0], [10.0, 30.0], [10.0, 40.0]])
+    allowed = np.ones(cost.shape, dtype=bool)
+    intervals = np.array([[540, 600], [570, 630], [700, 760]])
+
+    assignment = AssignmentSolver().greedy(cost, allowed, np.array([1, 5]), intervals, [0, 1, 2])
+
+    assert list(assignment) == [0, 1, 1]
+
+
+def test_solve_rows_keeps_the_existing_assignment():
+    cost = np.array([[10.0, 20.0], [10.0, 30.0], [15.0, 25.0]])
+    allowed = np.ones(cost.shape, dtype=bool)
+    intervals = np.array([[540, 600], [570, 630], [800, 860]])
+    existing = np.array([0, -1, -1])
+
+    assignment = AssignmentSolver().solve_rows(cost, allowed, np.array([2, 2]), intervals, [1, 2], existing)
+
+    assert list(assignment) == [0, 1, 0]
@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from services import async_maps_service
+from services.async_maps_service import AsyncMapsService, AsyncRateLimiter
+from services.postcode_geocoder import PostcodeGeocoder, build_postcode_file
+
+LOCATION = {'lat': 51.5, 'lng': -0.1}
+
+
+async def geocode_ok(request):
+    await asyncio.sleep(0.02)
+    return web.json_response({'status': 'OK', 'results': [{'geometry': {'location': LOCATION}}]})
+
+
+def run_with_server(handler, test, service=None):
+    """Run test(service, requests) against a local stand-in for the Maps API"""
+    requests = []
+
+    async def recording(request):
+        requests.append(request.match_info['endpoint'])
+        return await handler(request)
+
+    async def main(patch):
+        app = web.Application()
+        app.router.add_get('/maps/api/{endpoint}/json', recording)
+        async with TestServer(app) as server:
+            patch.setattr(async_maps_service, 'API_BASE_URL', str(server.make_url('/maps/api')))
+            async with service or AsyncMapsService(cache=None, geocode_cache=None, qps=0) as client:
+                client.api_key = 'test'
+                return await test(client, requests)
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(async_maps_service, 'MAPS_BACKOFF_SECONDS', 0)
+        return asyncio.run(main(patch))
+
+
+def test_rate_limiter_spaces_requests_after_the_burst():
+    async def main():
+        limiter = AsyncRateLimiter(50, burst=1)
+        started = time.monotonic()
+        await asyncio.gather(*(limiter.acquire() for _ in range(11)))
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) >= 10 / 50 * 0.9
+
+
+def test_concurrent_lookups_of_one_address_share_a_request():
+    async def test(service, requests):
+        results = await asyncio.gather(*(service.geocode_address('10 Road, Town') for _ in range(20)))
+        return results, list(requests)
+
+    results, requests = run_with_server(geocode_ok, test)
+
+    assert results == [LOCATION] * 20
+    assert requests == ['geocode']
+
+
+def test_postcodes_in_the_offline_file_are_not_requested(tmp_path):
+    csv_path = tmp_path / 'postcodes.csv'
+    csv_path.write_text('pcds,lat,long\nSO16 5YA,50.9,-1.4\n')
+    build_postcode_file(str(csv_path), str(tmp_path / 'postcodes.bin'))
+    service = AsyncMapsService(cache=None, geocode_cache=None, qps=0,
+                               postcode_geocoder=PostcodeGeocoder(str(tmp_path / 'postcodes.bin')))
+
+    async def test(service, requests):
+        offline = await service.geocode_address('1 Road, Southampton, SO16 5YA')
+        online = await service.geocode_address('1 Road, Southampton')
+        return offline, online, list(requests)
+
+    offline, online, requests = run_with_server(geocode_ok, test, service)
+
+    assert offline == pytest.approx({'lat': 50.9, 'lng': -1.4})
+    assert online == LOCATION
+    assert requests == ['geocode']
+
+
+def test_server_errors_and_over_query_limit_are_retried():
+    responses = [web.Response(status=503), web.json_response({'status': 'OVER_QUERY_LIMIT'})]
+
+    async def flaky(request):
+        if responses:
+            return responses.pop(0)
+        return web.json_response({
+            'status': 'OK',
+            'rows': [{'elements': [{'status': 'OK', 'distance': {'value': 16093.4}, 'duration': {'value': 600}}]}]
+        })
+
+    async def test(service, requests):
+        return await service.get_distance_duration('A', 'B'), len(requests)
+
+    result, attempts = run_with_server(flaky, test)
+
+    assert result['success'] and result['distance_miles'] == pytest.approx(10)
+    assert attempts == 3
+
+
+def test_sessions_are_per_loop_and_closed_with_it():
+    service = AsyncMapsService(cache=None, geocode_cache=None, qps=0)
+
+    async def open_session():
+        return service._open().session
+
+    first = asyncio.run(open_session())
+    second = asyncio.run(open_session())
+
+    assert first is not second
+    assert first.closed and second.closed
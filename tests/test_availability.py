@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from conftest import make_bookings, make_providers
+from models.booking import Booking, OtherBooking, Provider
+from services import instrumentation
+from services.availability import AvailabilityIndex, IntervalSet, booking_interval, parse_minutes
+from services.cost_calculator import CostCalculator
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('09:30', 570), ('9:05:00', 545), (' 23:59 ', 1439), ('24:00', None), ('10', None), ('', None), (None, None)
+])
+def test_parse_minutes(value, expected):
+    assert parse_minutes(value) == expected
+
+
+def test_booking_interval_uses_the_duration_or_two_hours():
+    booking = Booking(booking_id='B1', customer_address='A', service_date='2024-03-25',
+                      service_time='10:00', providers=[])
+    assert booking_interval(booking) == (600, 720)
+    booking.duration = 1.5
+    assert booking_interval(booking) == (600, 690)
+
+
+def test_interval_set_merges_overlapping_and_touching_intervals():
+    busy = IntervalSet()
+    for start, end in [(600, 660), (700, 760), (660, 680), (750, 800), (500, 510), (900, 900)]:
+        busy.add(start, end)
+
+    assert list(zip(busy.starts, busy.ends)) == [(500, 510), (600, 680), (700, 800)]
+    assert busy.overlaps(679, 690)
+    assert not busy.overlaps(680, 700)
+    assert not busy.overlaps(510, 600)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_interval_set_agrees_with_a_linear_scan(seed):
+    rng = np.random.default_rng(seed)
+    busy = IntervalSet()
+    added = []
+    for _ in range(30):
+        start = int(rng.integers(0, 1400))
+        end = start + int(rng.integers(1, 120))
+        busy.add(start, end)
+        added.append((start, end))
+
+    assert busy.starts == sorted(busy.starts)
+    assert all(end < next_start for end, next_start in zip(busy.ends, busy.starts[1:]))
+    for _ in range(200):
+        start = int(rng.integers(0, 1400))
+        end = start + int(rng.integers(1, 120))
+        assert busy.overlaps(start, end) == any(start < e and s < end for s, e in added)
+
+
+def test_index_blocks_other_bookings_on_every_date_and_assignments_on_theirs():
+    provider = Provider(id='P1', address='A', other_bookings=[
+        OtherBooking(booking_id='O1', address='X', start_time='09:00', duration_hours=1.0),
+        OtherBooking(booking_id='O2', address='X', start_time='later', duration_hours=1.0)
+    ])
+
+    def booking(date, time):
+        return Booking(booking_id='B', customer_address='C', service_date=date, service_time=time,
+                       providers=[provider], duration=1.0)
+
+    with instrumentation.measure_run() as metrics:
+        index = AvailabilityIndex.from_providers([provider])
+    assert metrics.summary()['counters'] == {'warnings.unreadable_booking': 1}
+
+    assert not index.is_provider_available(provider, booking('2024-03-25', '09:30'))
+    assert not index.is_provider_available(provider, booking('2024-03-26', '09:30'))
+
+    index.assign(provider, booking('2024-03-25', '11:00'))
+    assert not index.is_provider_available(provider, booking('2024-03-25', '11:30'))
+    assert index.is_provider_available(provider, booking('2024-03-26', '11:30'))
+    assert index.is_provider_available(provider, booking('2024-03-25', 'unknown'))
+
+
+def test_calculate_best_provider_starts_with_a_fresh_index(maps_service):
+    calculator = CostCalculator(maps_service)
+    providers = make_providers(1)
+    booking = make_bookings(1, providers)[0]
+
+    calculator.availability.assign(providers[0], booking)
+    assert calculator.calculate_best_provider(booking).is_available
@@ -0,0 +1,118 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from models.booking import Booking, Provider
+from services.cost_kernel import COST_COMPONENTS, CostKernel
+from services.uk_transport import UKTransportService
+
+ADDRESSES = [
+    '1 High St, London SW1A 1AA',
+    '2 Canal St, Birmingham B1 1AA',
+    '3 Deansgate, Manchester M3 4LQ',
+    '4 Bridge Rd, Dartford DA1 1AA',
+    '5 Above Bar, Southampton SO14 7DU',
+    '6 Market Pl, Wolverhampton WV1 1AA',
+    '7 Green Lane, Little Snoring NR21 0AA'
+]
+TRAVEL_MODES = ['Car', 'Van', 'Car and Public Transport', 'Public Transport', None]
+
+
+def scalar_travel_cost(uk_transport, provider, booking, distance, duration):
+    """Per-provider travel cost as calculated before the kernel, one row at a time"""
+    mileage_rate = provider.mileage_rate
+    breakdown = {}
+
+    if provider.travel_mode in ['Car', 'Van']:
+        breakdown['mileage'] = round(distance * 2 * mileage_rate, 2)
+        breakdown['parking'] = uk_transport.get_parking_costs(booking.customer_address, booking.duration)['total_cost']
+        breakdown['congestion_charge'] = uk_transport.get_congestion_charge(booking.customer_address)['charge']
+        tolls = uk_transport.check_toll_roads(provider.address, booking.customer_address)
+        breakdown['tolls'] = sum(toll['car_charge'] if provider.travel_mode == 'Car' else toll['van_charge']
+                                 for toll in tolls)
+
+    elif provider.travel_mode == 'Car and Public Transport':
+        breakdown['mileage_to_station'] = round(distance * 0.3 * 2 * mileage_rate, 2)
+        breakdown['park_and_ride'] = 5.00
+        public = uk_transport.estimate_public_transport_cost(provider.address, booking.customer_address,
+                                                             distance * 0.7)
+        if 'train' in public:
+            breakdown['public_transport'] = public['train']['cost'] * 2
+        else:
+            breakdown['public_transport'] = round(distance * 0.7 * 2 * 0.20, 2)
+
+    elif provider.travel_mode == 'Public Transport':
+        public = uk_transport.estimate_public_transport_cost(provider.address, booking.customer_address, distance)
+        if 'train' in public:
+            breakdown['public_transport'] = public[public['recommended']]['cost'] * 2
+        else:
+            breakdown['public_transport'] = round(distance * 2 * 0.20, 2)
+
+    breakdown['travel_time'] = round((duration * 2) / 60 * provider.travel_time_rate, 2)
+    return breakdown
+
+
+def make_pairs():
+    providers, bookings, distances = [], [], []
+    for i, (origin, destination, mode) in enumerate(itertools.product(ADDRESSES, ADDRESSES, TRAVEL_MODES)):
+        provider = Provider(id=f'P{i}', address=origin)
+        provider.travel_mode = mode
+        provider.service_cost = 40.0 + i % 5
+        provider.travel_time_rate = 12.0 + i % 3
+        provider.mileage_rate = 0.40 + (i % 4) / 100
+        booking = Booking(booking_id=f'B{i}', customer_address=destination, service_date='2024-03-25',
+                          service_time='10:00', providers=[provider])
+        booking.duration = [1.0, 2.5, 8.0, 9.0][i % 4]
+        providers.append(provider)
+        bookings.append(booking)
+        distances.append([3.0, 42.5, 99.9, 180.0][i % 4])
+    return providers, bookings, np.array(distances)
+
+
+@pytest.mark.parametrize('is_peak', [True, False])
+def test_kernel_matches_the_scalar_cost_for_every_mode(monkeypatch, is_peak):
+    uk_transport = UKTransportService()
+    monkeypatch.setattr(uk_transport, '_is_peak_time', lambda time=None: is_peak)
+    kernel = CostKernel(uk_transport)
+    providers, bookings, distance = make_pairs()
+    duration = distance * 1.3
+
+    index = np.arange(len(providers))
+    components = kernel.evaluate_pairs(providers, bookings, index, index, distance, duration, is_peak=is_peak)
+
+    for i, (provider, booking) in enumerate(zip(providers, bookings)):
+        expected = scalar_travel_cost(uk_transport, provider, booking, distance[i], duration[i])
+        actual = {name: float(components[name][i]) for name in COST_COMPONENTS}
+        assert {k: v for k, v in actual.items() if v} == pytest.approx({k: v for k, v in expected.items() if v}), \
+            (provider.travel_mode, provider.address, booking.customer_address)
+        assert components['travel_cost'][i] == pytest.approx(round(sum(expected.values()), 2))
+        assert components['total_cost'][i] == pytest.approx(round(sum(expected.values()) + provider.service_cost, 2))
+
+
+def test_matrix_evaluation_matches_pairs():
+    kernel = CostKernel(UKTransportService())
+    providers, bookings, _ = make_pairs()
+    providers, bookings = providers[:12], bookings[:9]
+    rng = np.random.default_rng(0)
+    distance = rng.uniform(1, 150, (len(providers), len(bookings)))
+    duration = distance * 1.5
+
+    matrix = kernel.evaluate_matrix(providers, bookings, distance, duration)
+    rows, cols = np.indices(distance.shape).reshape(2, -1)
+    pairs = kernel.evaluate_pairs(providers, bookings, rows, cols, distance[rows, cols], duration[rows, cols],
+                                  is_peak=matrix['is_peak'])
+
+    assert np.allclose(matrix['total_cost'][rows, cols], pairs['total_cost'])
+
+
+def test_breakdown_survives_the_compact_values():
+    kernel = CostKernel(UKTransportService())
+    providers, bookings, distance = make_pairs()
+    index = np.arange(len(providers))
+    components = kernel.evaluate_pairs(providers, bookings, index, index, distance, distance, is_peak=True)
+
+    for i in range(0, len(providers), 7):
+        values = kernel.breakdown_values(components, i)
+        address = bookings[i].customer_address
+        assert kernel.breakdown_from_values(values, address) == kernel.breakdown(components, i, address)
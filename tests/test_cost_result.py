@@ -0,0 +1,50 @@
+import pytest
+
+from conftest import make_bookings, make_providers
+from services.cost_calculator import CostCalculator
+from services.cost_result import RESULT_KEYS
+
+
+@pytest.fixture
+def best(maps_service):
+    providers = make_providers(5)
+    return CostCalculator(maps_service).calculate_best_provider(make_bookings(1, providers)[0])
+
+
+def test_result_reads_like_the_old_dict(best):
+    assert best['total_cost'] == best.total_cost
+    assert set(best.keys()) == set(RESULT_KEYS)
+    assert best.get('missing', 'default') == 'default'
+    with pytest.raises(KeyError):
+        best['missing']
+
+    breakdown = best['travel_breakdown']
+    numbers = [value for key, value in breakdown.items() if isinstance(value, float) and key != 'is_peak']
+    assert sum(numbers) == pytest.approx(best['travel_cost'])
+    assert best['cost_details']['round_trip_distance'] == best['distance'] * 2
+
+
+def test_route_is_loaded_once_on_first_read(best, fake_client):
+    assert fake_client.calls['directions'] == 0
+
+    route = best['route_info']
+    assert route['polyline'] == 'abc'
+    # Distances stay those the costs were calculated from
+    assert route['distance_miles'] == best['distance']
+    assert best['route_details']['route_info'] is route
+    assert fake_client.calls['directions'] == 1
+
+
+def test_candidates_are_compact_and_expand_to_comparison_rows(best):
+    candidates = best['all_providers']
+
+    rows = list(candidates)
+    assert len(rows) == len(candidates) == best['total_providers_routed']
+    assert [row['provider_id'] for row in rows] == candidates.provider_ids()
+    chosen = candidates.position(best['provider'].id)
+    assert rows[chosen]['total_cost'] == best['total_cost']
+    assert candidates.position('nobody') is None
+
+    frame = candidates.to_dataframe()
+    assert frame['total_cost'].tolist() == [row['total_cost'] for row in rows]
+    assert frame['available'].tolist() == [row['available'] for row in rows]
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from conftest import make_bookings, make_providers
+from services import cost_calculator
+from services.cost_calculator import CostCalculator
+from services.distance_estimator import (
+    MAX_SPEED_MPH,
+    REGION_ROAD_FACTORS,
+    DistanceEstimator,
+    haversine_miles,
+    region_for
+)
+
+
+def test_haversine_miles():
+    # London to Manchester is about 163 miles as the crow flies
+    assert haversine_miles(51.5074, -0.1278, 53.4808, -2.2426) == pytest.approx(163, abs=1)
+    assert haversine_miles([52.0, 52.0], [-1.0, -1.0], 52.0, -1.0).tolist() == [0.0, 0.0]
+
+
+def test_region_and_calibrated_road_factor(maps_service):
+    estimator = DistanceEstimator(maps_service)
+    assert region_for('1 Road, LONDON') == 'london'
+    assert region_for(None) == ''
+    assert estimator.road_factor('london') == REGION_ROAD_FACTORS['london']
+
+    origins = [f'{i} Road, Leeds' for i in range(40)]
+    straight = estimator.straight_line(origins, '1 Street, London')
+    estimator.observe(origins, '1 Street, London', straight * 2.0)
+
+    usable = (straight > 1).sum()
+    assert estimator.road_factor('london') == pytest.approx((1.45 * 20 + 2.0 * usable) / (20 + usable))
+
+
+def test_duration_model_is_increasing_and_slower_in_london(maps_service):
+    estimator = DistanceEstimator(maps_service)
+    distance = np.array([0, 2, 5, 10, 30, 100, 300])
+    duration = estimator.estimate_duration(distance)
+
+    assert np.all(np.diff(duration) > 0)
+    assert np.all(duration[1:] >= distance[1:] / MAX_SPEED_MPH * 60)
+    assert np.all(estimator.estimate_duration(distance, 'london')[1:] > duration[1:])
+
+
+@pytest.fixture
+def geographic_client(maps_service, fake_client):
+    """Fake routes that are never shorter or faster than the straight line allows"""
+    def distance_matrix(origins, destinations, mode, units):
+        fake_client.calls['elements'] += len(origins) * len(destinations)
+        rows = []
+        for origin in origins:
+            start = maps_service.geocode_address(origin)
+            elements = []
+            for destination in destinations:
+                end = maps_service.geocode_address(destination)
+                miles = float(haversine_miles(start['lat'], start['lng'], end['lat'], end['lng']))
+                factor = 1.1 + len(origin + destination) % 7 / 10
+                elements.append({
+                    'status': 'OK',
+                    'distance': {'value': miles * factor * 1609.34},
+                    'duration': {'value': miles * factor / 45 * 3600}
+                })
+            rows.append({'elements': elements})
+        return {'rows': rows}
+
+    fake_client.distance_matrix = distance_matrix
+    return fake_client
+
+
+def test_prefilter_keeps_the_cheapest_provider_and_routes_fewer(maps_service, geographic_client, monkeypatch):
+    providers = make_providers(60)
+    bookings = make_bookings(5, providers)
+
+    calculator = CostCalculator(maps_service)
+    prefiltered = [calculator.calculate_best_provider(b) for b in bookings]
+    routed = geographic_client.calls['elements']
+
+    monkeypatch.setattr(cost_calculator, 'PREFILTER_ENABLED', False)
+    geographic_client.calls['elements'] = 0
+    exhaustive = [calculator.calculate_best_provider(b) for b in bookings]
+
+    assert [r.total_cost for r in prefiltered] == [r.total_cost for r in exhaustive]
+    assert routed < geographic_client.calls['elements']
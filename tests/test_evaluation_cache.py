@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from conftest import make_bookings, make_providers
+from services.cost_calculator import CostCalculator
+from services.evaluation_cache import PAIR_FIELDS, EvaluationCache
+
+
+def fake_components(values):
+    """evaluate() stand-in: every field of a pair is its key's value"""
+    calls = []
+
+    def evaluate(positions):
+        calls.append(positions.tolist())
+        return {name: np.asarray(values, dtype=float)[positions] for name in PAIR_FIELDS}
+
+    return evaluate, calls
+
+
+def test_each_pair_is_evaluated_once_per_run():
+    cache = EvaluationCache(is_peak=False)
+    keys = [('b1', 'p1'), ('b1', 'p2'), ('b1', 'p1')]
+    evaluate, calls = fake_components([1.0, 2.0, 1.0])
+
+    first = cache.pair_components(keys, evaluate)
+    assert calls == [[0, 1]]
+    assert first['total_cost'].tolist() == [1.0, 2.0, 1.0]
+    assert first['is_peak'] is False
+
+    evaluate, calls = fake_components([3.0, 2.0, 1.0])
+    second = cache.pair_components([('b2', 'p1'), ('b1', 'p2'), ('b1', 'p1')], evaluate)
+    assert calls == [[0]]
+    assert second['total_cost'].tolist() == [3.0, 2.0, 1.0]
+    assert cache.stats()['cost_hits'] == 3 and cache.stats()['cost_misses'] == 3
+
+
+def test_values_survive_growth():
+    cache = EvaluationCache(is_peak=True)
+    for i in range(100):
+        evaluate, _ = fake_components([float(i)])
+        cache.pair_components([('b', i)], evaluate)
+
+    evaluate, calls = fake_components([])
+    components = cache.pair_components([('b', i) for i in range(100)], evaluate)
+    assert calls == []
+    assert components['distance'].tolist() == [float(i) for i in range(100)]
+
+
+def test_routes_are_fetched_once_per_normalized_pair():
+    cache = EvaluationCache(is_peak=False)
+    fetched = []
+
+    def fetch(pairs):
+        fetched.append(pairs)
+        return [{'route': origin} for origin, _ in pairs]
+
+    routes = cache.get_routes([('1 Road, SO16 5YA', 'X'), ('1 road,so165ya', 'x'), ('2 Road', 'X')], fetch)
+    cache.get_routes([('2 Road', 'X')], fetch)
+
+    assert fetched == [[('1 Road, SO16 5YA', 'X'), ('2 Road', 'X')]]
+    assert routes[0] is routes[1]
+    assert cache.stats()['route_hits'] == 2 and cache.stats()['route_misses'] == 2
+
+
+def test_a_planning_run_never_evaluates_a_pair_twice(maps_service):
+    providers = make_providers(8)
+    calculator = CostCalculator(maps_service)
+
+    calculator.calculate_all_bookings(make_bookings(6, providers))
+
+    stats = calculator.evaluation_cache.stats()
+    assert stats['cost_misses'] <= 6 * 8
+    assert len(calculator.evaluation_cache.pair_rows) == stats['cost_misses']
+
+
+def test_calculate_best_provider_starts_a_fresh_cache(maps_service):
+    providers = make_providers(3)
+    calculator = CostCalculator(maps_service)
+    booking = make_bookings(1, providers)[0]
+
+    first = calculator.calculate_best_provider(booking)
+    for provider in providers:
+        provider.service_cost += 100
+    second = calculator.calculate_best_provider(booking)
+
+    assert second.total_cost == pytest.approx(first.total_cost + 100)
@@ -0,0 +1,60 @@
+import googlemaps
+
+from services import geocode_cache as geocode_module
+from services.geocode_cache import NOT_FOUND, GeocodeCache
+from services.maps_service import MapsService
+
+
+def test_found_addresses_persist_and_not_found_stay_in_memory(tmp_path):
+    path = str(tmp_path / 'geocodes.sqlite3')
+    cache = GeocodeCache(path)
+    cache.set_many([('1 Road, Leeds', (53.8, -1.5)), ('Nowhere', None)])
+
+    assert cache.get_many(['1 road ,leeds', 'Nowhere', 'Unknown']) == [(53.8, -1.5), NOT_FOUND, None]
+
+    reopened = GeocodeCache(path)
+    assert reopened.get_many(['1 Road, Leeds', 'Nowhere']) == [(53.8, -1.5), None]
+
+
+def test_not_found_expires_and_lru_is_bounded(tmp_path, monkeypatch):
+    cache = GeocodeCache(str(tmp_path / 'geocodes.sqlite3'), lru_size=2, not_found_ttl_hours=1)
+    cache.set('Nowhere', None)
+
+    now = geocode_module.time.time()
+    monkeypatch.setattr(geocode_module.time, 'time', lambda: now + 2 * 3600)
+    assert cache.get('Nowhere') is None
+
+    cache.set_many([('A', (1.0, 1.0)), ('B', (2.0, 2.0)), ('C', (3.0, 3.0))])
+    assert cache.stats()['in_memory'] == 2
+    # Evicted from memory, still served from SQLite
+    assert cache.get('A') == (1.0, 1.0)
+
+
+def test_batch_geocoding_requests_each_unique_miss_once(tmp_path, fake_client):
+    service = MapsService(cache=None, geocode_cache=GeocodeCache(str(tmp_path / 'geocodes.sqlite3')), qps=0)
+    service.client = fake_client
+
+    addresses = ['1 Road, Leeds', '1 road, leeds', '2 Road, York']
+    first = service.geocode_addresses(addresses)
+    assert first[0] == first[1] and first[0] != first[2]
+    assert fake_client.calls['geocode'] == 2
+
+    assert service.geocode_addresses(addresses) == first
+    assert fake_client.calls['geocode'] == 2
+
+
+def test_failed_requests_are_not_cached_but_zero_results_are(tmp_path, fake_client):
+    service = MapsService(cache=None, geocode_cache=GeocodeCache(str(tmp_path / 'geocodes.sqlite3')), qps=0)
+    service.client = fake_client
+    geocode = fake_client.geocode
+
+    def failing(address):
+        fake_client.calls['geocode'] += 1
+        if address == 'Timeout':
+            raise googlemaps.exceptions.Timeout()
+        return [] if address == 'Nowhere' else geocode(address)
+
+    fake_client.geocode = failing
+    assert service.geocode_addresses(['Timeout', 'Nowhere']) == [None, None]
+    assert service.geocode_addresses(['Timeout', 'Nowhere']) == [None, None]
+    assert fake_client.calls['geocode'] == 3
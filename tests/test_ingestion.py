@@ -0,0 +1,71 @@
+from datetime import time
+
+import numpy as np
+import pandas as pd
+
+from services.ingestion import IngestionReport, coerce_date, coerce_number, coerce_text, coerce_time, require
+
+
+def reported(report):
+    return [(error['row'], error['column'], error['value']) for error in report.errors]
+
+
+def test_coerce_text_trims_and_defaults_blank_or_missing_columns():
+    df = pd.DataFrame({'Name': [' Ann ', None, '   ', 42]})
+
+    assert coerce_text(df, 'Name', 'n/a').tolist() == ['Ann', 'n/a', 'n/a', '42']
+    assert coerce_text(df, 'Missing').tolist() == ['', '', '', '']
+
+
+def test_coerce_number_cleans_currency_and_units_and_reports_the_rest():
+    df = pd.DataFrame({'Cost': ['£1,250.50', 40, '  ', 'ask', None],
+                       'Hours': ['1.5 hours', '2', 'two', None, 3]})
+    report = IngestionReport()
+
+    cost = coerce_number(df, 'Cost', 50.0, report, currency=True)
+    hours = coerce_number(df, 'Hours', 2.0, report, strip_units=True, blank=0.0)
+
+    assert cost.tolist() == [1250.5, 40.0, 50.0, 50.0, 50.0]
+    assert hours.tolist() == [1.5, 2.0, 2.0, 0.0, 3.0]
+    assert reported(report) == [(5, 'Cost', 'ask'), (4, 'Hours', 'two')]
+
+
+def test_coerce_number_without_default_keeps_nan():
+    df = pd.DataFrame({'Max': ['', '10']})
+    assert np.isnan(coerce_number(df, 'Max', None)[0])
+
+
+def test_coerce_time_reads_cells_datetimes_and_text():
+    df = pd.DataFrame({'Time': [time(9, 5), '9:00', '14.30', '09:00:00', '2024-03-25 17:45:00',
+                                '2024-03-25 08:00', '25:00', 'noon', None]})
+    report = IngestionReport()
+
+    times = coerce_time(df, 'Time', '10:00', report)
+
+    assert times.tolist() == ['09:05', '09:00', '14:30', '09:00', '17:45', '08:00', '25:00', 'noon', '10:00']
+    assert reported(report) == [(8, 'Time', '25:00'), (9, 'Time', 'noon')]
+
+
+def test_coerce_date_reads_uk_dates_day_first_and_iso_dates_year_first():
+    df = pd.DataFrame({'Date': ['03/04/2024', '2024-04-03', '25/12/2024', '2024/12/25', '3 April 2024',
+                                pd.Timestamp('2024-04-03'), 'soon', '']})
+    report = IngestionReport()
+
+    dates = coerce_date(df, 'Date', report)
+
+    assert dates.tolist() == ['2024-04-03', '2024-04-03', '2024-12-25', '2024-12-25', '2024-04-03',
+                              '2024-04-03', 'soon', '']
+    assert reported(report) == [(8, 'Date', 'soon')]
+
+
+def test_require_skips_rows_missing_any_required_value_once():
+    df = pd.DataFrame({'ID': ['B1', '', None, 'B4'], 'Address': ['A', '', 'C', ' ']})
+    report = IngestionReport(source='bookings', rows_read=4)
+
+    keep = require(df, ['ID', 'Address'], report)
+    report.rows_loaded = int(keep.sum())
+
+    assert keep.tolist() == [True, False, False, False]
+    assert reported(report) == [(3, 'ID', None), (4, 'ID', None), (5, 'Address', None)]
+    assert report.rows_skipped == 3
+    assert report.summary() == '1/4 rows loaded, 3 problem(s) found'
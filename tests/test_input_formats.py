@@ -0,0 +1,126 @@
+import io
+
+import pandas as pd
+import pytest
+
+from services.excel_handler import ExcelHandler
+from services.ingestion import IngestionReport
+from services.input_formats import BOOKING_COLUMNS, PROVIDER_COLUMNS, detect_format, iter_frames
+
+PROVIDERS = pd.DataFrame({
+    'ProviderID': ['P1', 'P2', 'P3'],
+    'ProviderName': ['Ann', 'Bob', ''],
+    'ProviderAddress': ['1 Road, Leeds', '2 Road, York', '3 Road, Hull'],
+    'ServiceTypes': ['Cleaning', 'All', 'Gardening'],
+    'TravelMode': ['Car', 'Van', 'Public Transport'],
+    'ServiceCost': ['40', '£45.50', '50'],
+    'Notes': ['ignored', 'ignored', 'ignored']
+})
+BOOKINGS = pd.DataFrame({
+    'BookingID': [f'B{i}' for i in range(7)],
+    'CustomerAddress': [f'{i} Street, Leeds' for i in range(7)],
+    'ServiceDate': ['03/04/2024'] * 7,
+    'ServiceTime': ['9:00'] * 7,
+    'ServiceType': ['Cleaning', 'Gardening', 'Cleaning', 'Plumbing', 'Cleaning', 'Gardening', 'Cleaning']
+})
+
+
+def to_xlsx(df: pd.DataFrame, blank_rows=()) -> bytes:
+    """Workbook bytes with optional empty rows inserted before the given data rows"""
+    rows = [list(df.columns)]
+    for i, row in enumerate(df.itertuples(index=False)):
+        if i in blank_rows:
+            rows.append([None] * len(df.columns))
+        rows.append(list(row))
+    output = io.BytesIO()
+    pd.DataFrame(rows[1:], columns=rows[0]).to_excel(output, index=False)
+    return output.getvalue()
+
+
+def to_format(df: pd.DataFrame, format: str) -> bytes:
+    output = io.BytesIO()
+    if format == 'xlsx':
+        return to_xlsx(df)
+    if format == 'csv':
+        df.to_csv(output, index=False)
+    elif format == 'parquet':
+        df.to_parquet(output, index=False)
+    else:
+        df.to_json(output, orient='records', lines=True)
+    return output.getvalue()
+
+
+def test_xlsx_is_read_in_chunks_with_file_row_labels():
+    data = to_xlsx(BOOKINGS, blank_rows=(3,))
+
+    frames = list(iter_frames(data, ['BookingID', 'ServiceType'], chunk_rows=3))
+
+    assert [len(frame) for frame in frames] == [3, 3, 1]
+    assert all(list(frame.columns) == ['BookingID', 'ServiceType'] for frame in frames)
+    combined = pd.concat(frames)
+    assert combined['BookingID'].tolist() == BOOKINGS['BookingID'].tolist()
+    # The blank row keeps its place in the numbering but is not returned
+    assert combined.index.tolist() == [0, 1, 2, 4, 5, 6, 7]
+
+
+def test_unsupported_format_is_rejected():
+    with pytest.raises(ValueError):
+        iter_frames(b'', format='docx')
+
+
+def test_planning_files_stream_matched_booking_chunks():
+    report = IngestionReport()
+
+    chunks = list(ExcelHandler.stream_planning_files(to_xlsx(BOOKINGS), to_xlsx(PROVIDERS), report, chunk_rows=4))
+
+    assert [len(chunk) for chunk in chunks] == [4, 3]
+    bookings = [booking for chunk in chunks for booking in chunk]
+    assert [p.id for p in bookings[0].providers] == ['P1', 'P2']
+    assert [p.id for p in bookings[1].providers] == ['P2', 'P3']
+    # Bookings of one service type share a provider list across chunks
+    assert bookings[0].providers is bookings[6].providers
+    assert bookings[0].service_date == '2024-04-03'
+    assert bookings[0].providers[1].service_cost == 45.5
+    assert report.errors == []
+
+
+def test_columns_outside_the_schema_are_not_read():
+    frames = list(iter_frames(to_xlsx(PROVIDERS), PROVIDER_COLUMNS))
+    assert 'Notes' not in frames[0].columns
+    assert set(BOOKING_COLUMNS) >= set(next(iter_frames(to_xlsx(BOOKINGS), BOOKING_COLUMNS)).columns)
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('bookings.CSV', 'csv'), ('b.parquet', 'parquet'), ('b.pq', 'parquet'), ('b.jsonl', 'ndjson'),
+    ('b.ndjson', 'ndjson'), ('b.xlsm', 'xlsx'), ('b', 'xlsx')
+])
+def test_format_is_detected_from_the_file_name(name, expected):
+    upload = io.BytesIO()
+    upload.name = name
+    assert detect_format(upload) == expected
+    assert detect_format(name) == expected
+    assert detect_format(b'', format='.CSV') == 'csv'
+
+
+@pytest.mark.parametrize('format', ['csv', 'parquet', 'ndjson'])
+def test_every_format_is_chunked_like_xlsx(format):
+    frames = list(iter_frames(to_format(BOOKINGS, format), ['BookingID', 'ServiceTime'], format, chunk_rows=3))
+
+    assert [len(frame) for frame in frames] == [3, 3, 1]
+    combined = pd.concat(frames)
+    assert list(combined.columns) == ['BookingID', 'ServiceTime']
+    assert combined.index.tolist() == list(range(7))
+    assert combined['BookingID'].tolist() == BOOKINGS['BookingID'].tolist()
+
+
+@pytest.mark.parametrize('format', ['csv', 'parquet', 'ndjson'])
+def test_every_format_plans_the_same_bookings(format):
+    def plan(bookings_format):
+        bookings = ExcelHandler.parse_planning_files(
+            to_format(BOOKINGS, bookings_format), to_format(PROVIDERS, bookings_format),
+            bookings_format=bookings_format, providers_format=bookings_format
+        )
+        return [(b.booking_id, b.service_date, b.service_time, [(p.id, p.name, p.service_cost) for p in b.providers])
+                for b in bookings]
+
+    assert plan(format) == plan('xlsx')
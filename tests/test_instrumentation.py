@@ -0,0 +1,76 @@
+import contextvars
+import io
+import threading
+import time
+from contextlib import redirect_stdout
+
+from conftest import make_bookings, make_providers
+from services import instrumentation
+from services.cost_calculator import CostCalculator
+from services.instrumentation import RunMetrics
+
+
+def test_stage_time_is_exclusive_of_nested_stages():
+    metrics = RunMetrics()
+    with metrics.stage('candidates'):
+        time.sleep(0.02)
+        with metrics.stage('tariffs'):
+            time.sleep(0.05)
+        with metrics.stage('tariffs'):
+            pass
+    metrics.finish()
+
+    summary = metrics.summary()
+    assert list(summary['stages']) == ['candidates', 'tariffs']
+    assert summary['stages']['tariffs']['entries'] == 2
+    assert 0.015 <= metrics.seconds['candidates'] < 0.045
+    assert metrics.seconds['tariffs'] >= 0.045
+    assert sum(metrics.seconds.values()) <= metrics.wall_seconds
+
+
+def test_counters_api_calls_and_hit_ratios_are_reported_apart():
+    metrics = RunMetrics()
+    metrics.count('api.directions', 3)
+    metrics.record_cache('route_cache.distance', 3, 1)
+    metrics.count('warnings.busy_fallback')
+
+    summary = metrics.summary()
+    assert summary['api_calls'] == {'directions': 3}
+    assert summary['cache_hit_ratio'] == {'route_cache.distance': 0.75}
+    assert summary['counters'] == {'route_cache.distance.hits': 3, 'route_cache.distance.misses': 1,
+                                   'warnings.busy_fallback': 1}
+    assert 'directions 3' in metrics.report()
+
+
+def test_runs_in_separate_contexts_do_not_mix():
+    counts = {}
+
+    def run(name, n):
+        with instrumentation.measure_run() as metrics:
+            for _ in range(n):
+                instrumentation.count('work')
+                time.sleep(0.001)
+            counts[name] = metrics.counters['work']
+
+    threads = [threading.Thread(target=contextvars.copy_context().run, args=(run, name, n))
+               for name, n in (('a', 20), ('b', 35))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counts == {'a': 20, 'b': 35}
+    assert instrumentation.current() is instrumentation._untracked
+
+
+def test_planning_run_records_stages_and_calls_without_printing(maps_service):
+    calculator = CostCalculator(maps_service)
+    output = io.StringIO()
+
+    with redirect_stdout(output):
+        calculator.calculate_all_bookings(make_bookings(4, make_providers(6)))
+
+    summary = calculator.last_run_metrics.summary()
+    assert output.getvalue() == ''
+    assert {'routing', 'evaluation', 'assignment'} <= set(summary['stages'])
+    assert summary['api_calls']['distance_matrix'] >= 1
@@ -0,0 +1,177 @@
+import threading
+import time
+
+import googlemaps
+import pytest
+
+from services import instrumentation, maps_service as maps_module
+from services.maps_service import (
+    MATRIX_MAX_DESTINATIONS,
+    MATRIX_MAX_ELEMENTS,
+    MATRIX_MAX_ORIGINS,
+    MapsService,
+    RateLimiter,
+    SingleFlight
+)
+from services.route_cache import RouteCache
+
+
+@pytest.mark.parametrize('n_origins, n_destinations', [(1, 1), (3, 60), (40, 2), (30, 30), (7, 13)])
+def test_matrix_tiles_cover_every_pair_within_the_limits(n_origins, n_destinations):
+    origins = [f'O{i}' for i in range(n_origins)]
+    destinations = [f'D{j}' for j in range(n_destinations)]
+
+    covered = []
+    for origin_chunk, destination_chunk in MapsService._matrix_tiles(origins, destinations):
+        assert len(origin_chunk) <= MATRIX_MAX_ORIGINS
+        assert len(destination_chunk) <= MATRIX_MAX_DESTINATIONS
+        assert len(origin_chunk) * len(destination_chunk) <= MATRIX_MAX_ELEMENTS
+        covered += [(o, d) for o in origin_chunk for d in destination_chunk]
+
+    assert sorted(covered) == sorted((o, d) for o in origins for d in destinations)
+
+
+def test_distance_matrix_matches_single_lookups(maps_service, fake_client):
+    origins = [f'{i} Road, Leeds' for i in range(12)]
+    destinations = [f'{j} Street, York' for j in range(30)]
+    shapes = []
+    distance_matrix = fake_client.distance_matrix
+
+    def recording(origins, destinations, mode, units):
+        shapes.append((len(origins), len(destinations)))
+        return distance_matrix(origins, destinations, mode, units)
+
+    fake_client.distance_matrix = recording
+    matrix = maps_service.get_distance_matrix(origins, destinations)
+
+    assert all(o * d <= MATRIX_MAX_ELEMENTS for o, d in shapes)
+    assert sum(o * d for o, d in shapes) == len(origins) * len(destinations)
+    for origin, row in zip(origins, matrix):
+        for destination, result in zip(destinations, row):
+            assert result == maps_service._fetch_distance_duration(origin, destination)
+
+
+def test_distance_matrix_deduplicates_and_serves_cached_pairs(tmp_path, fake_client):
+    service = MapsService(cache=RouteCache(str(tmp_path / 'routes.sqlite3')), geocode_cache=None, qps=0)
+    service.client = fake_client
+
+    first = service.get_distance_matrix(['A', 'B', 'A'], ['X', 'Y'])
+    assert first[0] == first[2]
+    assert fake_client.calls['elements'] == 4
+
+    second = service.get_distance_matrix(['A', 'B', 'C'], ['X', 'Y'])
+    assert second[:2] == first[:2]
+    assert fake_client.calls['elements'] == 6
+
+
+def test_rate_limiter_spaces_requests_after_the_burst():
+    limiter = RateLimiter(50, burst=1)
+    started = time.monotonic()
+    for _ in range(11):
+        limiter.acquire()
+    assert time.monotonic() - started >= 10 / 50 * 0.9
+
+
+def test_map_concurrent_keeps_order_and_the_callers_run_metrics(maps_service):
+    threads = set()
+
+    def work(item):
+        threads.add(threading.current_thread().name)
+        instrumentation.count('work')
+        time.sleep(0.01)
+        # Nested batches run inline on the worker instead of waiting on the pool
+        return maps_service.map_concurrent(lambda x: x * item, [1, 2])
+
+    with instrumentation.measure_run() as metrics:
+        results = maps_service.map_concurrent(work, range(16))
+
+    assert results == [[i, 2 * i] for i in range(16)]
+    assert len(threads) > 1
+    assert metrics.summary()['counters']['work'] == 16
+
+
+def test_over_query_limit_is_retried(maps_service, fake_client, monkeypatch):
+    monkeypatch.setattr(maps_module, 'MAPS_BACKOFF_SECONDS', 0)
+    directions = fake_client.directions
+    failures = [googlemaps.exceptions.ApiError('OVER_QUERY_LIMIT')] * 2
+
+    def flaky(**kwargs):
+        if failures:
+            raise failures.pop()
+        return directions(**kwargs)
+
+    fake_client.directions = flaky
+    assert maps_service.get_route_with_directions('A', 'B')['success']
+    assert fake_client.calls['directions'] == 1
+
+    fake_client.directions = lambda **kwargs: (_ for _ in ()).throw(googlemaps.exceptions.ApiError('REQUEST_DENIED'))
+    assert not maps_service.get_route_with_directions('A', 'C')['success']
+
+
+def test_single_flight_shares_one_call_between_concurrent_callers():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait()
+        return {'value': 1}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do(('k',), fetch))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while flight.shared < 7:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{'value': 1}] * 8
+    # Followers get copies, so one caller's edits never reach another
+    assert len({id(result) for result in results}) == 8
+
+    assert flight.do(('k',), lambda: 2) == 2
+
+
+def test_single_flight_passes_the_error_to_every_caller():
+    flight = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def fail():
+        release.wait()
+        raise ValueError('boom')
+
+    def call():
+        try:
+            flight.do(('k',), fail)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while flight.shared < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == ['boom'] * 4
+
+
+def test_duplicate_route_lookups_are_requested_once(maps_service, fake_client):
+    directions = fake_client.directions
+
+    def slow(**kwargs):
+        time.sleep(0.05)
+        return directions(**kwargs)
+
+    fake_client.directions = slow
+    routes = maps_service.get_routes_with_directions([('1 Road, Leeds', '2 Street, York')] * maps_service.max_workers)
+
+    assert all(route == routes[0] for route in routes)
+    assert fake_client.calls['directions'] == 1
@@ -0,0 +1,61 @@
+import io
+
+import pandas as pd
+import pytest
+
+from conftest import make_bookings, make_providers
+from services.cost_calculator import CostCalculator
+from services.excel_handler import PLANNING_REPORT_COLUMNS, PROVIDERS_COMPARED_COLUMNS, ExcelHandler
+
+
+@pytest.fixture
+def results(maps_service):
+    providers = make_providers(6)
+    bookings = make_bookings(5, providers)
+    bookings.append(make_bookings(1, [])[0])
+    bookings[-1].booking_id = 'NOBODY'
+    return CostCalculator(maps_service).calculate_all_bookings(bookings)
+
+
+def test_report_rows_come_straight_from_the_results(results):
+    output = io.BytesIO()
+    ExcelHandler.write_planning_report((result for result in results), output, include_all_providers=True)
+
+    sheets = pd.read_excel(io.BytesIO(output.getvalue()), sheet_name=None)
+    report, compared = sheets['Results'], sheets['All Providers Compared']
+
+    assert list(report.columns) == PLANNING_REPORT_COLUMNS
+    assert list(compared.columns) == PROVIDERS_COMPARED_COLUMNS
+    assert report['Booking_ID'].tolist() == [r['booking'].booking_id for r in results]
+    for (_, row), result in zip(report.iterrows(), results):
+        best = result['best_provider']
+        if best:
+            assert row['Best_Provider'] == best['provider'].name
+            assert row['Total_Cost'] == pytest.approx(round(best['total_cost'], 2))
+        else:
+            assert row['Best_Provider'] == 'No Match'
+
+    placed = [r for r in results if r['best_provider']]
+    assert len(compared) == sum(len(r['best_provider']['all_providers']) for r in placed)
+    assert (compared['Selected'] == 'Yes').sum() == len(placed)
+
+
+def test_digest_is_stable_and_follows_every_reported_value(results):
+    digest = ExcelHandler.results_digest(results)
+    assert ExcelHandler.results_digest(results) == digest
+
+    best = next(r['best_provider'] for r in results if r['best_provider'])
+    changes = [
+        lambda: setattr(results[0]['booking'], 'service_time', '23:00'),
+        lambda: setattr(best['provider'], 'mileage_rate', 9.99),
+        lambda: best.breakdown_values.__setitem__(0, best.breakdown_values[0] + 1),
+        lambda: best['all_providers'].values.__setitem__((0, 0), -1.0),
+        lambda: best['all_providers'].available.__setitem__(0, not best['all_providers'].available[0]),
+        lambda: results[-1].__setitem__('unassigned_reason', 'changed')
+    ]
+    seen = {digest}
+    for change in changes:
+        change()
+        digest = ExcelHandler.results_digest(results)
+        assert digest not in seen
+        seen.add(digest)
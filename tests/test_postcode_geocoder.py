@@ -0,0 +1,71 @@
+import pytest
+
+from services.postcode_geocoder import PostcodeGeocoder, build_postcode_file, extract_postcode
+
+
+@pytest.fixture
+def postcode_file(tmp_path):
+    csv_path = tmp_path / 'onspd.csv'
+    csv_path.write_text(
+        'pcds,lat,long,doterm\n'
+        'SO16 5YA,50.93,-1.43,\n'
+        'B1 1AA,52.48,-1.90,\n'
+        'M1 1AE,53.48,-2.24,\n'
+        'ZZ9 9ZZ,99.999999,0,\n'
+        'OLD 1AA,51.0,0.1,200001\n'
+        'B1 1AA,52.50,-1.91,\n'
+        'EC1A 1BB,not a number,0,\n'
+    )
+    path = str(tmp_path / 'postcodes.bin')
+    assert build_postcode_file(str(csv_path), path) == 3
+    return path
+
+
+@pytest.mark.parametrize('address, expected', [
+    ('1 Road, Southampton SO16 5YA', 'SO165YA'),
+    ('1 road, southampton, so165ya', 'SO165YA'),
+    ('Flat 2, 3 W1 Street, London EC1A 1BB', 'EC1A1BB'),
+    ('No postcode here', None),
+    (None, None)
+])
+def test_extract_postcode(address, expected):
+    assert extract_postcode(address) == expected
+
+
+def test_lookup_keeps_the_last_duplicate_and_skips_unusable_rows(postcode_file):
+    geocoder = PostcodeGeocoder(postcode_file)
+
+    assert geocoder.available and len(geocoder) == 3
+    assert geocoder.lookup('B11AA') == pytest.approx((52.50, -1.91), abs=1e-5)
+    assert geocoder.lookup('ZZ99ZZ') is None
+    assert geocoder.lookup('OLD1AA') is None
+
+
+def test_geocode_many_in_input_order(postcode_file):
+    geocoder = PostcodeGeocoder(postcode_file)
+
+    located = geocoder.geocode_many(['M1 1AE', 'Unknown ZZ1 1ZZ', '', '5 Street, SO16 5YA'])
+
+    assert located[0] == pytest.approx({'lat': 53.48, 'lng': -2.24}, abs=1e-5)
+    assert located[1:3] == [None, None]
+    assert located[3] == pytest.approx({'lat': 50.93, 'lng': -1.43}, abs=1e-5)
+
+
+def test_missing_or_foreign_file_is_unavailable(tmp_path):
+    assert not PostcodeGeocoder(str(tmp_path / 'missing.bin')).available
+
+    other = tmp_path / 'other.bin'
+    other.write_bytes(b'not a postcode file at all')
+    geocoder = PostcodeGeocoder(str(other))
+    assert not geocoder.available
+    assert geocoder.geocode('1 Road, SO16 5YA') is None
+
+
+def test_maps_service_geocodes_postcodes_offline(maps_service, fake_client, postcode_file):
+    maps_service.postcode_geocoder = PostcodeGeocoder(postcode_file)
+
+    located = maps_service.geocode_addresses(['1 Road, Southampton SO16 5YA', '2 Road, Nowhere'])
+
+    assert located[0] == pytest.approx({'lat': 50.93, 'lng': -1.43}, abs=1e-5)
+    assert located[1] is not None
+    assert fake_client.calls['geocode'] == 1
@@ -0,0 +1,80 @@
+import io
+
+import pandas as pd
+
+from pages.providers_tab import calculate_all_journeys, calculate_provider_journey_with_rates, journey_leg_pairs
+from services.excel_handler import ExcelHandler
+from services.ingestion import IngestionReport
+from services.uk_transport import UKTransportService
+
+
+def journey_workbook() -> bytes:
+    journeys = pd.DataFrame({
+        'Provider_ID': ['PROV001', 'PROV002', None, 'PROV004'],
+        'Provider_Start_Location': ['Depot, Leeds', 'Depot, Leeds', 'Depot, York', 'Depot, Hull'],
+        'Provider_Travel_Type': ['Car', 'Van', 'Car', 'Public Transport'],
+        'Provider_Travel_Time_Cost_Per_Hour': [15.0, '£12.50', 15.0, None],
+        'Provider_Mileage_Cost_Per_Mile': [0.45, 0.5, 0.45, 'free'],
+        'Parking_Paid': ['YES', 'no', 'NO', None],
+        'Booking_Location_1': ['1 Street, Leeds', '1 Street, Leeds', '1 Street, York', None],
+        'Booking_Appointment_Time_1': ['14:00', '09:00', '09:00', None],
+        'Booking_Duration_1': [2.0, '1.5 hours', 1.0, None],
+        'Booking_Location_2': ['2 Street, Leeds', None, None, None],
+        'Booking_Appointment_Time_2': ['09:30', None, None, None],
+        'Booking_Duration_2': [None, None, None, None],
+        'Booking_Location_3': [None, '3 Street, Leeds', None, None],
+        'Booking_Appointment_Time_3': [None, '16:00', None, None],
+        'Booking_Duration_3': [None, 1.0, None, None]
+    })
+    output = io.BytesIO()
+    journeys.to_excel(output, sheet_name='Provider_Journey', index=False)
+    return output.getvalue()
+
+
+def test_every_journey_row_is_parsed():
+    report = IngestionReport()
+
+    journeys = ExcelHandler.parse_provider_journeys(journey_workbook(), report)
+
+    assert [j['provider_id'] for j in journeys] == ['PROV001', 'PROV002', 'PROV004']
+    assert [(b['booking_id'], b['address'], b['start_time'], b['duration_hours']) for b in journeys[0]['bookings']] == [
+        ('B001', '1 Street, Leeds', '14:00', 2.0),
+        ('B002', '2 Street, Leeds', '09:30', 1.0)
+    ]
+    # Bookings stop at the first blank location
+    assert [b['address'] for b in journeys[1]['bookings']] == ['1 Street, Leeds']
+    assert journeys[1]['bookings'][0]['duration_hours'] == 1.5
+    assert journeys[2]['bookings'] == []
+
+    assert [j['travel_time_cost_per_hour'] for j in journeys] == [15.0, 12.5, 0.0]
+    assert [j['parking_paid'] for j in journeys] == [True, False, False]
+    assert [(e['row'], e['column']) for e in report.errors] == [
+        (4, 'Provider_ID'), (5, 'Provider_Mileage_Cost_Per_Mile')
+    ]
+    assert report.rows_read == 4 and report.rows_loaded == 3
+
+
+def test_leg_pairs_follow_appointment_order():
+    bookings = [{'address': 'B', 'start_time': '14:00'}, {'address': 'A', 'start_time': '09:00'}]
+
+    assert journey_leg_pairs('Depot', bookings, True) == [('Depot', 'A'), ('A', 'B'), ('B', 'Depot')]
+    assert journey_leg_pairs('Depot', bookings, False) == [('Depot', 'A'), ('A', 'B')]
+    assert journey_leg_pairs('Depot', [], True) == []
+
+
+def test_all_journeys_share_legs_and_match_single_journeys(maps_service, fake_client):
+    journeys = ExcelHandler.parse_provider_journeys(journey_workbook())
+    uk_transport = UKTransportService()
+
+    results = calculate_all_journeys(journeys, maps_service, uk_transport, True)
+
+    unique_legs = {pair for j in journeys for pair in journey_leg_pairs(j['start_location'], j['bookings'], True)}
+    assert fake_client.calls['directions'] == len(unique_legs)
+
+    for journey, result in zip(journeys, results):
+        single = calculate_provider_journey_with_rates(
+            journey['start_location'], journey['bookings'], journey['travel_mode'], maps_service, uk_transport,
+            True, journey['travel_time_cost_per_hour'], journey['mileage_cost_per_mile'], journey['parking_paid']
+        )
+        assert result['total_cost'] == single['total_cost']
+        assert len(result['legs']) == len(single['legs'])
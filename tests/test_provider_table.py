@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import make_providers
+from models.booking import Booking, Provider
+from models.provider_table import ProviderTable
+from services.cost_kernel import CostKernel
+from services.excel_handler import ExcelHandler
+from services.ingestion import IngestionReport
+from services.uk_transport import UKTransportService
+
+
+def test_columns_rows_and_take():
+    providers = make_providers(4)
+    providers[2].service_cost = None
+    providers[3].max_distance = 25
+    table = ProviderTable(providers)
+
+    assert len(table) == 4
+    assert table.ids.tolist() == ['P0', 'P1', 'P2', 'P3']
+    assert np.isnan(table.service_cost[2]) and table.service_cost[1] == providers[1].service_cost
+    assert np.isnan(table.max_distance[:3]).all() and table.max_distance[3] == 25
+    assert table.rows([providers[3], providers[0]]).tolist() == [3, 0]
+    assert table.take([1, 2]) == providers[1:3]
+
+    table.locate(np.array([[51.0, -1.0]]), [2])
+    assert table.coords[2].tolist() == [51.0, -1.0] and np.isnan(table.coords[0]).all()
+
+
+def test_duplicate_ids_are_rejected():
+    with pytest.raises(ValueError):
+        ProviderTable([Provider(id='P1', address='A'), Provider(id='P1', address='B')])
+
+
+def test_models_are_slotted():
+    booking = Booking(booking_id='B1', customer_address='A', service_date='2024-03-25', service_time='09:00',
+                      providers=[])
+    assert not hasattr(booking, '__dict__')
+    with pytest.raises(AttributeError):
+        booking.unknown_field = 1
+
+
+def test_kernel_arrays_from_the_table_match_the_providers():
+    providers = make_providers(6)
+    providers[1].service_cost = None
+    table = ProviderTable(providers)
+    kernel = CostKernel(UKTransportService())
+
+    from_table = kernel.provider_arrays(providers[::-1], table)
+    from_objects = kernel.provider_arrays(providers[::-1])
+
+    assert from_table.keys() == from_objects.keys()
+    for name in from_objects:
+        assert np.array_equal(from_table[name], from_objects[name]), name
+
+
+def test_repeated_provider_ids_are_skipped_and_reported_across_chunks():
+    report = IngestionReport()
+    seen_ids = set()
+    first = pd.DataFrame({'ProviderID': ['P1', 'P2', 'P1'], 'ProviderAddress': ['A', 'B', 'C']})
+    second = pd.DataFrame({'ProviderID': ['P2', 'P3'], 'ProviderAddress': ['D', 'E']}, index=[3, 4])
+
+    providers = (ExcelHandler.providers_from_frame(first, report, seen_ids)
+                 + ExcelHandler.providers_from_frame(second, report, seen_ids))
+
+    assert [(p.id, p.address) for p in providers] == [('P1', 'A'), ('P2', 'B'), ('P3', 'E')]
+    assert [(e['row'], e['value']) for e in report.errors] == [(4, 'P1'), (5, 'P2')]
+    assert report.rows_read == 5 and report.rows_loaded == 3
+    ProviderTable(providers)
@@ -0,0 +1,72 @@
+import io
+
+import pyarrow.parquet as pq
+import pytest
+
+from conftest import make_bookings, make_providers
+from services.cost_calculator import CostCalculator
+from services.result_store import ASSIGNMENT_SCHEMA, CANDIDATE_SCHEMA, ResultStore
+
+
+@pytest.fixture
+def results(maps_service):
+    providers = make_providers(5)
+    bookings = make_bookings(4, providers)
+    bookings[1].service_date = 'next week'
+    bookings[1].booking_id = 'UNDATED'
+    unmatched = make_bookings(1, [])[0]
+    unmatched.booking_id = 'NOBODY'
+    return CostCalculator(maps_service).calculate_all_bookings(bookings + [unmatched])
+
+
+def test_tables_hold_one_row_per_booking_and_per_candidate(results):
+    store = ResultStore.from_results(results, plan_id='plan-1')
+    assignments = store.assignments.to_pylist()
+    candidates = store.candidates.to_pylist()
+
+    assert store.assignments.schema == ASSIGNMENT_SCHEMA
+    assert store.candidates.schema == CANDIDATE_SCHEMA
+    assert store.plan_id == 'plan-1'
+    assert [row['booking_id'] for row in assignments] == [r['booking'].booking_id for r in results]
+
+    for row, result in zip(assignments, results):
+        best = result['best_provider']
+        if best:
+            assert row['provider_id'] == best['provider'].id
+            assert row['total_cost'] == best['total_cost']
+            assert sum(row[name] for name in ('mileage', 'parking', 'congestion_charge', 'tolls',
+                                              'mileage_to_station', 'park_and_ride', 'public_transport',
+                                              'travel_time')) == pytest.approx(best['travel_cost'])
+        else:
+            assert row['provider_id'] is None and row['total_cost'] is None
+
+    # Unreadable dates become null instead of failing the export
+    dates = {row['booking_id']: row['service_date'] for row in assignments}
+    assert dates['UNDATED'] is None
+    assert str(dates['B0']) == '2024-03-25'
+
+    placed = [r for r in results if r['best_provider']]
+    assert len(candidates) == sum(len(r['best_provider']['all_providers']) for r in placed)
+    assert sum(row['selected'] for row in candidates) == len(placed)
+
+
+def test_default_plan_id_follows_the_assignment(results):
+    first = ResultStore.from_results(results).plan_id
+    assert ResultStore.from_results(results).plan_id == first
+
+    results[0]['best_provider'] = None
+    assert ResultStore.from_results(results).plan_id != first
+
+
+@pytest.mark.parametrize('format', ['parquet', 'ipc'])
+def test_tables_round_trip_through_files(results, tmp_path, format):
+    store = ResultStore.from_results(results, plan_id='plan-1')
+    store.save(str(tmp_path), format)
+
+    for name, table in store.tables().items():
+        path = str(tmp_path / f"{name}.{'arrow' if format == 'ipc' else 'parquet'}")
+        # Parquet has no second-resolution timestamps; planned_at comes back in ms
+        read = ResultStore.read_ipc(path) if format == 'ipc' else pq.read_table(path).cast(table.schema)
+        assert read.equals(table)
+
+    assert pq.read_table(io.BytesIO(store.to_bytes('candidates'))).equals(store.candidates)
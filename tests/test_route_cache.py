@@ -0,0 +1,60 @@
+import sqlite3
+
+from services import route_cache
+from services.route_cache import RouteCache, normalize_address
+
+
+def test_normalize_address_ignores_case_spacing_and_postcode_space():
+    assert normalize_address('  10 High St ,Southampton,  SO16 5YA. ') == '10 high st, southampton, so165ya'
+    assert normalize_address('10 high st, southampton, so165ya') == '10 high st, southampton, so165ya'
+    assert normalize_address(None) == ''
+
+
+def test_get_many_returns_hits_in_input_order(tmp_path):
+    cache = RouteCache(str(tmp_path / 'routes.sqlite3'))
+    cache.set_many('distance', [('A', 'B', {'distance_miles': 1.0}), ('C', 'D', {'distance_miles': 2.0})])
+
+    results = cache.get_many('distance', [('C', 'D'), ('X', 'Y'), ('a ', ' b')])
+
+    assert results == [{'distance_miles': 2.0}, None, {'distance_miles': 1.0}]
+    assert cache.get('directions', 'A', 'B') is None
+
+
+def test_expired_entries_are_dropped(tmp_path, monkeypatch):
+    path = str(tmp_path / 'routes.sqlite3')
+    cache = RouteCache(path, ttl_hours={'distance': 1})
+    cache.set('distance', 'A', 'B', {'distance_miles': 1.0})
+
+    now = route_cache.time.time()
+    monkeypatch.setattr(route_cache.time, 'time', lambda: now + 2 * 3600)
+
+    assert cache.get('distance', 'A', 'B') is None
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM routes").fetchone()[0] == 0
+
+
+def test_hits_touch_accessed_at_only_past_the_interval(tmp_path, monkeypatch):
+    path = str(tmp_path / 'routes.sqlite3')
+    cache = RouteCache(path)
+    cache.set('distance', 'A', 'B', {'distance_miles': 1.0})
+
+    def accessed_at():
+        return sqlite3.connect(path).execute("SELECT accessed_at FROM routes").fetchone()[0]
+
+    stored = accessed_at()
+    now = route_cache.time.time()
+    monkeypatch.setattr(route_cache.time, 'time', lambda: now + 60)
+    assert cache.get('distance', 'A', 'B')
+    assert accessed_at() == stored
+
+    later = now + route_cache.TOUCH_INTERVAL_SECONDS + 60
+    monkeypatch.setattr(route_cache.time, 'time', lambda: later)
+    assert cache.get('distance', 'A', 'B')
+    assert accessed_at() == later
+
+
+def test_eviction_bounds_the_number_of_entries(tmp_path):
+    cache = RouteCache(str(tmp_path / 'routes.sqlite3'), max_entries=50)
+    cache.set_many('distance', [(f'O{i}', 'D', {'i': i}) for i in range(100)])
+
+    remaining = cache._conn.execute("SELECT COUNT(*) FROM routes").fetchone()[0]
+    assert remaining == 50
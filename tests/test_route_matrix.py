@@ -0,0 +1,51 @@
+import numpy as np
+
+from conftest import make_bookings, make_providers
+from services.route_matrix import RouteMatrix
+
+
+def test_build_routes_each_unique_pair_once(maps_service, fake_client):
+    providers = make_providers(6)
+    bookings = make_bookings(4, providers) + make_bookings(4, providers)
+
+    matrix = RouteMatrix.build(maps_service, bookings)
+
+    assert matrix.distance.shape == (6, 4)
+    assert matrix.filled.all()
+    assert fake_client.calls['elements'] == 6 * 4
+
+
+def test_get_and_block_agree_with_the_maps_service(maps_service):
+    providers = make_providers(3)
+    bookings = make_bookings(2, providers)
+    matrix = RouteMatrix.build(maps_service, bookings)
+
+    origins = [p.address for p in providers] + ['Unknown origin']
+    destinations = [b.customer_address for b in bookings]
+    distance, duration = matrix.block(origins, destinations)
+
+    for i, origin in enumerate(origins[:-1]):
+        for j, destination in enumerate(destinations):
+            expected = maps_service.get_distance_duration(origin, destination)
+            assert matrix.get(origin.upper(), destination) == expected
+            assert distance[i, j] == expected['distance_miles']
+            assert duration[i, j] == expected['duration_minutes']
+    assert np.isnan(distance[-1]).all()
+    assert matrix.get('Unknown origin', destinations[0]) is None
+
+
+def test_candidates_limit_the_routed_pairs_and_add_fills_only_new_ones(maps_service, fake_client):
+    providers = make_providers(5)
+    bookings = make_bookings(3, providers)
+
+    matrix = RouteMatrix.build(maps_service, bookings, {id(b): providers[:2] for b in bookings})
+    assert fake_client.calls['elements'] == 2 * 3
+
+    matrix.add(bookings)
+    assert fake_client.calls['elements'] == 5 * 3
+    assert matrix.filled.all()
+
+    rows = np.array([0, 4])
+    cols = np.array([1, 2])
+    distance, _ = matrix.pairs([p.address for p in providers], [b.customer_address for b in bookings], rows, cols)
+    assert list(distance) == [matrix.distance[0, 1], matrix.distance[4, 2]]
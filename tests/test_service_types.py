@@ -0,0 +1,61 @@
+from models.booking import Provider
+from services import instrumentation
+from services.excel_handler import (
+    ServiceTypeMatcher,
+    build_service_type_index,
+    normalize_service_type,
+    service_type_tokens
+)
+
+
+def provider(provider_id, service_types):
+    result = Provider(id=provider_id, address=f'{provider_id} Road')
+    result.service_types = service_types
+    return result
+
+
+PROVIDERS = [
+    provider('P1', 'Cleaning'),
+    provider('P2', ' gardening ,  Window  Cleaning,cleaning'),
+    provider('P3', 'All'),
+    provider('P4', None),
+    provider('P5', 'Plumbing')
+]
+
+
+def test_tokens_are_trimmed_lowercased_and_split_on_commas():
+    assert normalize_service_type('  Window   CLEANING ') == 'window cleaning'
+    assert normalize_service_type(None) == ''
+    assert service_type_tokens(' gardening ,  Window  Cleaning,,') == ['gardening', 'window cleaning']
+    assert service_type_tokens(None) == []
+
+
+def test_index_maps_each_token_to_provider_ids():
+    index = build_service_type_index(PROVIDERS)
+
+    assert index == {
+        'cleaning': ['P1', 'P2'],
+        'gardening': ['P2'],
+        'window cleaning': ['P2'],
+        'all': ['P3'],
+        'plumbing': ['P5']
+    }
+
+
+def test_matcher_adds_all_providers_in_upload_order_and_shares_lists():
+    matcher = ServiceTypeMatcher(PROVIDERS)
+
+    providers, rows = matcher.match_rows('CLEANING ')
+    assert [p.id for p in providers] == ['P1', 'P2', 'P3']
+    assert rows.tolist() == [0, 1, 2]
+    assert matcher.match('cleaning') is providers
+
+    assert [p.id for p in matcher.match('Electrics')] == ['P3']
+
+
+def test_matcher_falls_back_to_everyone_when_nobody_matches():
+    matcher = ServiceTypeMatcher(PROVIDERS[:2])
+
+    with instrumentation.measure_run() as metrics:
+        assert [p.id for p in matcher.match('Electrics')] == ['P1', 'P2']
+    assert metrics.summary()['counters'] == {'warnings.unmatched_service_type': 1}
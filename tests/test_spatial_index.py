@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from models.booking import Provider
+from services.distance_estimator import haversine_miles
+from services.spatial_index import ProviderSpatialIndex, chord_for_miles, miles_for_chord
+
+
+def located_providers(count, seed=0):
+    rng = np.random.default_rng(seed)
+    coords = np.column_stack([rng.uniform(50, 55, count), rng.uniform(-4, 1, count)])
+    providers = []
+    for i in range(count):
+        provider = Provider(id=f'P{i}', address=f'{i} Road')
+        provider.service_types = ['Cleaning', 'Gardening, cleaning', 'All'][i % 3]
+        providers.append(provider)
+    return providers, coords
+
+
+def test_chord_round_trip():
+    assert miles_for_chord(chord_for_miles(42.0)) == pytest.approx(42.0)
+
+
+@pytest.mark.parametrize('service_type', ['Cleaning', ' GARDENING ', None, 'Unknown type'])
+def test_nearest_matches_a_brute_force_search(service_type):
+    providers, coords = located_providers(200)
+    index = ProviderSpatialIndex(providers, coords)
+    lat, lng = 52.5, -1.9
+
+    found = index.nearest(lat, lng, service_type, k=15)
+
+    # As in planning file matching: the type's providers plus 'All' providers
+    wanted = (service_type or '').strip().lower()
+    eligible = [i for i, p in enumerate(providers)
+                if wanted in p.service_types.lower().split(', ') or p.service_types == 'All']
+    miles = haversine_miles(coords[eligible, 0], coords[eligible, 1], lat, lng)
+    expected = [eligible[i] for i in np.argsort(miles)[:15]]
+
+    assert [p.id for p, _ in found] == [providers[i].id for i in expected]
+    assert [d for _, d in found] == pytest.approx(np.sort(miles)[:15].tolist())
+
+
+def test_radius_limits_results_and_unlocated_providers_come_last():
+    providers, coords = located_providers(200)
+    coords[3] = np.nan
+    index = ProviderSpatialIndex(providers, coords)
+
+    found = index.nearest(52.5, -1.9, 'Cleaning', k=200, radius_miles=60)
+
+    located = [d for _, d in found if not np.isnan(d)]
+    assert located and max(located) <= 60
+    assert len(located) < len(index.nearest(52.5, -1.9, 'Cleaning', k=200)) - 1
+    assert found[-1][0].id == 'P3' and np.isnan(found[-1][1])
+    assert [p.id for p, _ in index.nearest(np.nan, np.nan, 'Cleaning')] == ['P3']
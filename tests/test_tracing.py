@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+
+import pytest
+
+from conftest import make_bookings, make_providers
+from services import tracing
+from services.cost_calculator import CostCalculator
+from services.tracing import Tracer
+
+
+def nested_trace() -> Tracer:
+    tracer = Tracer('test')
+    with tracer.span('run'):
+        with tracer.span('routing', 'route', legs=2):
+            pass
+        with tracer.span('evaluation'):
+            pass
+
+    def worker():
+        with tracer.span('api.directions', 'api'):
+            pass
+
+    thread = threading.Thread(target=worker, name='maps_0')
+    thread.start()
+    thread.join()
+    return tracer
+
+
+def test_chrome_trace_has_one_complete_event_per_span():
+    trace = nested_trace().to_chrome()
+
+    events = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+    names = {e['args']['name'] for e in trace['traceEvents'] if e['ph'] == 'M'}
+    assert [e['name'] for e in events] == ['run', 'routing', 'evaluation', 'api.directions']
+    assert events[1]['args'] == {'legs': 2} and events[1]['cat'] == 'route'
+    assert 'maps_0' in names
+    run = events[0]
+    assert all(run['ts'] <= e['ts'] and e['ts'] + e['dur'] <= run['ts'] + run['dur'] for e in events[1:3])
+
+
+def test_speedscope_events_open_and_close_in_nesting_order():
+    profile = nested_trace().to_speedscope()
+
+    frames = [frame['name'] for frame in profile['shared']['frames']]
+    assert len(profile['profiles']) == 2
+    for thread_profile in profile['profiles']:
+        stack = []
+        for event in thread_profile['events']:
+            if event['type'] == 'O':
+                stack.append(event['frame'])
+            else:
+                assert stack.pop() == event['frame']
+        assert stack == []
+    main = profile['profiles'][0]['events']
+    assert [(e['type'], frames[e['frame']]) for e in main] == [
+        ('O', 'run'), ('O', 'routing'), ('C', 'routing'), ('O', 'evaluation'), ('C', 'evaluation'), ('C', 'run')
+    ]
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        Tracer().write(str(tmp_path / 'trace.json'), 'flamegraph')
+
+
+def test_spans_are_free_outside_a_trace():
+    assert not tracing.active()
+    assert tracing.span('anything') is tracing._NO_SPAN
+
+
+def test_trace_runs_get_unique_files_and_nested_runs_join(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, 'PROFILE_TRACE_DIR', str(tmp_path))
+
+    paths = []
+    for _ in range(3):
+        with tracing.trace_run('planning') as path:
+            with tracing.trace_run('journey') as nested:
+                assert nested is None
+        paths.append(path)
+
+    assert len(set(paths)) == 3
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(p) for p in paths)
+    with open(paths[0]) as f:
+        names = [e['name'] for e in json.load(f)['traceEvents'] if e['ph'] == 'X']
+    assert names == ['planning', 'journey']
+
+
+def test_planning_run_traces_worker_threads(tmp_path, maps_service):
+    path = str(tmp_path / 'planning.trace.json')
+    with tracing.profile(path, 'chrome'):
+        CostCalculator(maps_service).calculate_all_bookings(make_bookings(4, make_providers(30)))
+
+    with open(path) as f:
+        events = json.load(f)['traceEvents']
+    names = {e['name'] for e in events if e['ph'] == 'X'}
+    assert {'routing', 'evaluation', 'assignment', 'api.distance_matrix'} <= names